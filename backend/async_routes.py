@@ -0,0 +1,135 @@
+"""
+Async-версии /pet/* роутов main.py (PET_DB_MODE=async).
+
+Работают через AsyncSession + aiosqlite и не занимают threadpool FastAPI.
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import sys
+import os
+import time
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(__file__))
+try:
+    from database import get_async_db, group_writer
+    from models import Pet
+    from pet_cache import pet_cache
+    from main import (
+        ActionBatch, PetCreate, PetState, action_statement, batch_decay_statement, batch_final_statement,
+        batch_plan, conditional_stats, encoded_response, etag_matches, invalidate_pet, new_pet, not_modified,
+        notify_stream, pet_etag, pet_response, projection_params, projection_statement, publish_batch, run_batch,
+        update_stats, write_action, write_batch,
+    )
+except ImportError:
+    from .database import get_async_db, group_writer
+    from .models import Pet
+    from .pet_cache import pet_cache
+    from .main import (
+        ActionBatch, PetCreate, PetState, action_statement, batch_decay_statement, batch_final_statement,
+        batch_plan, conditional_stats, encoded_response, etag_matches, invalidate_pet, new_pet, not_modified,
+        notify_stream, pet_etag, pet_response, projection_params, projection_statement, publish_batch, run_batch,
+        update_stats, write_action, write_batch,
+    )
+
+router = APIRouter()
+
+async def find_pet(db: AsyncSession, user_id: str):
+    result = await db.execute(select(Pet).where(Pet.user_id == user_id).limit(1))
+    return result.scalars().first()
+
+async def apply_action(db: AsyncSession, user_id: str, action: str, accept: str = None):
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id query parameter is required")
+    stmt = action_statement(user_id, action)
+    if group_writer.enabled:
+        row = await asyncio.wrap_future(group_writer.submit(lambda session: write_action(session, stmt)))
+    else:
+        row = (await db.execute(stmt)).first()
+        if row:
+            await db.execute(projection_statement, projection_params(row.id, row._mapping, row.last_update))
+        await db.commit()
+    if not row:
+        raise HTTPException(status_code=404, detail="Pet not found")
+    invalidate_pet(user_id)
+    notify_stream(user_id, row)
+    return pet_response(row, accept)
+
+@router.post("/pet/create", response_model=PetState)
+async def create_pet(pet_data: PetCreate, user_id: str = None, accept: str = Header(None),
+                     db: AsyncSession = Depends(get_async_db)):
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id query parameter is required")
+    if await find_pet(db, user_id):
+        raise HTTPException(status_code=400, detail="Pet already exists")
+    pet = new_pet(user_id, pet_data.name)
+    db.add(pet)
+    await db.commit()
+    await db.refresh(pet)
+    return pet_response(pet, accept)
+
+@router.get("/pet/state", response_model=PetState)
+async def get_pet_state(user_id: str = None, if_none_match: str = Header(None), accept: str = Header(None),
+                        db: AsyncSession = Depends(get_async_db)):
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id query parameter is required")
+    if pet_cache.enabled:
+        now = time.monotonic()
+        entry = pet_cache.get(user_id, now)
+        if entry is None:
+            version = pet_cache.version
+            pet = await find_pet(db, user_id)
+            if not pet:
+                raise HTTPException(status_code=404, detail="Pet not found")
+            entry = pet_cache.put(pet, version, now)
+        pet = pet_cache.refresh(entry, update_stats, dirty=False)
+    else:
+        pet = await find_pet(db, user_id)
+        if not pet:
+            raise HTTPException(status_code=404, detail="Pet not found")
+        update_stats(pet)
+    etag = pet_etag(pet)
+    matched = etag_matches(if_none_match, etag)
+    conditional_stats.record(if_none_match, matched)
+    if matched:
+        if not pet_cache.enabled:
+            await db.rollback()
+        return not_modified(etag)
+    if pet_cache.enabled:
+        pet_cache.mark_dirty(entry)
+    else:
+        await db.commit()
+    return pet_response(pet, accept, etag)
+
+@router.post("/pet/actions")
+async def apply_actions(batch: ActionBatch, user_id: str = None, accept: str = Header(None),
+                        db: AsyncSession = Depends(get_async_db)):
+    plan = batch_plan(batch, user_id)
+    if group_writer.enabled:
+        response, finals = await asyncio.wrap_future(group_writer.submit(lambda session: write_batch(session, plan)))
+    else:
+        now = datetime.utcnow()
+        rows = (await db.execute(batch_decay_statement(list(plan), now))).all()
+        response, params, finals = run_batch(plan, rows, now)
+        if params:
+            await db.execute(batch_final_statement, params)
+        await db.commit()
+    publish_batch(finals)
+    return encoded_response(response, accept)
+
+@router.post("/pet/feed", response_model=PetState)
+async def feed_pet(user_id: str = None, accept: str = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await apply_action(db, user_id, "feed", accept)
+
+@router.post("/pet/play", response_model=PetState)
+async def play_with_pet(user_id: str = None, accept: str = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await apply_action(db, user_id, "play", accept)
+
+@router.post("/pet/sleep", response_model=PetState)
+async def put_pet_to_sleep(user_id: str = None, accept: str = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await apply_action(db, user_id, "sleep", accept)
+
+@router.post("/pet/heal", response_model=PetState)
+async def heal_pet(user_id: str = None, accept: str = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await apply_action(db, user_id, "heal", accept)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+"""
+Горячие копии БД питомцев без остановки сервера (online backup API SQLite).
+
+Копия снимается шагами по PET_BACKUP_STEP_PAGES страниц с паузой
+PET_BACKUP_STEP_SLEEP между шагами, поэтому запросы не ждут всю копию.
+В WAL источник держит одну транзакцию чтения на всю копию: писатели
+работают дальше, а копия - согласованный снимок на момент начала (без
+неё backup API начинает заново после каждой чужой записи и под нагрузкой
+не заканчивается). Пока копия идёт, checkpoint не может пройти дальше
+снимка, и WAL растёт. Без WAL (профиль default) страницы копируются за
+один шаг: писатели ждут только его.
+
+Снимок - файл <имя БД>.<время>.db в PET_BACKUP_DIR: сначала .partial,
+после PRAGMA quick_check переименовывается и получает рядом .sha256 (формат
+sha256sum, проверяется и `sha256sum -c`). Снимок без .sha256 считается
+недописанным. Хранятся PET_BACKUP_KEEP последних снимков каждой БД. Шарды
+копируются по очереди, общего снимка всех шардов нет.
+
+    python backup.py run [--db ./digital_pet.db] [--interval 3600] [--once]
+    python backup.py list [--db ./digital_pet.db]
+    python backup.py restore --db ./digital_pet.db (--snapshot PATH | --latest)
+
+restore проверяет контрольную сумму и переносит снимок в БД тем же
+backup API (атомарно для других соединений). Сервер лучше остановить:
+кэши и SSE не знают о подмене.
+
+Из приложений включается через PET_BACKUP_INTERVAL (секунды, 0 - выключен).
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import metrics
+import sqlite_tuning
+from sharding import SHARD_COUNT, shard_path
+
+BACKUP_INTERVAL = float(os.environ.get("PET_BACKUP_INTERVAL", "0"))
+BACKUP_DIR = os.environ.get("PET_BACKUP_DIR", "./backups")
+BACKUP_KEEP = int(os.environ.get("PET_BACKUP_KEEP", "7"))
+BACKUP_STEP_PAGES = int(os.environ.get("PET_BACKUP_STEP_PAGES", "256"))
+BACKUP_STEP_SLEEP = float(os.environ.get("PET_BACKUP_STEP_SLEEP", "0.005"))
+
+BACKUPS = metrics.Counter("pet_backup_total", "Database snapshots taken.", ("database", "result"))
+BACKUP_DURATION = metrics.Gauge("pet_backup_last_duration_seconds", "Duration of the last snapshot.", ("database",))
+BACKUP_BYTES = metrics.Gauge("pet_backup_last_size_bytes", "Size of the last snapshot.", ("database",))
+
+
+def _stem(database):
+    return os.path.splitext(os.path.basename(database))[0]
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshots(database, directory=BACKUP_DIR):
+    """Готовые снимки БД (с .sha256), от старых к новым."""
+    if not os.path.isdir(directory):
+        return []
+    prefix = _stem(database) + "."
+    names = sorted(
+        name for name in os.listdir(directory)
+        # у шардов своё имя: digital_pet.shard1.<время>.db не снимок digital_pet.db
+        if name.startswith(prefix) and name.endswith(".db") and name[len(prefix):-3].isdigit()
+    )
+    return [os.path.join(directory, name) for name in names
+            if os.path.exists(os.path.join(directory, name + ".sha256"))]
+
+
+def verify(snapshot):
+    """True, если файл совпадает с контрольной суммой из .sha256."""
+    try:
+        with open(snapshot + ".sha256") as f:
+            expected = f.read().split()[0]
+    except (OSError, IndexError):
+        return False
+    return sha256_file(snapshot) == expected
+
+
+def _copy(source, target, pages, pause):
+    """Страницы source в target шагами; в WAL - из одного снимка source."""
+    wal = source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+    if wal:
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+    try:
+        # sleep у Connection.backup срабатывает только на BUSY, пауза между шагами - в progress
+        source.backup(target, pages=pages if wal else -1,
+                      progress=(lambda status, remaining, total: time.sleep(pause)) if wal and pause else None)
+    finally:
+        if wal:
+            source.execute("COMMIT")
+
+
+def backup(database, directory=BACKUP_DIR, keep=BACKUP_KEEP, pages=BACKUP_STEP_PAGES, pause=BACKUP_STEP_SLEEP):
+    """Снимает снимок database в directory и удаляет лишние старые; возвращает сводку."""
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{_stem(database)}.{datetime.now():%Y%m%d%H%M%S%f}.db")
+    partial = path + ".partial"
+    label = _stem(database)
+    source = sqlite_tuning.connect(database, read_only=True, isolation_level=None, check_same_thread=False)
+    try:
+        target = sqlite3.connect(partial, isolation_level=None)
+        try:
+            _copy(source, target, pages, pause)
+            # Снимок - один самодостаточный файл без -wal
+            target.execute("PRAGMA journal_mode = DELETE")
+            check = target.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            target.close()
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"snapshot of {database} failed quick_check: {check}")
+        digest = sha256_file(partial)
+        os.replace(partial, path)
+        with open(path + ".sha256.partial", "w") as f:
+            f.write(f"{digest}  {os.path.basename(path)}\n")
+        os.replace(path + ".sha256.partial", path + ".sha256")
+    except BaseException:
+        BACKUPS.labels(label, "error").inc()
+        for leftover in (partial, path + ".sha256.partial"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    finally:
+        source.close()
+    removed = []
+    for old in snapshots(database, directory)[:-keep] if keep > 0 else []:
+        for name in (old + ".sha256", old):
+            os.remove(name)
+        removed.append(old)
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(path)
+    BACKUPS.labels(label, "ok").inc()
+    BACKUP_DURATION.labels(label).set(elapsed)
+    BACKUP_BYTES.labels(label).set(size)
+    return {"database": database, "snapshot": path, "bytes": size, "sha256": digest,
+            "seconds": round(elapsed, 3), "removed": removed}
+
+
+def restore(snapshot, database):
+    """Переносит проверенный снимок в database (backup API, один шаг)."""
+    if not verify(snapshot):
+        raise ValueError(f"checksum mismatch or missing .sha256: {snapshot}")
+    source = sqlite3.connect(sqlite_tuning.read_only_uri(snapshot), uri=True)
+    try:
+        target = sqlite_tuning.connect(database, isolation_level=None)
+        try:
+            source.backup(target)
+            check = target.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            target.close()
+    finally:
+        source.close()
+    if check != "ok":
+        raise sqlite3.DatabaseError(f"{database} failed quick_check after restore: {check}")
+    return {"database": database, "snapshot": snapshot}
+
+
+class BackupScheduler:
+    """Раз в interval секунд снимает снимки всех databases по очереди."""
+
+    def __init__(self, databases, directory=BACKUP_DIR, interval=BACKUP_INTERVAL, keep=BACKUP_KEEP):
+        self.databases = list(databases)
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.backups = 0
+        self.failures = 0
+        self.last = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        results = []
+        for database in self.databases:
+            if self._stop.is_set():
+                break
+            try:
+                results.append(backup(database, self.directory, self.keep))
+                self.backups += 1
+            except Exception as exc:
+                self.failures += 1
+                results.append({"database": database, "error": str(exc)})
+                print(f"✗ backup of {database} failed: {exc}")
+        self.last = results
+        return results
+
+    def _run(self):
+        # Первый снимок - через interval, а не на старте вместе с прогревом
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pet-backup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {"directory": self.directory, "interval": self.interval, "keep": self.keep,
+                "backups": self.backups, "failures": self.failures, "last": self.last}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot backups of Digital Pet databases")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("run", "take snapshots (all PET_SHARDS files)"), ("list", "list snapshots"),
+                            ("restore", "restore a snapshot into the database (server stopped)")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument("--db", default="./digital_pet.db")
+        command.add_argument("--dir", default=BACKUP_DIR)
+    run_parser = sub.choices["run"]
+    run_parser.add_argument("--interval", type=float, default=BACKUP_INTERVAL or 3600)
+    run_parser.add_argument("--keep", type=int, default=BACKUP_KEEP)
+    run_parser.add_argument("--once", action="store_true")
+    restore_parser = sub.choices["restore"]
+    source = restore_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--snapshot")
+    source.add_argument("--latest", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "restore":
+        snapshot = args.snapshot
+        if args.latest:
+            available = snapshots(args.db, args.dir)
+            if not available:
+                sys.exit(f"no snapshots of {args.db} in {args.dir}")
+            snapshot = available[-1]
+        print(restore(snapshot, args.db))
+        return
+    databases = [path for path in (shard_path(args.db, index) for index in range(SHARD_COUNT))
+                 if os.path.exists(path)]
+    if args.command == "list":
+        for database in databases:
+            for snapshot in snapshots(database, args.dir):
+                state = "ok" if verify(snapshot) else "CORRUPT"
+                print(f"{snapshot}  {os.path.getsize(snapshot)} bytes  {state}")
+        return
+    scheduler = BackupScheduler(databases, args.dir, args.interval, args.keep)
+    while True:
+        for result in scheduler.run_once():
+            print(result)
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks for the Digital Pet backends. Run from backend/: python -m benchmarks.<name>"""
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+main.py sync vs async (PET_DB_MODE) under 100, 500 and 2000 concurrent clients.
+
+Each mode runs in its own uvicorn process against a fresh database in a
+temporary directory. Traffic: 80% GET /pet/state, 20% POST /pet/feed.
+
+    python -m benchmarks.bench_db_modes [--duration 10] [--clients 100,500,2000]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.loadgen import HTTPClient, free_port, run_load, wait_for_port
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERS = 200
+
+
+def start_server(mode, port, workdir):
+    env = dict(os.environ, PET_DB_MODE=mode, PYTHONPATH=BACKEND_DIR)
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning',
+         '--backlog', '4096'],
+        cwd=workdir, env=env,
+    )
+    if wait_for_port(port):
+        return proc
+    proc.kill()
+    raise RuntimeError(f'uvicorn ({mode}) did not start')
+
+
+async def create_pets(port):
+    http = HTTPClient('127.0.0.1', port)
+    for i in range(USERS):
+        await http.request('POST', f'/pet/create?user_id=bench-{i}', {'name': f'Pet {i}'})
+    await http.close()
+
+
+def next_request(client, seq):
+    user = f'bench-{(client + seq) % USERS}'
+    if seq % 5 == 4:
+        return 'POST', f'/pet/feed?user_id={user}', None
+    return 'GET', f'/pet/state?user_id={user}', None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--clients', default='100,500,2000')
+    args = parser.parse_args()
+    levels = [int(c) for c in args.clients.split(',')]
+
+    print(f"{'mode':>6} {'clients':>8} {'rps':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>8}")
+    for mode in ('sync', 'async'):
+        workdir = tempfile.mkdtemp(prefix=f'pet-{mode}-')
+        port = free_port()
+        proc = start_server(mode, port, workdir)
+        try:
+            asyncio.run(create_pets(port))
+            for clients in levels:
+                result = asyncio.run(run_load('127.0.0.1', port, next_request, clients, args.duration))
+                print(f"{mode:>6} {clients:>8} {result['rps']:>9} {result['p50_ms']:>9} "
+                      f"{result['p99_ms']:>9} {result['error_rate']:>8}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Decay catch-up benchmark: O(1) engine vs the old per-tick loop.
+
+    python -m benchmarks.bench_decay
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rules import TICK_RULES
+
+catch_up = TICK_RULES.catch_up
+
+TICKS = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+def loop_catch_up(hunger, energy, mood, health, ticks, rng):
+    """Старая реализация из simple_server.update_pet_stats."""
+    for _ in range(ticks):
+        hunger = min(100, hunger + rng.randint(1, 2))
+        energy = max(0, energy - rng.randint(1, 2))
+        mood = max(0, mood - rng.randint(1, 2))
+    if hunger >= 100 or energy <= 0 or mood <= 0:
+        health = max(0, health - ticks)
+    return hunger, energy, mood, health, 'dead' if health <= 0 else 'healthy'
+
+
+def per_call_us(fn, ticks, budget=0.2):
+    rng = random.Random(42)
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn(50, 100, 50, 100, ticks, rng)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget:
+            return elapsed / calls * 1e6
+
+
+def check_distribution(ticks=30, samples=20_000):
+    """Средние обоих вариантов должны совпадать в пределах шума."""
+    rng = random.Random(7)
+    means = []
+    for fn in (catch_up, loop_catch_up):
+        total = [0, 0, 0]
+        for _ in range(samples):
+            h, e, m, _, _ = fn(20, 90, 90, 100, ticks, rng)
+            total[0] += h
+            total[1] += e
+            total[2] += m
+        means.append([round(t / samples, 2) for t in total])
+    return means
+
+
+def main():
+    print(f"{'ticks':>10} {'catch_up, us':>14} {'loop, us':>14}")
+    for ticks in TICKS:
+        fast = per_call_us(catch_up, ticks)
+        slow = per_call_us(loop_catch_up, ticks) if ticks <= 100_000 else float('nan')
+        print(f'{ticks:>10} {fast:>14.2f} {slow:>14.2f}')
+    fast_mean, loop_mean = check_distribution()
+    print(f'mean (hunger, energy, mood) after 30 ticks: catch_up={fast_mean} loop={loop_mean}')
+
+
+if __name__ == '__main__':
+    main()
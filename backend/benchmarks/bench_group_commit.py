@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Sustained action throughput with and without group commit (simple_server path).
+
+    python -m benchmarks.bench_group_commit [--threads 32] [--actions 200] [--db-dir DIR]
+
+The group writer has its own synchronous=FULL connection, so each batch
+is fsynced once before its callers are acknowledged. Direct writes use
+the profile's setting: under the default PET_SQLITE_PROFILE=tuned (WAL,
+synchronous=NORMAL) they do not fsync at all, under
+PET_SQLITE_PROFILE=default they fsync once per action. Use --db-dir on
+the real data disk; on tmpfs fsync is free.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import simple_server
+from group_commit import GroupCommitWriter
+
+
+def run(mode, threads, actions, db_dir, window_ms, max_batch):
+    simple_server.DATABASE = os.path.join(tempfile.mkdtemp(dir=db_dir), 'bench.db')
+    simple_server.init_db()
+    simple_server._pool = simple_server.ThreadLocalPool(simple_server.DATABASE)
+    simple_server._writer_pool = None
+    simple_server.group_writer = GroupCommitWriter(
+        lambda: simple_server.get_writer_pool().unit_of_work(),
+        window_ms=window_ms, max_batch=max_batch, enabled=mode == 'group',
+    )
+    handler = simple_server.PetRequestHandler.__new__(simple_server.PetRequestHandler)
+    handler.create_pet('Bench')
+
+    def worker():
+        for i in range(actions):
+            (handler.feed_pet if i % 2 else handler.play_pet)()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stats = simple_server.group_writer.stats()
+    simple_server.group_writer.stop()
+    simple_server.get_pool().close()
+    simple_server.get_writer_pool().close()
+    return threads * actions / elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--actions', type=int, default=200)
+    parser.add_argument('--db-dir', default=None)
+    parser.add_argument('--window-ms', type=float, default=2.0)
+    parser.add_argument('--max-batch', type=int, default=64)
+    args = parser.parse_args()
+    for mode in ('direct', 'group'):
+        rate, stats = run(mode, args.threads, args.actions, args.db_dir, args.window_ms, args.max_batch)
+        line = f'{mode:>7}: {rate:9.0f} actions/s'
+        if mode == 'group':
+            line += (f"  batch avg {stats['batch_size_avg']} max {stats['batch_size_max']}"
+                     f"  commit p99 {stats['commit_ms_p99']} ms")
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
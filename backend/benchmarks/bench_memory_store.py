@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+In-memory columnar store vs the SQLite path of simple_server.
+
+    python -m benchmarks.bench_memory_store [--pets 1000000] [--duration 5] [--db-dir DIR]
+
+Reports memory per million pets (column bytes and process RSS growth),
+snapshot write / startup load time, and single-threaded actions/sec
+(random feed/play/sleep/heal on random pets) for both storages.
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ACTIONS = ('feed', 'play', 'sleep', 'heal')
+
+
+def rss_bytes():
+    # ru_maxrss в килобайтах на Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def actions_per_second(run, pets, duration, seed=0):
+    rng = random.Random(seed)
+    done = 0
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for _ in range(200):
+            action = rng.choice(ACTIONS)
+            run(action, rng.randint(1, pets), {'amount': 30} if action == 'feed' else None)
+        done += 200
+    return round(done / (time.perf_counter() - started))
+
+
+def bench_memory(args, simple_server, directory):
+    from memory_store import MemoryPetStore
+
+    before = rss_bytes()
+    store = MemoryPetStore(simple_server.ACTION_FUNCS, simple_server.DECAY_INTERVAL_SECONDS,
+                           directory=directory).open()
+    started = time.perf_counter()
+    for i in range(args.pets):
+        store.create(f'Pet {i}')
+    populated = time.perf_counter() - started
+    rss = rss_bytes() - before
+    print(f'memory: created {args.pets} pets in {populated:.1f}s '
+          f'({round(args.pets / populated):,} creates/s)')
+    per_million = 1_000_000 / args.pets
+    print(f'memory: columns {store.memory_bytes() * per_million / 2**20:.1f} MiB per million pets '
+          f'({store.memory_bytes() / args.pets:.1f} B/pet), RSS growth {rss * per_million / 2**20:.1f} MiB per million')
+    rate = actions_per_second(lambda action, pet_id, params: store.run(action, pet_id, params=params),
+                              args.pets, args.duration)
+    print(f'memory: {rate:,} actions/s')
+    started = time.perf_counter()
+    store.close()
+    print(f'memory: snapshot {os.path.getsize(os.path.join(directory, "snapshot")) / 2**20:.1f} MiB '
+          f'written in {time.perf_counter() - started:.2f}s')
+    started = time.perf_counter()
+    reloaded = MemoryPetStore(simple_server.ACTION_FUNCS, simple_server.DECAY_INTERVAL_SECONDS,
+                              directory=directory).open()
+    print(f'memory: loaded {len(reloaded)} pets in {time.perf_counter() - started:.2f}s')
+    reloaded.close()
+    return rate
+
+
+def bench_sqlite(args, simple_server):
+    simple_server.init_db()
+    conn = simple_server.sqlite_tuning.connect(simple_server.DATABASE)
+    now = datetime.now().isoformat()
+    conn.executemany(
+        "INSERT INTO pet (name, hunger, energy, mood, health, status, created_at, last_update) "
+        "VALUES (?, 50, 100, 50, 100, 'healthy', ?, ?)",
+        ((f'Pet {i}', now, now) for i in range(args.pets)),
+    )
+    conn.commit()
+    conn.close()
+    rate = actions_per_second(
+        lambda action, pet_id, params: simple_server.run_pet_action(action, pet_id, params=params),
+        args.pets, args.duration,
+    )
+    print(f'sqlite: {rate:,} actions/s')
+    simple_server.get_pool().close()
+    simple_server.get_read_pool().close()
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pets', type=int, default=1_000_000)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--db-dir', default=None)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix='pet-memory-', dir=args.db_dir and os.path.abspath(args.db_dir))
+    os.environ['PET_SIMPLE_DATABASE'] = os.path.join(workdir, 'digital_pet.db')
+    import simple_server
+
+    memory = bench_memory(args, simple_server, os.path.join(workdir, 'memory'))
+    sqlite = bench_sqlite(args, simple_server)
+    print(f'memory / sqlite: {memory / sqlite:.1f}x  (data in {workdir})')
+
+
+if __name__ == '__main__':
+    main()
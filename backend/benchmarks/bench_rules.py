@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks for the compiled forms of rules.py.
+
+    python -m benchmarks.bench_rules [--pets 100000] [--actions 20000]
+
+scalar  - decay + action + status per pet: compiled functions over a
+          __slots__ State vs the generic dict path (Rules.effects);
+sql     - one parameterized UPDATE per action (decay_sql + effect_sql)
+          vs SELECT, Python rules, UPDATE, on an in-memory SQLite table;
+numpy   - decay + status for a whole batch (decay_batch/status_batch)
+          vs the compiled scalar functions in a loop.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rules import PET_RULES
+
+ACTIONS = tuple(PET_RULES.actions)
+
+
+def timed(fn, count):
+    started = time.perf_counter()
+    fn(count)
+    return time.perf_counter() - started
+
+
+def scalar(count):
+    rng = random.Random(0)
+    plan = [(rng.choice(ACTIONS), rng.random() * 5) for _ in range(count)]
+    decay, appliers, status = PET_RULES.decay, PET_RULES.appliers, PET_RULES.status
+
+    def compiled(n):
+        state = PET_RULES.state()
+        for action, minutes in plan[:n]:
+            decay(state, minutes)
+            appliers[action](state)
+            status(state)
+
+    def generic(n):
+        state = dict(PET_RULES.initial)
+        for action, minutes in plan[:n]:
+            state.update(PET_RULES.decayed(state, minutes))
+            state.update(PET_RULES.effects(action, state))
+            average = sum(state.values()) / len(state)
+            "Happy" if average > 80 else "Okay" if average > 50 else "Sad"
+
+    fast, slow = timed(compiled, count), timed(generic, count)
+    print(f'scalar: compiled {fast / count * 1e9:,.0f} ns/op, generic {slow / count * 1e9:,.0f} ns/op '
+          f'({slow / fast:.1f}x)')
+
+
+def sql(pets, count):
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    conn.execute('CREATE TABLE pets (id INTEGER PRIMARY KEY, hunger REAL, mood REAL, energy REAL, last_update REAL)')
+    conn.executemany('INSERT INTO pets (hunger, mood, energy, last_update) VALUES (100, 100, 100, 0)',
+                     [()] * pets)
+    decayed = PET_RULES.decay_sql('(:now - last_update) / 60.0')
+    statements = {}
+    for action in ACTIONS:
+        values = dict(decayed, **PET_RULES.effect_sql(action, decayed))
+        assignments = ', '.join(f'{stat} = {expr}' for stat, expr in values.items())
+        statements[action] = f'UPDATE pets SET {assignments}, last_update = :now WHERE id = :id'
+    rng = random.Random(0)
+    plan = [(rng.choice(ACTIONS), rng.randint(1, pets)) for _ in range(count)]
+
+    def one_update(n):
+        for i, (action, pet_id) in enumerate(plan[:n]):
+            conn.execute(statements[action], {'now': i, 'id': pet_id})
+
+    def read_modify_write(n):
+        for i, (action, pet_id) in enumerate(plan[:n]):
+            row = conn.execute('SELECT hunger, mood, energy, last_update FROM pets WHERE id = ?', (pet_id,)).fetchone()
+            state = PET_RULES.state(hunger=row[0], mood=row[1], energy=row[2])
+            PET_RULES.apply(action, PET_RULES.decay(state, (i - row[3]) / 60.0))
+            conn.execute('UPDATE pets SET hunger = ?, mood = ?, energy = ?, last_update = ? WHERE id = ?',
+                         (state.hunger, state.mood, state.energy, i, pet_id))
+
+    fast, slow = timed(one_update, count), timed(read_modify_write, count)
+    print(f'sql:    one UPDATE {count / fast:,.0f} actions/s, SELECT+UPDATE {count / slow:,.0f} actions/s '
+          f'({slow / fast:.1f}x)')
+    conn.close()
+
+
+def batch(pets):
+    rng = np.random.default_rng(0)
+    arrays = {stat: rng.uniform(0, 100, pets) for stat in PET_RULES.names}
+    minutes = rng.uniform(0, 120, pets)
+
+    def vectorized(n):
+        new = PET_RULES.decay_batch(arrays, minutes)
+        PET_RULES.status_batch(new)
+
+    columns = [arrays[stat].tolist() for stat in PET_RULES.names]
+    elapsed = minutes.tolist()
+
+    def loop(n):
+        state = PET_RULES.state()
+        for hunger, mood, energy, m in zip(*columns, elapsed):
+            state.hunger, state.mood, state.energy = hunger, mood, energy
+            PET_RULES.status(PET_RULES.decay(state, m))
+
+    fast, slow = timed(vectorized, pets), timed(loop, pets)
+    print(f'numpy:  batch {pets / fast:,.0f} pets/s, scalar loop {pets / slow:,.0f} pets/s ({slow / fast:.1f}x)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pets', type=int, default=100_000)
+    parser.add_argument('--actions', type=int, default=20_000)
+    args = parser.parse_args()
+    scalar(args.actions * 10)
+    sql(args.pets, args.actions)
+    batch(args.pets)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Bytes and microseconds per response for each serialization path.
+
+    python -m benchmarks.bench_serializer [--count 200000]
+
+Payloads are the three response shapes the backends send:
+  pet_state  - main.py PetState (name, rounded stats, status);
+  payload    - simple_server.py pet with created_at;
+  action     - main_new.py {"success", "pet": {...}, "message"}.
+
+Formats:
+  pydantic     - building the response model and dumping it (old main.py
+                 path, skipped when pydantic is not installed);
+  json.dumps   - dict + json.dumps(...).encode() (old simple_server path);
+  shape json   - serializer.Shape precompiled JSON encoder;
+  shape msgpack - serializer.Shape precompiled MessagePack encoder;
+  packb        - serializer.packb on the dict (msgpack package when
+                 installed, pure-Python fallback otherwise).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import serializer
+
+try:
+    from pydantic import BaseModel
+except ImportError:
+    BaseModel = None
+
+PET_STATE = serializer.Shape(
+    'pet_state', [('name', 'str'), ('hunger', 'float'), ('mood', 'float'), ('energy', 'float'), ('status', 'str')])
+PAYLOAD = serializer.Shape('payload', [
+    ('id', 'int'), ('name', 'str'), ('hunger', 'int'), ('energy', 'int'), ('mood', 'int'), ('health', 'int'),
+    ('status', 'str'), ('created_at', 'str?'),
+])
+PET = serializer.Shape('pet', [('id', 'int'), ('name', 'str'), ('hunger', 'number'), ('energy', 'number'),
+                               ('mood', 'number'), ('health', 'number'), ('status', 'str')])
+ACTION = serializer.Shape('action', [('success', 'bool'), ('pet', PET), ('message', 'str')])
+
+CASES = {
+    'pet_state': (PET_STATE, ('Rex', 73.4, 88.1, 41.0, 'Okay')),
+    'payload': (PAYLOAD, (42, 'Rex', 57, 80, 64, 100, 'healthy', '2024-05-01T12:30:00.123456')),
+    'action': (ACTION, (True, (1, 'Rex', 80.0, 90.0, 75.0, 100, 'Happy'), 'Rex has been fed!')),
+}
+
+if BaseModel is not None:
+    class PetState(BaseModel):
+        name: str
+        hunger: float
+        mood: float
+        energy: float
+        status: str
+
+
+def per_call(fn, count):
+    fn()
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def run(name, shape, values, count):
+    formats = {}
+    if BaseModel is not None and name == 'pet_state':
+        dump = 'model_dump_json' if hasattr(PetState, 'model_dump_json') else 'json'
+        formats['pydantic'] = lambda: getattr(PetState(**shape.dict(values)), dump)().encode()
+    formats['json.dumps'] = lambda: json.dumps(shape.dict(values)).encode()
+    formats['shape json'] = lambda: shape.json(values)
+    formats['shape msgpack'] = lambda: shape.msgpack(values)
+    formats['packb'] = lambda: serializer.packb(shape.dict(values))
+    expected = shape.dict(values)
+    assert json.loads(shape.json(values)) == expected
+    assert serializer.unpackb(shape.msgpack(values)) == expected
+    print(name)
+    for label, fn in formats.items():
+        print(f'  {label:14} {len(fn()):4d} B  {per_call(fn, count):6.2f} us')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200_000)
+    args = parser.parse_args()
+    for name, (shape, values) in CASES.items():
+        run(name, shape, values, args.count)
+
+
+if __name__ == '__main__':
+    main()
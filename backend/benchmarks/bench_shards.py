@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Write throughput of hash-sharded SQLite vs one file.
+
+    python -m benchmarks.bench_shards [--shards 1,2,4] [--processes 4] [--duration 5]
+                                      [--pets 10000] [--synchronous FULL] [--db-dir DIR]
+
+Every process updates random pets in their own transactions (BEGIN
+IMMEDIATE / UPDATE / COMMIT, busy retry as in the apps), routing each
+user_id through sharding.HashRing. With one file all writers queue on a
+single lock; with N shards they only collide on the same shard. Scaling
+needs as many free cores as processes.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+import sqlite_tuning
+from sharding import HashRing, shard_path
+
+SCHEMA = ('CREATE TABLE IF NOT EXISTS pets (id INTEGER PRIMARY KEY, user_id VARCHAR UNIQUE, name VARCHAR, '
+          'hunger FLOAT, mood FLOAT, energy FLOAT, last_update DATETIME)')
+
+
+def populate(database, shards, pets):
+    ring = HashRing(shards)
+    conns = [sqlite_tuning.connect(shard_path(database, i)) for i in range(shards)]
+    for conn in conns:
+        conn.execute(SCHEMA)
+    for i in range(pets):
+        user_id = f'user-{i}'
+        conns[ring.shard(user_id)].execute(
+            "INSERT INTO pets (user_id, name, hunger, mood, energy, last_update) "
+            "VALUES (?, 'Pet', 100, 100, 100, datetime('now'))", (user_id,))
+    for conn in conns:
+        conn.commit()
+        conn.close()
+
+
+def writer(database, shards, pets, duration, synchronous, seed, results):
+    ring = HashRing(shards)
+    conns = []
+    for i in range(shards):
+        conn = sqlite_tuning.connect(shard_path(database, i), isolation_level=None)
+        conn.execute(f'PRAGMA synchronous = {synchronous}')
+        conns.append(conn)
+    rng = random.Random(seed)
+    writes = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        user_id = f'user-{rng.randrange(pets)}'
+        conn = conns[ring.shard(user_id)]
+
+        def write():
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute("UPDATE pets SET hunger = MAX(0, hunger - 1), last_update = datetime('now') "
+                             "WHERE user_id = ?", (user_id,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+        sqlite_tuning.retry_busy(write, attempts=50)
+        writes += 1
+    results.put(writes)
+
+
+def run(args, shards):
+    directory = tempfile.mkdtemp(prefix=f'pet-shards-{shards}-', dir=args.db_dir)
+    database = os.path.join(directory, 'digital_pet.db')
+    populate(database, shards, args.pets)
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=writer, args=(database, shards, args.pets, args.duration,
+                                                     args.synchronous, seed, results))
+        for seed in range(args.processes)
+    ]
+    for proc in procs:
+        proc.start()
+    writes = sum(results.get() for _ in procs)
+    for proc in procs:
+        proc.join()
+    for i in range(shards):
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(shard_path(database, i) + suffix)
+            except FileNotFoundError:
+                pass
+    os.rmdir(directory)
+    return writes / args.duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', default='1,2,4')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--pets', type=int, default=10000)
+    parser.add_argument('--synchronous', default='NORMAL', choices=('OFF', 'NORMAL', 'FULL'))
+    parser.add_argument('--db-dir', default=None)
+    args = parser.parse_args()
+    print(f'{args.processes} writer processes, {os.cpu_count()} CPUs, synchronous={args.synchronous}')
+    baseline = None
+    for shards in (int(n) for n in args.shards.split(',')):
+        rate = run(args, shards)
+        baseline = baseline or rate
+        print(f'{shards:>3} shards: {rate:>10,.0f} writes/s  ({rate / baseline:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
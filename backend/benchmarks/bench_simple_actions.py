@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+simple_server action pipeline: latency, connects and commits per action.
+
+    python -m benchmarks.bench_simple_actions [iterations]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import simple_server
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    tmp = tempfile.mkdtemp()
+    simple_server.DATABASE = os.path.join(tmp, 'bench.db')
+    simple_server.init_db()
+
+    commits = [0]
+    connect = simple_server.ConnectionPool._connect
+
+    def counting_connect(self):
+        conn = connect(self)
+        conn.set_trace_callback(lambda sql: sql == 'COMMIT' and commits.__setitem__(0, commits[0] + 1))
+        return conn
+
+    simple_server.ConnectionPool._connect = counting_connect
+    handler = simple_server.PetRequestHandler.__new__(simple_server.PetRequestHandler)
+    handler.create_pet('Bench')
+    actions = [handler.feed_pet, handler.play_pet, handler.sleep_pet, handler.heal_pet, handler.get_pet]
+
+    commits[0] = 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        actions[i % len(actions)]()
+    elapsed = time.perf_counter() - start
+
+    pool = simple_server.get_pool()
+    print(f'actions:            {iterations}')
+    print(f'latency per action: {elapsed / iterations * 1e6:.1f} us')
+    print(f'commits per action: {commits[0] / iterations:.2f}')
+    print(f'connects total:     {pool.connects}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""
+Cold start of each backend: import time and time to the first state response.
+
+    python -m benchmarks.bench_startup [--targets main,main_new,simple] [--runs 5]
+                                       [--env KEY=VALUE ...] [--importtime 15]
+                                       [--budget budget.json] [--output startup.json]
+
+Metrics (median of --runs fresh processes, milliseconds):
+  import_ms      - `import <module>` inside the process, interpreter
+                   startup excluded;
+  first_state_ms - from spawning the server (suite.server_command) to the
+                   first 200 on the state route (/pet/state?user_id= for
+                   main.py, /pet for the others) on a database that already
+                   has the schema and a pet, i.e. a restart or a new replica;
+  fresh_ready_ms - the same on an empty database up to the first answer of
+                   the state route (404: no pet yet), schema creation included.
+
+--importtime N prints the N slowest imports of one run (python -X importtime,
+cumulative time), to see what a regression pulled in.
+
+Every metric has a ceiling in BUDGETS (per target); --budget reads a JSON
+file {"target": {"metric": ms}} that overrides them. A metric above its
+budget prints OVER BUDGET and the exit code is 1, so CI can run this
+after the load suite. The defaults are measured medians with about 10%
+headroom; a slower CI machine passes its own --budget file.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.loadgen import free_port
+from benchmarks.suite import TARGETS, git_revision, server_command
+
+# Медианы --runs 7 (без байткода в __pycache__) плюс ~10%; импорт main/main_new держим
+# ниже ~910 мс исходного `import main` (create_all при импорте, без шардов и журнала)
+BUDGETS = {
+    'main': {'import_ms': 900, 'first_state_ms': 1250, 'fresh_ready_ms': 1350},
+    'main_new': {'import_ms': 900, 'first_state_ms': 1250, 'fresh_ready_ms': 1300},
+    'simple': {'import_ms': 150, 'first_state_ms': 200, 'fresh_ready_ms': 250},
+}
+USER = 'startup'
+TIMEOUT = 30.0
+
+IMPORT_CODE = (
+    'import time; started = time.perf_counter(); import {module}; '
+    'print((time.perf_counter() - started) * 1000)'
+)
+
+
+def request(port, method, path, body=None):
+    """Статус ответа или None, пока порт не слушает."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=TIMEOUT)
+    try:
+        payload = json.dumps(body).encode() if body is not None else None
+        conn.request(method, path, payload, {'Content-Type': 'application/json'} if payload else {})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    except (ConnectionRefusedError, ConnectionResetError, http.client.RemoteDisconnected):
+        return None
+    finally:
+        conn.close()
+
+
+def spawn_until(target, workdir, env, accept):
+    """Миллисекунды от запуска процесса до ответа на state с кодом из accept."""
+    port = free_port()
+    cmd, env = server_command(target, port, workdir, env)
+    method, path, _ = target.request('state', USER)
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < TIMEOUT:
+            status = request(port, method, path)
+            if status in accept:
+                return (time.perf_counter() - started) * 1000
+            if proc.poll() is not None:
+                raise RuntimeError(f'{target.name} exited with {proc.returncode}')
+            # Порт ещё не слушает или схема не готова
+            time.sleep(0.002)
+        raise RuntimeError(f'{target.name}: no {accept} from {path} in {TIMEOUT}s (last {status})')
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def import_ms(target, workdir, env):
+    _, env = server_command(target, 0, workdir, env)
+    output = subprocess.run([sys.executable, '-c', IMPORT_CODE.format(module=target.module)], cwd=workdir,
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return float(output.split()[-1])
+
+
+def slowest_imports(target, workdir, env, count):
+    """(мс, модуль) из python -X importtime, по убыванию накопленного времени."""
+    _, env = server_command(target, 0, workdir, env)
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {target.module}'], cwd=workdir,
+                            env=env, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative) / 1000, module.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def run_target(target, args, env):
+    workdir = tempfile.mkdtemp(prefix=f'pet-startup-{target.name}-')
+    runs = {'import_ms': [], 'first_state_ms': [], 'fresh_ready_ms': []}
+    for run in range(args.runs):
+        fresh = os.path.join(workdir, f'fresh-{run}')
+        os.makedirs(fresh)
+        runs['fresh_ready_ms'].append(spawn_until(target, fresh, env, (200, 404)))
+    # Схема и питомец для перезапусков - один раз, как у работающего сервиса
+    port = free_port()
+    cmd, server_env = server_command(target, port, workdir, env)
+    proc = subprocess.Popen(cmd, cwd=workdir, env=server_env, stdout=subprocess.DEVNULL)
+    try:
+        method, path, body = target.request('create', USER)
+        deadline = time.perf_counter() + TIMEOUT
+        while request(port, method, path, body) is None and time.perf_counter() < deadline:
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+    for _ in range(args.runs):
+        runs['import_ms'].append(import_ms(target, workdir, env))
+        runs['first_state_ms'].append(spawn_until(target, workdir, env, (200,)))
+    result = {metric: round(statistics.median(values), 1) for metric, values in runs.items()}
+    result['max'] = {metric: round(max(values), 1) for metric, values in runs.items()}
+    if args.importtime:
+        result['slowest_imports'] = slowest_imports(target, workdir, env, args.importtime)
+    return result
+
+
+def over_budget(results, budgets):
+    lines = []
+    for name, result in results.items():
+        for metric, limit in budgets.get(name, {}).items():
+            if metric in result and result[metric] > limit:
+                lines.append(f'{name}: {metric} {result[metric]} ms > budget {limit} ms')
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', default='main,main_new,simple')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--env', action='append', default=[], help='KEY=VALUE for server processes')
+    parser.add_argument('--importtime', type=int, default=0, help='print the N slowest imports')
+    parser.add_argument('--budget', help='JSON file with per-target budgets (ms)')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    env = dict(item.split('=', 1) for item in args.env)
+    budgets = {name: dict(limits) for name, limits in BUDGETS.items()}
+    if args.budget:
+        with open(args.budget) as f:
+            for name, limits in json.load(f).items():
+                budgets.setdefault(name, {}).update(limits)
+
+    results = {}
+    print(f"{'target':>9} {'import ms':>10} {'first state ms':>15} {'fresh ready ms':>15}")
+    for name in args.targets.split(','):
+        result = results[name] = run_target(TARGETS[name], args, env)
+        print(f"{name:>9} {result['import_ms']:>10} {result['first_state_ms']:>15} {result['fresh_ready_ms']:>15}")
+        for elapsed, module in result.get('slowest_imports', []):
+            print(f'{"":>11}{elapsed:8.1f} ms  {module}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'revision': git_revision(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(), 'config': {'runs': args.runs, 'env': env},
+                       'budgets': budgets, 'results': results}, f, indent=2)
+    lines = over_budget(results, budgets)
+    for line in lines:
+        print(f'OVER BUDGET {line}')
+    if lines:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
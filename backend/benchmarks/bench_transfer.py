@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Rows per second for transfer.py export and import on a synthetic pets table.
+
+    python -m benchmarks.bench_transfer [--rows 1000000] [--format ndjson|csv] [--batch 5000] [--db-dir DIR]
+
+The reference dataset is --rows 10000000. Steps:
+  export         - all rows to a file (transfer.export_chunks);
+  import insert  - the file into an empty table (every user_id is new);
+  import update  - the same file again (every user_id exists, upsert updates).
+
+Peak RSS is printed at the end. Export and import keep one batch in
+memory; the rest is SQLite's page cache and mmap (bounded by the
+sqlite_tuning profile: 64 MiB + 256 MiB), so it levels off with --rows.
+"""
+import argparse
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import transfer
+
+SCHEMA = (
+    'CREATE TABLE pets (id INTEGER PRIMARY KEY, user_id VARCHAR, name VARCHAR, hunger FLOAT, mood FLOAT, '
+    'energy FLOAT, last_update DATETIME, created_at DATETIME, sad_at DATETIME, critical_at DATETIME);'
+    'CREATE INDEX ix_pets_user_id ON pets (user_id);'
+)
+
+
+def populate(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    stamp = now.strftime('%Y-%m-%d %H:%M:%S.%f')
+    # Прогнозы заполнены, как у строк сервера: иначе загрузка считает их сама (backfill)
+    projected = (now + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S.%f')
+    conn.executemany(
+        'INSERT INTO pets (user_id, name, hunger, mood, energy, last_update, created_at, sad_at, critical_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        ((f'user-{i}', f'Pet {i}', rng.uniform(0, 100), rng.uniform(0, 100), rng.uniform(0, 100),
+          (now - timedelta(seconds=rng.uniform(0, 86400))).strftime('%Y-%m-%d %H:%M:%S.%f'), stamp, projected,
+          projected)
+         for i in range(rows)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def report(label, rows, elapsed, extra=''):
+    print(f'{label:>14}: {rows:,} rows in {elapsed:.1f}s = {rows / elapsed:,.0f} rows/s {extra}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--format', choices=tuple(transfer.FORMATS), default='ndjson')
+    parser.add_argument('--batch', type=int, default=transfer.BATCH)
+    parser.add_argument('--db-dir', default=None)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp(dir=args.db_dir)
+    source, target = os.path.join(directory, 'source.db'), os.path.join(directory, 'target.db')
+    dump = os.path.join(directory, f'pets.{args.format}')
+
+    started = time.perf_counter()
+    populate(source, args.rows)
+    print(f'populated {args.rows:,} pets in {time.perf_counter() - started:.1f}s')
+
+    started = time.perf_counter()
+    with open(dump, 'wb') as output:
+        for chunk in transfer.export_chunks('pets', [source], args.format, args.batch):
+            output.write(chunk)
+    report('export', args.rows, time.perf_counter() - started, f'({os.path.getsize(dump) / 2**20:,.0f} MiB)')
+
+    conn = sqlite3.connect(target)
+    conn.executescript(SCHEMA)
+    conn.close()
+    for label in ('import insert', 'import update'):
+        with open(dump, 'rb') as stream:
+            result = transfer.import_rows(transfer.read_rows(stream, args.format), 'pets', [target], args.batch)
+        report(label, result['rows'], result['seconds'])
+
+    print(f'peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
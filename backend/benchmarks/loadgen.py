@@ -0,0 +1,165 @@
+"""
+Self-contained asyncio HTTP/1.1 load generator (stdlib only).
+
+Each virtual client holds one keep-alive connection and issues requests
+back to back, so `clients` is the number of concurrent in-flight requests.
+"""
+import asyncio
+import json
+import socket
+import time
+
+
+class HTTPClient:
+    """Minimal keep-alive HTTP/1.1 client over asyncio streams."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, body=None, headers=None):
+        if self.writer is None:
+            await self.connect()
+        payload = b'' if body is None else json.dumps(body).encode()
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(payload)}']
+        if body is not None:
+            lines.append('Content-Type: application/json')
+        for name, value in (headers or {}).items():
+            lines.append(f'{name}: {value}')
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by server')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            data = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await self.reader.read()
+
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, response_headers, data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, errors, elapsed):
+    latencies = sorted(latencies)
+    total = len(latencies) + errors
+    failed = errors + sum(count for status, count in statuses.items() if status >= 500)
+    return {
+        'requests': total,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'error_rate': round(failed / total, 4) if total else 0.0,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+async def run_load(host, port, next_request, clients=100, duration=10.0):
+    """Гоняет `clients` параллельных клиентов `duration` секунд.
+
+    next_request(client_index, seq) -> (method, path, body[, label])
+    выбирает следующий запрос клиента. Возвращает словарь summarize();
+    если запросы помечены label, в нём есть и разбивка 'routes' по меткам.
+    """
+    latencies = []
+    statuses = {}
+    errors = 0
+    by_label = {}
+    deadline = time.perf_counter() + duration
+
+    async def client(index):
+        nonlocal errors
+        http = HTTPClient(host, port)
+        seq = 0
+        while time.perf_counter() < deadline:
+            method, path, body, *label = next_request(index, seq)
+            seq += 1
+            bucket = by_label.setdefault(label[0], ([], {}, [0])) if label else None
+            started = time.perf_counter()
+            try:
+                status, _, _ = await http.request(method, path, body)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                if bucket:
+                    bucket[2][0] += 1
+                await http.close()
+                await asyncio.sleep(0.01)
+                continue
+            latency = time.perf_counter() - started
+            latencies.append(latency)
+            statuses[status] = statuses.get(status, 0) + 1
+            if bucket:
+                bucket[0].append(latency)
+                bucket[1][status] = bucket[1].get(status, 0) + 1
+        await http.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    result = summarize(latencies, statuses, errors, elapsed)
+    if by_label:
+        result['routes'] = {
+            label: summarize(route_latencies, route_statuses, route_errors[0], elapsed)
+            for label, (route_latencies, route_statuses, route_errors) in sorted(by_label.items())
+        }
+    return result
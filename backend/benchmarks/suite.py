@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+"""
+Load test for all three backends: main.py, main_new.py and simple_server.py.
+
+    python -m benchmarks.suite [--targets main,main_new,simple] [--clients 50]
+                               [--duration 10] [--in-process] [--workers N] [--env KEY=VALUE ...]
+                               [--backup] [--backup-pets 100000]
+                               [--output results.json] [--compare baseline.json]
+
+Each target gets a fresh database in a temporary directory and a warm-up
+set of pets, then a mixed workload (state reads plus create/feed/play/sleep/heal,
+see MIX). Per target it reports throughput, p50/p95/p99 latency, error
+rate (5xx and transport errors), a per-route breakdown and the number
+of SQL statements per request (from the server's /metrics).
+
+By default every target runs as its own server process on localhost
+(uvicorn for the FastAPI apps, `simple_server.py --mode threaded`).
+--in-process runs the server in a thread of this process instead (no
+process startup, but the load generator shares the GIL). The FastAPI
+apps share database.py, so run them in separate invocations there.
+--workers N starts the FastAPI apps through serve_workers.py with N
+worker processes (queries per request are then summed over workers).
+
+--backup measures the cost of hot backups (backup.py): after the normal
+run the database is padded with --backup-pets synthetic pets and the
+same load runs again while this process takes snapshots back to back.
+It reports the p99 of that run and its difference from the run without
+a backup. Padding and snapshots touch only the first shard file.
+
+--output writes JSON with the git revision; --compare reads an earlier
+file and flags targets whose rps dropped or p99 grew by more than
+--tolerance (exit code 1).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import backup
+import transfer
+from benchmarks.loadgen import HTTPClient, free_port, run_load, wait_for_port
+
+USERS = 200
+# Доли операций в смеси (в сумме 100)
+MIX = (('state', 70), ('feed', 10), ('play', 8), ('sleep', 6), ('heal', 3), ('create', 3))
+
+
+class Target:
+    """Как обратиться к операциям конкретного бэкенда."""
+
+    def __init__(self, name, module, per_user):
+        self.name = name
+        self.module = module
+        # main.py различает питомцев по user_id, остальные работают с одним питомцем
+        self.per_user = per_user
+
+    def request(self, op, user):
+        query = f'?user_id={user}' if self.per_user else ''
+        if op == 'state':
+            return 'GET', ('/pet/state' if self.per_user else '/pet') + query, None
+        if op == 'create':
+            return 'POST', ('/pet/create' if self.per_user else '/pet') + query, {'name': f'Pet {user}'}
+        return 'POST', f'/pet/{op}{query}', None
+
+
+TARGETS = {
+    'main': Target('main', 'main', per_user=True),
+    'main_new': Target('main_new', 'main_new', per_user=False),
+    'simple': Target('simple', 'simple_server', per_user=False),
+}
+
+
+def make_mix(target, seed=0):
+    ops = [op for op, weight in MIX for _ in range(weight)]
+    rng = random.Random(seed)
+    rng.shuffle(ops)
+
+    def next_request(client, seq):
+        op = ops[(client * 7 + seq) % len(ops)]
+        if op == 'create':
+            user = f'bench-new-{client}-{seq}'
+        else:
+            user = f'bench-{(client + seq) % USERS}'
+        return (*target.request(op, user), op)
+
+    return next_request
+
+
+async def create_pets(target, port):
+    http = HTTPClient('127.0.0.1', port)
+    for i in range(USERS if target.per_user else 1):
+        await http.request(*target.request('create', f'bench-{i}'))
+    await http.close()
+
+
+async def scrape_queries(port):
+    """Сумма SQL-операторов по всем запросам из /metrics (кроме самого /metrics)."""
+    http = HTTPClient('127.0.0.1', port)
+    status, _, body = await http.request('GET', '/metrics')
+    await http.close()
+    if status != 200:
+        return None
+    total = 0
+    for line in body.decode().splitlines():
+        if line.startswith('pet_http_request_db_queries_sum') and 'route="/metrics"' not in line:
+            total += float(line.rsplit(' ', 1)[1])
+    return int(total)
+
+
+def pad_database(target, path, pets):
+    """Синтетические питомцы, чтобы снимку было что копировать."""
+    if target.name == 'simple':
+        now = datetime.now().isoformat()
+        rows = ({'id': 1_000_000 + i, 'name': f'Pad {i}', 'hunger': 50, 'energy': 100, 'mood': 50, 'health': 100,
+                 'status': 'healthy', 'created_at': now, 'last_update': now} for i in range(pets))
+        transfer.import_rows(rows, 'pet', [path])
+    else:
+        now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+        rows = ({'user_id': f'pad-{i}', 'name': f'Pad {i}', 'hunger': 50.0, 'mood': 50.0, 'energy': 50.0,
+                 'created_at': now, 'last_update': now} for i in range(pets))
+        transfer.import_rows(rows, 'pets', [path])
+
+
+def load_during_backup(target, port, path, args):
+    """Та же нагрузка, пока в фоне подряд снимаются снимки path."""
+    directory = os.path.join(os.path.dirname(path), 'backups')
+    stop = threading.Event()
+    taken = []
+
+    def loop():
+        while not stop.is_set():
+            taken.append(backup.backup(path, directory, keep=1)['seconds'])
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    try:
+        result = asyncio.run(run_load('127.0.0.1', port, make_mix(target, args.seed), args.clients, args.duration))
+    finally:
+        stop.set()
+        thread.join()
+    result['snapshots'] = len(taken)
+    result['snapshot_seconds'] = round(max(taken), 3) if taken else None
+    return result
+
+
+# --- запуск серверов ---
+
+def server_command(target, port, workdir, env, workers=1):
+    """Команда и окружение процесса сервера target (см. start_process)."""
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, **env)
+    if target.name == 'simple':
+        # simple_server сам переходит в backend/, поэтому путь к БД задаётся явно
+        env['PET_SIMPLE_DATABASE'] = os.path.join(workdir, 'digital_pet.db')
+        cmd = [sys.executable, os.path.join(BACKEND_DIR, 'simple_server.py'), '--mode', 'threaded',
+               '--host', '127.0.0.1', '--port', str(port)]
+    elif workers > 1:
+        cmd = [sys.executable, os.path.join(BACKEND_DIR, 'serve_workers.py'), '--app', f'{target.module}:app',
+               '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port), '--backlog', '4096']
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', f'{target.module}:app', '--port', str(port),
+               '--log-level', 'warning', '--backlog', '4096']
+    return cmd, env
+
+
+def start_process(target, port, workdir, env, workers=1):
+    cmd, env = server_command(target, port, workdir, env, workers)
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    if not wait_for_port(port):
+        proc.kill()
+        raise RuntimeError(f'{target.name} did not start')
+
+    def stop():
+        proc.terminate()
+        proc.wait()
+
+    return stop
+
+
+def start_in_process(target, port, workdir):
+    os.chdir(workdir)
+    if target.name == 'simple':
+        import simple_server
+
+        simple_server.DATABASE = os.path.join(workdir, 'digital_pet.db')
+        simple_server.init_db()
+        simple_server._pool = simple_server.ThreadLocalPool(simple_server.DATABASE)
+        simple_server._read_pool = simple_server.ThreadLocalPool(simple_server.DATABASE, read_only=True)
+        server = simple_server.PooledHTTPServer(
+            ('127.0.0.1', port), simple_server.KeepAlivePetRequestHandler,
+            simple_server.DEFAULT_WORKERS, simple_server.DEFAULT_QUEUE_SIZE,
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.drain()
+            server.server_close()
+            simple_server.group_writer.stop()
+            simple_server.get_read_pool().close()
+            simple_server.get_pool().close()
+
+        return stop
+
+    import importlib
+
+    import uvicorn
+
+    import database
+
+    engines = {database.engine, database.read_engine}
+    for engine in engines:
+        # Соединения открываются заново уже в workdir
+        engine.dispose()
+    module = importlib.import_module(target.module)
+    database.ensure_schema()
+    server = uvicorn.Server(uvicorn.Config(module.app, host='127.0.0.1', port=port, log_level='warning'))
+    server.install_signal_handlers = lambda: None
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    if not wait_for_port(port):
+        raise RuntimeError(f'{target.name} did not start')
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+        for engine in engines:
+            engine.dispose()
+
+    return stop
+
+
+def run_target(target, args, env):
+    workdir = tempfile.mkdtemp(prefix=f'pet-bench-{target.name}-')
+    port = free_port()
+    cwd = os.getcwd()
+    if args.in_process:
+        stop = start_in_process(target, port, workdir)
+    else:
+        stop = start_process(target, port, workdir, env, args.workers)
+    try:
+        asyncio.run(create_pets(target, port))
+        before = asyncio.run(scrape_queries(port))
+        result = asyncio.run(run_load('127.0.0.1', port, make_mix(target, args.seed), args.clients, args.duration))
+        after = asyncio.run(scrape_queries(port))
+        if before is not None and after is not None:
+            result['queries'] = after - before
+            result['queries_per_request'] = round(result['queries'] / result['requests'], 2) if result['requests'] else 0.0
+        if args.backup:
+            path = os.path.join(workdir, 'digital_pet.db')
+            pad_database(target, path, args.backup_pets)
+            during = load_during_backup(target, port, path, args)
+            during['p99_delta_ms'] = round(during['p99_ms'] - result['p99_ms'], 2)
+            result['backup'] = during
+    finally:
+        stop()
+        os.chdir(cwd)
+    return result
+
+
+# --- отчёт ---
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        if result['rps'] < before['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: rps {before['rps']} -> {result['rps']}")
+        if result['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {before['p99_ms']} ms -> {result['p99_ms']} ms")
+        during, previous = result.get('backup'), before.get('backup')
+        if during and previous and during['p99_ms'] > previous['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 during backup {previous['p99_ms']} ms -> {during['p99_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', default='main,main_new,simple')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--in-process', action='store_true')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes for the FastAPI apps')
+    parser.add_argument('--env', action='append', default=[], help='KEY=VALUE for server processes')
+    parser.add_argument('--backup', action='store_true', help='repeat the load during back-to-back hot backups')
+    parser.add_argument('--backup-pets', type=int, default=100_000, help='synthetic pets added before --backup')
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+    env = dict(item.split('=', 1) for item in args.env)
+
+    results = {}
+    print(f"{'target':>9} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'q/req':>6}")
+    for name in args.targets.split(','):
+        result = results[name] = run_target(TARGETS[name], args, env)
+        print(f"{name:>9} {result['rps']:>9} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['error_rate']:>7} {result.get('queries_per_request', '-'):>6}")
+        during = result.get('backup')
+        if during:
+            print(f"{'+backup':>9} {during['rps']:>9} {during['p50_ms']:>8} {during['p95_ms']:>8} "
+                  f"{during['p99_ms']:>8} {during['error_rate']:>7} {'-':>6}  p99 {during['p99_delta_ms']:+} ms, "
+                  f"{during['snapshots']} snapshots (max {during['snapshot_seconds']}s)")
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'config': {
+            'clients': args.clients, 'duration': args.duration, 'seed': args.seed,
+            'in_process': args.in_process, 'workers': args.workers, 'env': env, 'mix': dict(MIX),
+            'backup': args.backup, 'backup_pets': args.backup_pets if args.backup else None,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Conditional GET (ETag / If-None-Match) для состояния питомца.
+
+Версия состояния - это то, что видит клиент: шкалы с той точностью, с
+которой их показывает ответ, статус и имя, плюс счётчик действий питомца
+(действие, не сдвинувшее видимых чисел, тоже меняет версию). Если ничего
+из этого не изменилось, сервер отвечает 304 без тела и без записи в БД. Без зависимостей - используется и в
+simple_server.py.
+"""
+import hashlib
+import threading
+
+
+def state_etag(*parts, digits=0):
+    """Слабый ETag по квантованному состоянию (числа округляются до digits знаков)."""
+    quantized = [round(part, digits) if isinstance(part, float) else part for part in parts]
+    digest = hashlib.blake2b(repr(quantized).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Слабое сравнение: W/ не учитывается
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ConditionalStats:
+    """Счётчики условных запросов: сколько пришло с If-None-Match и сколько получили 304."""
+
+    def __init__(self):
+        self.requests = 0
+        self.conditional = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+    def record(self, if_none_match, matched):
+        with self._lock:
+            self.requests += 1
+            if if_none_match:
+                self.conditional += 1
+            if matched:
+                self.not_modified += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'conditional': self.conditional,
+                'not_modified': self.not_modified,
+                'not_modified_rate': round(self.not_modified / self.requests, 4) if self.requests else 0.0,
+            }
@@ -1,19 +1,176 @@
-from sqlalchemy import create_engine
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./digital_pet.db"
+DATABASE_PATH = SQLALCHEMY_DATABASE_URL[len("sqlite:///"):]
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./digital_pet.db"
+
+# "sync" - обычные def-роуты в threadpool FastAPI, "async" - SQLAlchemy asyncio + aiosqlite
+DB_MODE = os.environ.get("PET_DB_MODE", "sync")
+USE_ASYNC_DB = DB_MODE == "async"
+
+sys.path.insert(0, os.path.dirname(__file__))
+try:
+    import metrics
+    import sqlite_tuning
+    from group_commit import GroupCommitWriter
+    from sharding import SHARD_COUNT, HashRing, shard_path
+except ImportError:
+    from . import metrics
+    from . import sqlite_tuning
+    from .group_commit import GroupCommitWriter
+    from .sharding import SHARD_COUNT, HashRing, shard_path
+
+class Shard:
+    """Один файл SQLite: engine записи, mode=ro engine для чтений и свой group commit."""
+
+    def __init__(self, index, path, label=""):
+        self.index = index
+        self.path = path
+        self.engine = create_engine(
+            f"sqlite:///{path}", connect_args={"check_same_thread": False},
+            poolclass=metrics.timed_pool(QueuePool, "write" + label),
+        )
+        event.listen(self.engine, "connect", lambda conn, record: sqlite_tuning.apply_pragmas(conn))
+        metrics.instrument_engine(self.engine, "write" + label)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+
+        # Чтения без записи (PET_SQLITE_READ_SPLIT=1) идут через mode=ro соединения
+        if sqlite_tuning.READ_SPLIT:
+            self.read_engine = create_engine(
+                "sqlite://",
+                creator=lambda: sqlite_tuning.connect(path, read_only=True, check_same_thread=False),
+                poolclass=metrics.timed_pool(QueuePool, "read" + label),
+            )
+            metrics.instrument_engine(self.read_engine, "read" + label)
+        else:
+            self.read_engine = self.engine
+        self.ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.read_engine)
+        # PET_GROUP_COMMIT=1: записи действий коммитятся пачками одним потоком на шард.
+        # У писателя своё соединение с synchronous=FULL: пачка подтверждается после fsync
+        self.group_engine = create_engine(
+            f"sqlite:///{path}", connect_args={"check_same_thread": False},
+            poolclass=QueuePool, pool_size=1, max_overflow=0,
+        )
+        event.listen(self.group_engine, "connect",
+                     lambda conn, record: sqlite_tuning.apply_pragmas(conn, durable=True))
+        metrics.instrument_engine(self.group_engine, "write" + label)
+        self.GroupSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.group_engine)
+        self.group_writer = GroupCommitWriter(self.group_scope, name="pet-group-commit" + label)
+
+    @contextmanager
+    def session_scope(self):
+        """Сессия, которая коммитится при выходе."""
+        with self._scope(self.SessionLocal) as db:
+            yield db
+
+    @contextmanager
+    def group_scope(self):
+        """session_scope на соединении писателя; unit of work для group commit."""
+        with self._scope(self.GroupSessionLocal) as db:
+            yield db
+
+    @staticmethod
+    @contextmanager
+    def _scope(factory):
+        db = factory()
+        try:
+            yield db
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+# PET_SHARDS=N: питомцы раскладываются по N файлам по user_id (см. sharding.py)
+if USE_ASYNC_DB and SHARD_COUNT > 1:
+    raise RuntimeError("PET_SHARDS > 1 is only supported with PET_DB_MODE=sync")
+ring = HashRing(SHARD_COUNT)
+shards = [
+    Shard(index, shard_path(DATABASE_PATH, index), f"-{index}" if SHARD_COUNT > 1 else "")
+    for index in range(SHARD_COUNT)
+]
+
+def shard_for(user_id: str) -> Shard:
+    return shards[0] if user_id is None else shards[ring.shard(user_id)]
+
+def ensure_schema():
+    """Схема всех шардов (migrations.py): на актуальной БД - один SELECT версии на шард."""
+    # Импорт здесь, а не в начале модуля: на старте он нужен только этой функции
+    try:
+        import migrations
+    except ImportError:
+        from . import migrations
+    for shard in shards:
+        migrations.ensure(shard.path, "main")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Шард 0 - прежняя единственная БД; main_new.py и запросы без user_id работают с ним
+engine = shards[0].engine
+read_engine = shards[0].read_engine
+SessionLocal = shards[0].SessionLocal
+ReadSessionLocal = shards[0].ReadSessionLocal
+session_scope = shards[0].session_scope
+group_writer = shards[0].group_writer
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+async_engine = None
+AsyncSessionLocal = None
+if USE_ASYNC_DB:
+    # aiosqlite нужен только в async-режиме
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL, poolclass=metrics.timed_pool(AsyncAdaptedQueuePool, "async")
+    )
+    event.listen(async_engine.sync_engine, "connect", lambda conn, record: sqlite_tuning.apply_pragmas(conn))
+    metrics.instrument_engine(async_engine.sync_engine, "async")
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def get_db(user_id: str = None):
+    """Сессия шарда, которому принадлежит user_id (query-параметр роута)."""
+    db = shard_for(user_id).SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(user_id: str = None):
+    db = shard_for(user_id).ReadSessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def fan_out(work, read=True):
+    """work(session) на каждом шарде параллельно; список результатов по шардам.
+
+    Для админских запросов (поиск по всем питомцам, подсчёты).
+    """
+    def run(shard):
+        db = (shard.ReadSessionLocal if read else shard.SessionLocal)()
+        try:
+            result = work(db)
+            if not read:
+                db.commit()
+            return result
+        finally:
+            db.close()
+
+    if len(shards) == 1:
+        return [run(shards[0])]
+    with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="pet-shard") as pool:
+        return list(pool.map(run, shards))
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
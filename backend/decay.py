@@ -0,0 +1,47 @@
+"""
+Stochastic decay engine for simple_server.
+
+Каждый тик (DECAY_INTERVAL_SECONDS) голод растёт, а энергия и настроение
+падают на случайные 1-2 единицы. Вместо цикла по тикам сумма N равномерных
+шагов {1, 2} сэмплируется напрямую: S = N + Binomial(N, 1/2).
+Сам догоняющий расчёт по шкалам - TICK_RULES.catch_up из rules.py.
+"""
+import hashlib
+import os
+import random
+
+STAT_MIN = 0
+STAT_MAX = 100
+
+# Если задан, каждый питомец получает собственный воспроизводимый ГСЧ.
+DECAY_SEED = os.environ.get('PET_DECAY_SEED')
+
+
+def pet_rng(pet_id, last_update, seed=None):
+    """Возвращает ГСЧ для догоняющего расчёта питомца.
+
+    Без seed (и без PET_DECAY_SEED) используется общий модуль random.
+    С seed результат зависит только от (seed, pet_id, last_update),
+    поэтому один и тот же расчёт можно повторить.
+    """
+    if seed is None:
+        seed = DECAY_SEED
+    if seed is None:
+        return random
+    digest = hashlib.blake2b(f'{seed}:{pet_id}:{last_update}'.encode(), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, 'big'))
+
+
+def sample_steps(ticks, distance, rng=random):
+    """Сумма `ticks` независимых шагов из {1, 2}, обрезанная сверху `distance`.
+
+    Каждый шаг не меньше 1, поэтому при ticks >= distance шкала гарантированно
+    упирается в границу и сэмплировать ничего не нужно. Иначе ticks < distance
+    <= STAT_MAX, и Binomial(ticks, 1/2) считается как popcount из ticks случайных
+    бит - за ограниченное время при любой длине отсутствия.
+    """
+    if ticks <= 0 or distance <= 0:
+        return 0
+    if ticks >= distance:
+        return distance
+    return min(distance, ticks + rng.getrandbits(ticks).bit_count())
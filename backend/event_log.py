@@ -0,0 +1,170 @@
+"""
+Event sourcing для main.py (PET_STATE_STORE=events, sync-режим).
+
+Действия не обновляют строку pets, а добавляют событие в pet_events
+(один INSERT ... SELECT без чтения и без конкуренции за горячую строку).
+Состояние - последний снимок из pet_snapshots плюс свёртка событий
+после него: распад между событиями (линейный, с границей шкалы, поэтому
+от разбиения на отрезки не зависит) и эффекты действий по тем же
+rules.PET_RULES, что и строка pets.
+
+Питомцы, созданные до включения журнала, начинают со своей строки pets,
+поэтому её шкалы при журнале не меняются (и sweeper не запускается);
+main.py обновляет в ней только прогноз sad_at/critical_at после событий.
+Async-режим журнал не поддерживает, main.py такую комбинацию не запускает.
+Снимок пишется при чтении, если после предыдущего накопилось не меньше
+PET_SNAPSHOT_EVERY событий; ответ на действие тоже читает состояние,
+так что снимки появляются каждые N событий. Состояние на любой момент
+в прошлом восстанавливается тем же способом (state(at=...)), с
+full=True - с самого начала журнала без снимков.
+"""
+import os
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import exists, insert, literal, select
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+try:
+    from models import Pet, PetEvent, PetSnapshot
+except ImportError:
+    from .models import Pet, PetEvent, PetSnapshot
+
+EVENT_SOURCING = os.environ.get("PET_STATE_STORE", "row") == "events"
+SNAPSHOT_EVERY = int(os.environ.get("PET_SNAPSHOT_EVERY", "50"))
+
+
+class PetEventStore:
+    """`rules` - линейные правила (rules.PET_RULES): распад и эффекты действий,
+    `initial` - шкалы нового питомца."""
+
+    def __init__(self, rules, initial, snapshot_every=SNAPSHOT_EVERY, enabled=EVENT_SOURCING):
+        self.rules = rules
+        self.initial = initial
+        self.snapshot_every = snapshot_every
+        self.enabled = enabled
+        self.appended = 0
+        self.snapshots = 0
+        self.replays = 0
+        self.replayed_events = 0
+        self._lock = threading.Lock()
+
+    # --- запись ---
+
+    def append(self, db, user_id, kind, name=None, at=None):
+        """Добавляет событие, если питомец существует; возвращает id события или None."""
+        at = at or datetime.utcnow()
+        source = select(literal(user_id), literal(kind), literal(name), literal(at))
+        if kind != "create":
+            source = source.where(exists().where(Pet.user_id == user_id))
+        stmt = (
+            insert(PetEvent)
+            .from_select(["user_id", "kind", "name", "created_at"], source)
+            .returning(PetEvent.id)
+        )
+        event_id = db.execute(stmt).scalar()
+        if event_id is not None:
+            with self._lock:
+                self.appended += 1
+        return event_id
+
+    # --- чтение ---
+
+    def _decay(self, state, until):
+        minutes = max(0.0, (until - state["at"]).total_seconds() / 60)
+        state.update(self.rules.decayed(state, minutes))
+        state["at"] = max(state["at"], until)
+
+    def _fold(self, state, events):
+        for event in events:
+            if event.kind == "create":
+                state = {"name": event.name, **self.initial, "at": event.created_at}
+                continue
+            if state is None:
+                continue
+            self._decay(state, event.created_at)
+            state.update(self.rules.effects(event.kind, state))
+        return state
+
+    def state(self, db, user_id, at=None, until_id=None, full=False):
+        """Состояние питомца на момент `at` (по умолчанию сейчас) или None.
+
+        until_id ограничивает свёртку событием с этим id (ответ на действие).
+        """
+        now = at or datetime.utcnow()
+        snapshot = None
+        if not full:
+            query = select(PetSnapshot).where(PetSnapshot.user_id == user_id, PetSnapshot.taken_at <= now)
+            if until_id is not None:
+                query = query.where(PetSnapshot.event_id <= until_id)
+            snapshot = db.execute(query.order_by(PetSnapshot.event_id.desc()).limit(1)).scalar()
+        query = select(PetEvent).where(PetEvent.user_id == user_id, PetEvent.created_at <= now)
+        if snapshot is not None:
+            query = query.where(PetEvent.id > snapshot.event_id)
+        if until_id is not None:
+            query = query.where(PetEvent.id <= until_id)
+        events = db.execute(query.order_by(PetEvent.id)).scalars().all()
+
+        base = None
+        if snapshot is not None:
+            base = {"name": snapshot.name, "hunger": snapshot.hunger, "mood": snapshot.mood,
+                    "energy": snapshot.energy, "at": snapshot.taken_at}
+        elif not events or events[0].kind != "create":
+            # Питомец заведён до включения журнала: строка pets служит нулевым снимком
+            row = db.execute(
+                select(Pet.name, Pet.hunger, Pet.mood, Pet.energy, Pet.last_update).where(Pet.user_id == user_id)
+            ).first()
+            if row is not None:
+                base = {"name": row.name, "hunger": row.hunger, "mood": row.mood, "energy": row.energy,
+                        "at": row.last_update or now}
+        state = self._fold(base, events)
+        with self._lock:
+            self.replays += 1
+            self.replayed_events += len(events)
+        if state is None:
+            return None
+        if at is None and len(events) >= self.snapshot_every:
+            self._snapshot(db, user_id, events[-1].id, state)
+        if until_id is None:
+            self._decay(state, now)
+        # Версия для ETag - id последнего учтённого события (0 - только строка pets)
+        version = events[-1].id if events else (snapshot.event_id if snapshot is not None else 0)
+        return SimpleNamespace(name=state["name"], hunger=state["hunger"], mood=state["mood"],
+                               energy=state["energy"], last_update=state["at"], version=version,
+                               events_replayed=len(events),
+                               snapshot_event_id=snapshot.event_id if snapshot is not None else None)
+
+    def _snapshot(self, db, user_id, event_id, state):
+        # Состояние сразу после события: распад до "сейчас" ещё не применён. Параллельные
+        # чтения пишут один и тот же снимок: уникальный (user_id, event_id) оставляет первый
+        stmt = insert(PetSnapshot).prefix_with("OR IGNORE").values(
+            user_id=user_id, event_id=event_id, taken_at=state["at"], name=state["name"],
+            hunger=state["hunger"], mood=state["mood"], energy=state["energy"],
+        )
+        if db.execute(stmt).rowcount:
+            with self._lock:
+                self.snapshots += 1
+
+    def events(self, db, user_id, after_id=0, limit=100):
+        query = (
+            select(PetEvent)
+            .where(PetEvent.user_id == user_id, PetEvent.id > after_id)
+            .order_by(PetEvent.id)
+            .limit(limit)
+        )
+        return [
+            {"id": event.id, "kind": event.kind, "name": event.name, "created_at": event.created_at.isoformat()}
+            for event in db.execute(query).scalars()
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "snapshot_every": self.snapshot_every,
+                "appended": self.appended,
+                "snapshots": self.snapshots,
+                "replays": self.replays,
+                "events_per_replay": round(self.replayed_events / self.replays, 2) if self.replays else 0.0,
+            }
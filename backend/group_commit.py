@@ -0,0 +1,148 @@
+"""
+Group commit для записей в SQLite.
+
+Запросы не коммитят сами, а ставят задачу в очередь одного потока-писателя.
+Он собирает задачи, пока не пройдёт окно `window` секунд с первой из них
+или не наберётся `max_batch`, выполняет их в одной транзакции и делает
+один COMMIT на всю пачку. Вызывающий получает результат только после
+COMMIT. unit_of_work писателя (database.py, simple_server.py) даёт
+отдельное соединение с synchronous=FULL при любом PET_SQLITE_PROFILE,
+поэтому COMMIT делает fsync: подтверждённая запись на диске, а цена
+одного fsync делится на всю пачку.
+
+Если пачка падает, транзакция откатывается и каждая задача повторяется в
+своей транзакции: ошибка одной задачи не задевает соседей. Поэтому задача
+должна быть функцией от handle без побочных эффектов вне БД.
+
+Без зависимостей: unit_of_work - любой контекстный менеджер, который
+выдаёт handle (sqlite3-соединение, Session) и коммитит при выходе.
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+GROUP_COMMIT_ENABLED = os.environ.get("PET_GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get("PET_GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("PET_GROUP_COMMIT_MAX_BATCH", "64"))
+
+
+class GroupCommitWriter:
+    def __init__(self, unit_of_work, window_ms=GROUP_COMMIT_WINDOW_MS, max_batch=GROUP_COMMIT_MAX_BATCH,
+                 enabled=GROUP_COMMIT_ENABLED, name="group-commit"):
+        self.unit_of_work = unit_of_work
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self.name = name
+        self.batches = 0
+        self.writes = 0
+        self.fallbacks = 0
+        self.max_batch_seen = 0
+        self._commit_seconds = deque(maxlen=4096)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, job):
+        """Ставит job(handle) в очередь; Future завершится после COMMIT пачки."""
+        # concurrent.futures (с logging) нужен только при включённом group commit - не на старте
+        from concurrent.futures import Future
+
+        future = Future()
+        if self._thread is None:
+            self.start()
+        self._queue.put((job, future))
+        return future
+
+    def run(self, job):
+        return self.submit(job).result()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Дописывает всё, что уже в очереди, и останавливает поток."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        results = []
+        try:
+            with self.unit_of_work() as handle:
+                for job, _ in batch:
+                    results.append(job(handle))
+        except Exception:
+            self.fallbacks += 1
+            for job, future in batch:
+                self._run_single(job, future)
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.batches += 1
+            self.writes += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self._commit_seconds.append(elapsed)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _run_single(self, job, future):
+        try:
+            with self.unit_of_work() as handle:
+                result = job(handle)
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            with self._lock:
+                self.batches += 1
+                self.writes += 1
+            future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            commits = sorted(self._commit_seconds)
+            return {
+                "enabled": self.enabled,
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "batches": self.batches,
+                "writes": self.writes,
+                "batch_size_avg": round(self.writes / self.batches, 2) if self.batches else 0.0,
+                "batch_size_max": self.max_batch_seen,
+                "fallbacks": self.fallbacks,
+                "commit_ms_avg": round(sum(commits) / len(commits) * 1000, 3) if commits else 0.0,
+                "commit_ms_p99": round(commits[int(0.99 * (len(commits) - 1))] * 1000, 3) if commits else 0.0,
+                "queued": self._queue.qsize(),
+            }
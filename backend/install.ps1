@@ -1,4 +1,4 @@
 # Install dependencies
 .\venv\Scripts\python.exe -m pip install --upgrade pip
 .\venv\Scripts\python.exe -m pip install sqlalchemy==2.1.0 --force-reinstall
-.\venv\Scripts\python.exe -m pip install fastapi uvicorn alembic
+.\venv\Scripts\python.exe -m pip install fastapi uvicorn
@@ -1,20 +1,39 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import APIRouter, FastAPI, Depends, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import bindparam, func, update
 from sqlalchemy.orm import Session
 import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 try:
-    from database import get_db, Base, engine
+    from database import get_db, async_engine, USE_ASYNC_DB, group_writer, shards, shard_for, fan_out, ensure_schema
+    from sqlite_tuning import lock_stats, retry_busy
     from models import Pet
+    from pet_cache import pet_cache
+    from conditional import ConditionalStats, etag_matches, state_etag
+    import metrics
+    from projection import linear_projection
+    from rules import PET_RULES
 except ImportError:
-    from .database import get_db, Base, engine
+    from .database import get_db, async_engine, USE_ASYNC_DB, group_writer, shards, shard_for, fan_out, ensure_schema
+    from .sqlite_tuning import lock_stats, retry_busy
     from .models import Pet
+    from .pet_cache import pet_cache
+    from .conditional import ConditionalStats, etag_matches, state_etag
+    from . import metrics
+    from .projection import linear_projection
+    from .rules import PET_RULES
 from pydantic import BaseModel
-from datetime import datetime
-
-Base.metadata.create_all(bind=engine)
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import List
+import heapq
+import tempfile
+import time
 
+# Схема создаётся и мигрирует не при импорте, а в startup (migrations.py)
 app = FastAPI(title="Digital Pet API")
 
 # Добавляем CORS для фронтенда
@@ -25,11 +44,176 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+def load_profiling():
+    """profiling.py: при PET_PROFILE=1 - на старте, иначе - при первом /admin/profiles."""
+    try:
+        import profiling
+    except ImportError:
+        from . import profiling
+    return profiling
+
+# PET_PROFILE=1: профили выборки и медленных запросов (см. profiling.py)
+if os.environ.get("PET_PROFILE", "0") == "1":
+    profiling = load_profiling()
+    app.add_middleware(profiling.ProfilingMiddleware, profiler=profiling.profiler)
+    profiled_engines = {engine for shard in shards for engine in (shard.engine, shard.read_engine)}
+    if async_engine:
+        profiled_engines.add(async_engine.sync_engine)
+    for profiled_engine in profiled_engines:
+        profiling.instrument_engine(profiled_engine, profiling.profiler)
+
+# PET_STATE_STORE=events: состояние в журнале pet_events, строка pets - только нулевой снимок
+# старых питомцев и прогнозные колонки. async_routes журнал не ведут
+EVENT_SOURCING = os.environ.get("PET_STATE_STORE", "row") == "events"
+if EVENT_SOURCING and USE_ASYNC_DB:
+    raise RuntimeError("PET_STATE_STORE=events is only supported with PET_DB_MODE=sync")
+
+# Под serve_workers.py (PET_WORKER_ID задан): инвалидации между процессами и общий /metrics (workers.py)
+workers = None
+if os.environ.get("PET_WORKER_ID") is not None:
+    try:
+        import workers
+    except ImportError:
+        from . import workers
+IS_PRIMARY = workers is None or workers.IS_PRIMARY
+
+# PET_SWEEPER_INTERVAL > 0: фоновый массовый распад всех питомцев (нужен numpy), по sweeper на шард.
+# Под serve_workers.py - только в воркере 0, чтобы процессы не гоняли один и тот же UPDATE
+decay_sweepers = []
+if float(os.environ.get("PET_SWEEPER_INTERVAL", "0")) > 0 and IS_PRIMARY:
+    if EVENT_SOURCING:
+        # Sweeper распадает строки pets, а при журнале это сдвинуло бы нулевой снимок
+        raise RuntimeError("PET_SWEEPER_INTERVAL is not supported with PET_STATE_STORE=events")
+    try:
+        from sweeper import DecaySweeper
+    except ImportError:
+        from .sweeper import DecaySweeper
+    decay_sweepers = [DecaySweeper(shard.path, "main") for shard in shards]
+
+# PET_BACKUP_INTERVAL > 0: горячие снимки всех шардов в PET_BACKUP_DIR (backup.py), тоже только в воркере 0
+backup_scheduler = None
+if float(os.environ.get("PET_BACKUP_INTERVAL", "0")) > 0 and IS_PRIMARY:
+    try:
+        from backup import BackupScheduler
+    except ImportError:
+        from .backup import BackupScheduler
+    backup_scheduler = BackupScheduler([shard.path for shard in shards])
+
+@app.on_event("startup")
+async def start_background():
+    await run_in_threadpool(ensure_schema)
+    pet_cache.start()
+    for sweeper in decay_sweepers:
+        sweeper.start()
+    if backup_scheduler:
+        backup_scheduler.start()
+    if worker_channel:
+        worker_channel.start()
+    if worker_metrics:
+        worker_metrics.start()
+
+@app.on_event("shutdown")
+async def stop_background():
+    if worker_channel:
+        worker_channel.stop()
+    if worker_metrics:
+        await run_in_threadpool(worker_metrics.stop)
+    if stream_hub is not None:
+        await stream_hub.stop()
+    for sweeper in decay_sweepers:
+        await run_in_threadpool(sweeper.stop)
+    if backup_scheduler:
+        await run_in_threadpool(backup_scheduler.stop)
+    for shard in shards:
+        await run_in_threadpool(shard.group_writer.stop)
+    await run_in_threadpool(pet_cache.stop)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Digital Pet API", "docs": "/docs"}
 
+@app.get("/group-commit/stats")
+def group_commit_stats():
+    if len(shards) == 1:
+        return group_writer.stats()
+    return {"shards": [shard.group_writer.stats() for shard in shards]}
+
+@app.get("/db/stats")
+def db_stats():
+    return {"sqlite": lock_stats.snapshot(), "event_log": get_event_store().stats(),
+            "sweepers": [sweeper.stats() for sweeper in decay_sweepers],
+            "backup": backup_scheduler.stats() if backup_scheduler else None,
+            "invalidation": worker_channel.stats() if worker_channel else None}
+
+@app.get("/admin/shards")
+def shard_stats():
+    """Питомцы по шардам (fan-out по всем файлам)."""
+    counts = fan_out(lambda db: db.query(func.count(Pet.id)).scalar())
+    return {"shards": [{"index": shard.index, "path": shard.path, "pets": count}
+                       for shard, count in zip(shards, counts)]}
+
+def load_transfer():
+    """transfer.py нужен только админским роутам - импортируется при первом вызове."""
+    try:
+        import transfer
+    except ImportError:
+        from . import transfer
+    return transfer
+
+def transfer_paths(table: str) -> list:
+    """pets - файлы шардов этого приложения, pet - БД simple_server.py (см. transfer.py)."""
+    if table == "pets":
+        return [shard.path for shard in shards]
+    return load_transfer().table_paths(table)
+
+@app.get("/admin/export")
+def export_pets(table: str = "pets", format: str = "ndjson"):
+    """Потоковая выгрузка таблицы (chunked), память не растёт с числом питомцев."""
+    transfer = load_transfer()
+    try:
+        chunks = transfer.export_chunks(table, transfer_paths(table), format)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return StreamingResponse(chunks, media_type=transfer.FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'})
+
+@app.post("/admin/import")
+async def import_pets(request: Request, table: str = "pets", format: str = "ndjson"):
+    """Upsert из тела запроса: тело идёт во временный файл, затем пишется кусками в threadpool."""
+    transfer = load_transfer()
+    if table not in transfer.TABLES or format not in transfer.FORMATS:
+        raise HTTPException(status_code=400, detail="unknown table or format")
+    # Строки pet (simple_server.py) в кэш этого приложения не попадают
+    on_batch = invalidate_pets if table == "pets" else None
+    with tempfile.TemporaryFile() as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        try:
+            return await run_in_threadpool(
+                transfer.import_rows, transfer.read_rows(body, format), table, transfer_paths(table),
+                on_batch=on_batch)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"import failed: {exc}")
+
+@app.get("/metrics")
+def get_metrics():
+    text = workers.render_metrics() if workers else metrics.render()
+    return Response(content=text, media_type=metrics.CONTENT_TYPE)
+
+@app.get("/admin/profiles")
+def slowest_profiles(limit: int = 20):
+    return load_profiling().profiler.slowest(limit)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {**pet_cache.stats(), "conditional": conditional_stats.snapshot()}
+
+# /pet/* роуты; в async-режиме вместо них подключается async_routes.router. В sync-режиме
+# они регистрируются прямо в app: include_router собрал бы каждый роут второй раз
+router = APIRouter() if USE_ASYNC_DB else app.router
+
 class PetCreate(BaseModel):
     name: str
 
@@ -40,136 +224,548 @@ class PetState(BaseModel):
     energy: float
     status: str
 
+# Шкалы, распад (единиц в минуту), эффекты действий и статусы - rules.PET_RULES, общие с main_new.py
+DECAY_PER_MINUTE = PET_RULES.rates
+apply_effects = PET_RULES.effects
+
 def update_stats(pet: Pet):
     now = datetime.utcnow()
-    time_passed_minutes = (now - pet.last_update).total_seconds() / 60
-    pet.hunger = max(0, pet.hunger - time_passed_minutes * 0.5)
-    pet.mood = max(0, pet.mood - time_passed_minutes * 0.3)
-    pet.energy = max(0, pet.energy - time_passed_minutes * 0.3)
+    PET_RULES.decay(pet, (now - pet.last_update).total_seconds() / 60)
     pet.last_update = now
 
-def get_status(pet: Pet) -> str:
-    avg = (pet.hunger + pet.mood + pet.energy) / 3
-    if avg > 80:
-        return "Happy"
-    elif avg > 50:
-        return "Okay"
+def decayed_values(now: datetime) -> dict:
+    """SQL-выражения для update_stats: распад считается внутри SQLite."""
+    last_update = func.coalesce(func.julianday(Pet.last_update), func.julianday(now))
+    minutes = (func.julianday(now) - last_update) * 1440
+    columns = {stat: getattr(Pet, stat) for stat in DECAY_PER_MINUTE}
+    return PET_RULES.decayed(columns, minutes, func.min, func.max)
+
+def action_statement(user_id: str, action: str):
+    """Распад и действие одним UPDATE ... RETURNING, без чтения и блокировок."""
+    now = datetime.utcnow()
+    values = decayed_values(now)
+    values.update(apply_effects(action, values, func.min, func.max))
+    return (
+        update(Pet)
+        .where(Pet.user_id == user_id)
+        .values(**values, last_update=now, version=Pet.version + 1)
+        .returning(Pet.id, Pet.name, Pet.hunger, Pet.mood, Pet.energy, Pet.last_update)
+        .execution_options(synchronize_session=False)
+    )
+
+_table = Pet.__table__
+projection_statement = (
+    _table.update()
+    .where(_table.c.id == bindparam("pid"))
+    .values(sad_at=bindparam("new_sad_at"), critical_at=bindparam("new_critical_at"))
+)
+
+# Прогноз по user_id: при журнале действия не знают id строки pets
+event_projection_statement = (
+    _table.update()
+    .where(_table.c.user_id == bindparam("uid"))
+    .values(sad_at=bindparam("new_sad_at"), critical_at=bindparam("new_critical_at"))
+)
+
+def projection_values(state, at: datetime) -> dict:
+    """Параметры new_sad_at/new_critical_at для состояния на момент at."""
+    projected = linear_projection(state, PET_RULES, at)
+    return {"new_sad_at": projected["sad_at"], "new_critical_at": projected["critical_at"]}
+
+def projection_params(pet_id: int, state, at: datetime) -> dict:
+    return {"pid": pet_id, **projection_values(state, at)}
+
+def write_action(db: Session, stmt):
+    """action_statement и прогноз порогов для новой строки в той же транзакции."""
+    row = db.execute(stmt).first()
+    if row:
+        db.execute(projection_statement, projection_params(row.id, row._mapping, row.last_update))
+    return row
+
+def commit_or_rollback(db: Session, work):
+    """work() + COMMIT; при ошибке откатывает, чтобы retry_busy мог повторить."""
+    try:
+        result = work()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
+
+def append_event(db: Session, user_id: str, kind: str):
+    """Событие в журнал (group commit или отдельный COMMIT); id или None, если питомца нет."""
+    writer = shard_for(user_id).group_writer
+    if writer.enabled:
+        return writer.run(lambda session: event_store.append(session, user_id, kind))
+    return retry_busy(lambda: commit_or_rollback(db, lambda: event_store.append(db, user_id, kind)))
+
+def write_event_projection(db: Session, user_id: str, event_id: int):
+    """Состояние сразу после события и прогноз порогов в строке pets (для /pets/attention)."""
+    row = event_store.state(db, user_id, until_id=event_id)
+    if row is not None:
+        db.execute(event_projection_statement, {"uid": user_id, **projection_values(vars(row), row.last_update)})
+    return row
+
+def apply_action(db: Session, user_id: str, action: str):
+    if EVENT_SOURCING:
+        event_id = append_event(db, user_id, action)
+        if event_id is None:
+            raise HTTPException(status_code=404, detail="Pet not found")
+        row = retry_busy(lambda: commit_or_rollback(db, lambda: write_event_projection(db, user_id, event_id)))
+        invalidate_pet(user_id)
+        notify_stream(user_id, row)
+        return row
+    stmt = action_statement(user_id, action)
+    writer = shard_for(user_id).group_writer
+    if writer.enabled:
+        row = writer.run(lambda session: write_action(session, stmt))
     else:
-        return "Sad"
+        row = retry_busy(lambda: commit_or_rollback(db, lambda: write_action(db, stmt)))
+    if not row:
+        raise HTTPException(status_code=404, detail="Pet not found")
+    invalidate_pet(user_id)
+    notify_stream(user_id, row)
+    return row
+
+# Не больше стольких действий на одного питомца в POST /pet/actions
+MAX_BATCH_ACTIONS = 50
+
+class PetActions(BaseModel):
+    user_id: str
+    actions: List[str]
+
+class ActionBatch(BaseModel):
+    actions: List[str] = []
+    pets: List[PetActions] = []
+
+def batch_plan(batch: ActionBatch, user_id: str = None) -> dict:
+    """user_id -> список действий по порядку; повторы user_id склеиваются."""
+    items = list(batch.pets)
+    if batch.actions:
+        if not user_id:
+            raise HTTPException(status_code=400, detail="user_id query parameter is required")
+        items.insert(0, PetActions(user_id=user_id, actions=batch.actions))
+    if not items:
+        raise HTTPException(status_code=400, detail="No actions given")
+    plan = {}
+    for item in items:
+        for action in item.actions:
+            if action not in PET_RULES.actions:
+                raise HTTPException(status_code=400, detail=f"Unknown action: {action}")
+        plan.setdefault(item.user_id, []).extend(item.actions)
+    for uid, actions in plan.items():
+        if len(actions) > MAX_BATCH_ACTIONS:
+            raise HTTPException(status_code=400, detail=f"Too many actions for {uid}")
+    return plan
+
+def batch_decay_statement(user_ids, now: datetime):
+    """Один UPDATE ... RETURNING с распадом для всех питомцев пачки.
+
+    Заодно берёт блокировку записи, так что действия ниже применяются
+    к состоянию, которое никто не успеет поменять до commit.
+    """
+    return (
+        update(Pet)
+        .where(Pet.user_id.in_(user_ids))
+        .values(**decayed_values(now), last_update=now)
+        .returning(Pet.user_id, Pet.name, Pet.hunger, Pet.mood, Pet.energy)
+        .execution_options(synchronize_session=False)
+    )
+
+batch_final_statement = (
+    _table.update()
+    .where(_table.c.user_id == bindparam("uid"))
+    .values(hunger=bindparam("new_hunger"), mood=bindparam("new_mood"), energy=bindparam("new_energy"),
+            sad_at=bindparam("new_sad_at"), critical_at=bindparam("new_critical_at"),
+            version=_table.c.version + bindparam("actions"))
+)
+
+def run_batch(plan: dict, rows, now: datetime):
+    """Применяет действия к распавшемуся состоянию в Python.
+
+    Возвращает (ответ, параметры для batch_final_statement, строки для notify).
+    """
+    results = []
+    params = []
+    finals = []
+    for row in rows:
+        state = {"hunger": row.hunger, "mood": row.mood, "energy": row.energy}
+        steps = []
+        for action in plan[row.user_id]:
+            state.update(apply_effects(action, state))
+            steps.append({"action": action, **pet_state(SimpleNamespace(name=row.name, **state))})
+        final = SimpleNamespace(name=row.name, last_update=now, **state)
+        results.append({"user_id": row.user_id, "state": pet_state(final), "steps": steps})
+        params.append({"uid": row.user_id, "new_hunger": state["hunger"], "new_mood": state["mood"],
+                       "new_energy": state["energy"], "actions": len(plan[row.user_id]),
+                       **projection_values(state, now)})
+        finals.append((row.user_id, final))
+    found = {row.user_id for row in rows}
+    missing = [uid for uid in plan if uid not in found]
+    return {"results": results, "missing": missing}, params, finals
+
+def write_batch(db: Session, plan: dict):
+    now = datetime.utcnow()
+    if EVENT_SOURCING:
+        return write_batch_events(db, plan, now)
+    rows = db.execute(batch_decay_statement(list(plan), now)).all()
+    response, params, finals = run_batch(plan, rows, now)
+    if params:
+        db.execute(batch_final_statement, params)
+    return response, finals
+
+def write_batch_events(db: Session, plan: dict, now: datetime):
+    """Пачка в режиме event sourcing: свёртка текущего состояния и INSERT событий."""
+    rows = []
+    for uid in plan:
+        pet = event_store.state(db, uid, at=now)
+        if pet is not None:
+            rows.append(SimpleNamespace(user_id=uid, name=pet.name, hunger=pet.hunger, mood=pet.mood,
+                                        energy=pet.energy))
+    response, params, finals = run_batch(plan, rows, now)
+    for row in rows:
+        for action in plan[row.user_id]:
+            event_store.append(db, row.user_id, action, at=now)
+    if params:
+        db.execute(event_projection_statement, [
+            {"uid": param["uid"], "new_sad_at": param["new_sad_at"], "new_critical_at": param["new_critical_at"]}
+            for param in params
+        ])
+    return response, finals
+
+def write_sharded_batch(plan: dict):
+    """Пачка по шардам: своя транзакция (и свой group commit) на каждый шард."""
+    by_shard = {}
+    for uid, actions in plan.items():
+        by_shard.setdefault(shard_for(uid), {})[uid] = actions
+    response, finals = {"results": [], "missing": []}, []
+    for shard, part in by_shard.items():
+        if shard.group_writer.enabled:
+            part_response, part_finals = shard.group_writer.run(lambda session: write_batch(session, part))
+        else:
+            db = shard.SessionLocal()
+            try:
+                part_response, part_finals = retry_busy(
+                    lambda: commit_or_rollback(db, lambda: write_batch(db, part))
+                )
+            finally:
+                db.close()
+        response["results"] += part_response["results"]
+        response["missing"] += part_response["missing"]
+        finals += part_finals
+    return response, finals
+
+def publish_batch(finals):
+    for uid, final in finals:
+        invalidate_pet(uid)
+        notify_stream(uid, final)
+
+# Тело ответа PetState без модели Pydantic: кодировщик формы (serializer.py) собирается
+# при первом ответе, а не при импорте
+PET_STATE_FIELDS = [("name", "str"), ("hunger", "float"), ("mood", "float"), ("energy", "float"), ("status", "str")]
+PET_STATE = None
+
+def load_serializer():
+    try:
+        import serializer
+    except ImportError:
+        from . import serializer
+    return serializer
+
+def pet_state_shape():
+    global PET_STATE
+    if PET_STATE is None:
+        PET_STATE = load_serializer().Shape("pet_state", PET_STATE_FIELDS)
+    return PET_STATE
+
+def pet_values(pet) -> tuple:
+    # float(): эффекты с потолком (min(100, ...)) и распад до нуля дают int, а round(int, 1) - int
+    return (pet.name, round(float(pet.hunger), 1), round(float(pet.mood), 1), round(float(pet.energy), 1),
+            get_status(pet))
+
+def pet_state(pet) -> dict:
+    return pet_state_shape().dict(pet_values(pet))
+
+def pet_response(pet, accept: str = None, etag: str = None) -> Response:
+    """PetState в JSON или MessagePack (по Accept)."""
+    body, media_type = pet_state_shape().render(pet_values(pet), accept)
+    headers = {"Vary": "Accept", "ETag": etag} if etag else {"Vary": "Accept"}
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def encoded_response(value, accept: str = None) -> Response:
+    body, media_type = load_serializer().render(value, accept)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
+
+def get_status(pet: Pet) -> str:
+    return PET_RULES.status(pet)
+
+conditional_stats = ConditionalStats()
+
+# Шкалы нового питомца - значения по умолчанию колонок models.Pet
+INITIAL_STATS = {stat: Pet.__table__.c[stat].default.arg for stat in DECAY_PER_MINUTE}
 
-@app.post("/pet/create")
-def create_pet(pet_data: PetCreate, user_id: str = None, db: Session = Depends(get_db)):
+# PET_STATE_STORE=events: действия пишутся в журнал pet_events (см. event_log.py).
+# Без журнала модуль нужен только роутам истории и импортируется при первом вызове
+event_store = None
+
+def get_event_store():
+    global event_store
+    if event_store is None:
+        try:
+            from event_log import PetEventStore
+        except ImportError:
+            from .event_log import PetEventStore
+        event_store = PetEventStore(PET_RULES, INITIAL_STATS, enabled=EVENT_SOURCING)
+    return event_store
+
+if EVENT_SOURCING:
+    get_event_store()
+
+metrics.CallbackGauge("pet_cache_lookups_total", "Pet state cache lookups.",
+                      lambda: {("hit",): pet_cache.hits, ("miss",): pet_cache.misses}, ("result",), type="counter")
+metrics.CallbackGauge("pet_cache_entries", "Pets held in the state cache.", lambda: pet_cache.stats()["entries"])
+metrics.CallbackGauge("pet_cache_bytes", "Estimated memory held by the state cache.", lambda: pet_cache.bytes)
+metrics.CallbackGauge("pet_http_not_modified_total", "Conditional GETs answered with 304.",
+                      lambda: conditional_stats.not_modified, type="counter")
+
+def pet_etag(pet) -> str:
+    """Версия питомца и шкалы с точностью ответа (pet_values - до десятых)."""
+    return state_etag(pet.version, *pet_values(pet), digits=1)
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+# SSE (pet_stream.py): планировщик создаётся первой подпиской, до неё уведомлять некого
+stream_hub = None
+
+def get_stream_hub():
+    global stream_hub
+    if stream_hub is None:
+        try:
+            from pet_stream import PetStreamHub
+        except ImportError:
+            from .pet_stream import PetStreamHub
+        stream_hub = PetStreamHub(PET_RULES, pet_state)
+    return stream_hub
+
+def notify_stream(user_id: str, row):
+    if stream_hub is not None:
+        stream_hub.notify(user_id, row)
+
+def invalidate_pet(user_id: str):
+    """Сброс кэша питомца здесь и, под serve_workers.py, в остальных воркерах."""
+    pet_cache.invalidate(user_id)
+    if worker_channel:
+        worker_channel.publish(user_id)
+
+def invalidate_pets(user_ids):
+    """invalidate_pet для пачки импорта (transfer.import_rows, on_batch)."""
+    for user_id in user_ids:
+        invalidate_pet(user_id)
+
+def on_remote_invalidate(user_id: str):
+    """Питомца изменил другой воркер: кэш долой, SSE-подписчикам - свежее состояние."""
+    pet_cache.invalidate(user_id)
+    if stream_hub is not None and stream_hub.is_watching(user_id):
+        row = load_pet_row(user_id)
+        if row:
+            stream_hub.notify(user_id, row)
+
+worker_channel = workers.channel_from_env(on_remote_invalidate) if workers else None
+worker_metrics = workers.MetricsWriter() if workers else None
+
+def read_pet(user_id: str):
+    """Питомец из read-only соединения (без распада, без записи).
+
+    При журнале - свёртка событий на сейчас: строка pets там не обновляется.
+    Снимок, если свёртка его добавит, в read-only сессии не сохраняется.
+    """
+    db = shard_for(user_id).ReadSessionLocal()
+    try:
+        if EVENT_SOURCING:
+            return event_store.state(db, user_id)
+        return db.query(Pet).filter(Pet.user_id == user_id).first()
+    finally:
+        db.close()
+
+def load_pet_row(user_id: str):
+    db = shard_for(user_id).ReadSessionLocal()
+    try:
+        if EVENT_SOURCING:
+            return event_store.state(db, user_id)
+        return db.query(Pet.name, Pet.hunger, Pet.mood, Pet.energy, Pet.last_update).filter(Pet.user_id == user_id).first()
+    finally:
+        db.close()
+
+@app.get("/pet/stream")
+async def stream_pet_state(user_id: str = None):
+    """SSE: состояние питомца при действиях и при изменении целых значений шкал."""
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id query parameter is required")
-    pet = db.query(Pet).filter(Pet.user_id == user_id).first()
-    if pet:
-        raise HTTPException(status_code=400, detail="Pet already exists")
-    pet = Pet(user_id=user_id, name=pet_data.name)
-    db.add(pet)
-    db.commit()
-    db.refresh(pet)
-    return PetState(
-        name=pet.name,
-        hunger=round(pet.hunger, 1),
-        mood=round(pet.mood, 1),
-        energy=round(pet.energy, 1),
-        status=get_status(pet)
+    hub = get_stream_hub()
+    if hub.loop is None:
+        hub.start()
+    row = None
+    if not hub.is_watching(user_id):
+        row = await run_in_threadpool(load_pet_row, user_id)
+        if not row:
+            raise HTTPException(status_code=404, detail="Pet not found")
+    return StreamingResponse(
+        hub.events(user_id, row, load=lambda: run_in_threadpool(load_pet_row, user_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-@app.get("/pet/state", response_model=PetState)
-def get_pet_state(user_id: str = None, db: Session = Depends(get_db)):
+def utc_naive(at: datetime) -> datetime:
+    return at.astimezone(timezone.utc).replace(tzinfo=None) if at.tzinfo else at
+
+@app.get("/pet/history")
+def pet_history(user_id: str = None, at: datetime = None, full: bool = False, db: Session = Depends(get_db)):
+    """Состояние питомца на момент `at` по журналу событий (full - без снимков)."""
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id query parameter is required")
-    pet = db.query(Pet).filter(Pet.user_id == user_id).first()
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
-    update_stats(pet)
+    pet = get_event_store().state(db, user_id, at=utc_naive(at) if at else None, full=full)
     db.commit()
-    return PetState(
-        name=pet.name,
-        hunger=round(pet.hunger, 1),
-        mood=round(pet.mood, 1),
-        energy=round(pet.energy, 1),
-        status=get_status(pet)
-    )
+    if pet is None:
+        raise HTTPException(status_code=404, detail="No events for this pet")
+    return {**pet_state(pet), "at": pet.last_update.isoformat(),
+            "events_replayed": pet.events_replayed, "snapshot_event_id": pet.snapshot_event_id}
 
-@app.post("/pet/feed")
-def feed_pet(user_id: str = None, db: Session = Depends(get_db)):
+@app.get("/pet/events")
+def pet_events(user_id: str = None, after_id: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id query parameter is required")
-    pet = db.query(Pet).filter(Pet.user_id == user_id).first()
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
-    update_stats(pet)
-    pet.hunger = min(100, pet.hunger + 30)
-    pet.mood = min(100, pet.mood + 10)
-    db.commit()
-    db.refresh(pet)
-    return PetState(
-        name=pet.name,
-        hunger=round(pet.hunger, 1),
-        mood=round(pet.mood, 1),
-        energy=round(pet.energy, 1),
-        status=get_status(pet)
+    return get_event_store().events(db, user_id, after_id, min(limit, 1000))
+
+@app.get("/pet/stream/stats")
+def stream_stats():
+    return get_stream_hub().stats()
+
+def new_pet(user_id: str, name: str) -> Pet:
+    projected = linear_projection(INITIAL_STATS, PET_RULES, datetime.utcnow())
+    return Pet(user_id=user_id, name=name, **projected)
+
+# Прогнозные колонки для /pets/attention
+ATTENTION_COLUMNS = {"sad": Pet.sad_at, "critical": Pet.critical_at}
+
+@app.get("/pets/attention")
+def pets_needing_attention(kind: str = "sad", within: int = 3600, limit: int = 100):
+    """Питомцы, которые станут Sad (или упрутся шкалой в ноль) в ближайшие within секунд.
+
+    Range scan по индексу прогнозной колонки, распад не считается.
+    """
+    column = ATTENTION_COLUMNS.get(kind)
+    if column is None:
+        raise HTTPException(status_code=400, detail=f"Unknown kind: {kind}")
+    now = datetime.utcnow()
+    limit = min(limit, 1000)
+    per_shard = fan_out(
+        lambda db: db.query(Pet.user_id, Pet.name, column.label("at"))
+        .filter(column > now, column <= now + timedelta(seconds=within))
+        .order_by(column)
+        .limit(limit)
+        .all()
     )
+    rows = heapq.nsmallest(limit, (row for rows in per_shard for row in rows), key=lambda row: row.at)
+    return {"kind": kind, "now": now.isoformat(),
+            "pets": [{"user_id": row.user_id, "name": row.name, "at": row.at.isoformat()} for row in rows]}
 
-@app.post("/pet/play")
-def play_with_pet(user_id: str = None, db: Session = Depends(get_db)):
+@router.post("/pet/create", response_model=PetState)
+def create_pet(pet_data: PetCreate, user_id: str = None, accept: str = Header(None),
+               db: Session = Depends(get_db)):
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id query parameter is required")
     pet = db.query(Pet).filter(Pet.user_id == user_id).first()
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
-    update_stats(pet)
-    pet.mood = min(100, pet.mood + 30)
-    pet.energy = max(0, pet.energy - 10)
+    if pet:
+        raise HTTPException(status_code=400, detail="Pet already exists")
+    pet = new_pet(user_id, pet_data.name)
+    db.add(pet)
+    if EVENT_SOURCING:
+        event_store.append(db, user_id, "create", name=pet_data.name)
     db.commit()
     db.refresh(pet)
-    return PetState(
-        name=pet.name,
-        hunger=round(pet.hunger, 1),
-        mood=round(pet.mood, 1),
-        energy=round(pet.energy, 1),
-        status=get_status(pet)
-    )
+    return pet_response(pet, accept)
 
-@app.post("/pet/sleep")
-def put_pet_to_sleep(user_id: str = None, db: Session = Depends(get_db)):
+@router.get("/pet/state", response_model=PetState)
+def get_pet_state(user_id: str = None, if_none_match: str = Header(None), accept: str = Header(None),
+                  db: Session = Depends(get_db)):
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id query parameter is required")
-    pet = db.query(Pet).filter(Pet.user_id == user_id).first()
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
-    update_stats(pet)
-    pet.energy = min(100, pet.energy + 50)
-    pet.hunger = max(0, pet.hunger - 5)
-    db.commit()
-    db.refresh(pet)
-    return PetState(
-        name=pet.name,
-        hunger=round(pet.hunger, 1),
-        mood=round(pet.mood, 1),
-        energy=round(pet.energy, 1),
-        status=get_status(pet)
-    )
+    if EVENT_SOURCING:
+        pet = event_store.state(db, user_id)
+        if pet is None:
+            raise HTTPException(status_code=404, detail="Pet not found")
+        db.commit()
+        etag = pet_etag(pet)
+        matched = etag_matches(if_none_match, etag)
+        conditional_stats.record(if_none_match, matched)
+        if matched:
+            return not_modified(etag)
+    elif pet_cache.enabled:
+        now = time.monotonic()
+        entry = pet_cache.get(user_id, now)
+        if entry is None:
+            version = pet_cache.version
+            pet = read_pet(user_id)
+            if not pet:
+                raise HTTPException(status_code=404, detail="Pet not found")
+            entry = pet_cache.put(pet, version, now)
+        pet = pet_cache.refresh(entry, update_stats, dirty=False)
+        etag = pet_etag(pet)
+        matched = etag_matches(if_none_match, etag)
+        conditional_stats.record(if_none_match, matched)
+        if matched:
+            return not_modified(etag)
+        pet_cache.mark_dirty(entry)
+    else:
+        pet = db.query(Pet).filter(Pet.user_id == user_id).first()
+        if not pet:
+            raise HTTPException(status_code=404, detail="Pet not found")
+        update_stats(pet)
+        etag = pet_etag(pet)
+        matched = etag_matches(if_none_match, etag)
+        conditional_stats.record(if_none_match, matched)
+        if matched:
+            db.rollback()
+            return not_modified(etag)
+        db.commit()
+    return pet_response(pet, accept, etag)
+
+@router.post("/pet/actions")
+def apply_actions(batch: ActionBatch, user_id: str = None, accept: str = Header(None)):
+    """Несколько действий (и питомцев) за одну транзакцию на шард и один расчёт распада."""
+    plan = batch_plan(batch, user_id)
+    response, finals = write_sharded_batch(plan)
+    publish_batch(finals)
+    return encoded_response(response, accept)
 
-@app.post("/pet/heal")
-def heal_pet(user_id: str = None, db: Session = Depends(get_db)):
+@router.post("/pet/feed", response_model=PetState)
+def feed_pet(user_id: str = None, accept: str = Header(None), db: Session = Depends(get_db)):
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id query parameter is required")
-    pet = db.query(Pet).filter(Pet.user_id == user_id).first()
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
-    update_stats(pet)
-    pet.hunger = 100
-    pet.mood = 100
-    pet.energy = 100
-    db.commit()
-    db.refresh(pet)
-    return PetState(
-        name=pet.name,
-        hunger=round(pet.hunger, 1),
-        mood=round(pet.mood, 1),
-        energy=round(pet.energy, 1),
-        status=get_status(pet)
-    )
+    return pet_response(apply_action(db, user_id, "feed"), accept)
+
+@router.post("/pet/play", response_model=PetState)
+def play_with_pet(user_id: str = None, accept: str = Header(None), db: Session = Depends(get_db)):
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id query parameter is required")
+    return pet_response(apply_action(db, user_id, "play"), accept)
+
+@router.post("/pet/sleep", response_model=PetState)
+def put_pet_to_sleep(user_id: str = None, accept: str = Header(None), db: Session = Depends(get_db)):
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id query parameter is required")
+    return pet_response(apply_action(db, user_id, "sleep"), accept)
+
+@router.post("/pet/heal", response_model=PetState)
+def heal_pet(user_id: str = None, accept: str = Header(None), db: Session = Depends(get_db)):
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id query parameter is required")
+    return pet_response(apply_action(db, user_id, "heal"), accept)
+
+if USE_ASYNC_DB:
+    try:
+        from async_routes import router as async_router
+    except ImportError:
+        from .async_routes import router as async_router
+    app.include_router(async_router)
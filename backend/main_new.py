@@ -1,22 +1,30 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
 try:
-    from database import get_db, Base, engine
+    from database import get_db, group_writer, DATABASE_PATH, ensure_schema
     from models import Pet
+    from conditional import ConditionalStats, etag_matches, state_etag
+    import metrics
+    from rules import PET_RULES
+    import serializer
 except ImportError:
-    from .database import get_db, Base, engine
+    from .database import get_db, group_writer, DATABASE_PATH, ensure_schema
     from .models import Pet
+    from .conditional import ConditionalStats, etag_matches, state_etag
+    from . import metrics
+    from .rules import PET_RULES
+    from . import serializer
 
 from pydantic import BaseModel
 from datetime import datetime
 
-Base.metadata.create_all(bind=engine)
-
+# Схема создаётся и мигрирует в startup (migrations.py), импорт БД не трогает
 app = FastAPI(title="Digital Pet API")
 
 # Добавляем CORS для фронтенда
@@ -27,6 +35,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 @app.get("/")
 def read_root():
@@ -43,167 +52,161 @@ class PetState(BaseModel):
     energy: float
     status: str
 
+# Распад и эффекты действий - те же rules.PET_RULES, что в main.py; шкалы питомца - его шкалы
+# (в models.Pet нет health: она есть только у simple_server)
+STATS = PET_RULES.names
+
 def update_stats(pet: Pet):
     now = datetime.utcnow()
-    time_passed_minutes = (now - pet.last_update).total_seconds() / 60
-    pet.hunger = max(0, min(100, pet.hunger - time_passed_minutes * 0.5))
-    pet.mood = max(0, min(100, pet.mood - time_passed_minutes * 0.3))
-    pet.energy = max(0, min(100, pet.energy - time_passed_minutes * 0.3))
+    PET_RULES.decay(pet, (now - pet.last_update).total_seconds() / 60)
     pet.last_update = now
 
-def get_status(pet: Pet) -> str:
-    avg = (pet.hunger + pet.mood + pet.energy) / 3
-    if avg > 80:
-        return "Happy"
-    elif avg > 50:
-        return "Okay"
+def decayed_values(now: datetime) -> dict:
+    """SQL-выражения для update_stats: распад считается внутри SQLite."""
+    last_update = func.coalesce(func.julianday(Pet.last_update), func.julianday(now))
+    minutes = (func.julianday(now) - last_update) * 1440
+    columns = {stat: getattr(Pet, stat) for stat in PET_RULES.rates}
+    return PET_RULES.decayed(columns, minutes, func.min, func.max)
+
+def apply_action(db: Session, action: str):
+    """Распад и действие над первым питомцем одним UPDATE ... RETURNING."""
+    now = datetime.utcnow()
+    values = decayed_values(now)
+    values.update(PET_RULES.effects(action, values, func.min, func.max))
+    first_pet_id = select(func.min(Pet.id)).scalar_subquery()
+    stmt = (
+        update(Pet)
+        .where(Pet.id == first_pet_id)
+        .values(**values, last_update=now, version=Pet.version + 1)
+        .returning(Pet.id, Pet.name, *(getattr(Pet, stat) for stat in STATS))
+        .execution_options(synchronize_session=False)
+    )
+    if group_writer.enabled:
+        row = group_writer.run(lambda session: session.execute(stmt).first())
     else:
-        return "Sad"
+        row = db.execute(stmt).first()
+        db.commit()
+    if not row:
+        raise HTTPException(status_code=404, detail="Pet not found")
+    return row
+
+def get_status(pet: Pet) -> str:
+    return PET_RULES.status(pet)
+
+# Формы ответов (serializer.py): JSON или MessagePack по Accept без промежуточных dict
+PET_FIELDS = [("id", "int"), ("name", "str")] + [(stat, "number") for stat in STATS] + [("status", "str")]
+PET = serializer.Shape("pet", PET_FIELDS)
+PET_READ = serializer.Shape("pet_read", PET_FIELDS + [("lastUpdated", "str?"), ("createdAt", "str?")])
+PET_CREATED = serializer.Shape("pet_created", PET_FIELDS + [("message", "str")])
+PET_ACTION = serializer.Shape("pet_action", [("success", "bool"), ("pet", PET), ("message", "str")])
+
+def pet_values(pet) -> tuple:
+    """Шкалы до десятых, как в main.py: тело ответа и ETag (get_pet) - одно и то же."""
+    return (pet.id, pet.name, *(round(float(getattr(pet, stat)), 1) for stat in STATS), get_status(pet))
+
+def isoformat(value):
+    return value.isoformat() if value else None
+
+def shape_response(shape, values, accept: str = None, headers: dict = None) -> Response:
+    body, media_type = shape.render(values, accept)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept", **(headers or {})})
+
+def action_response(db: Session, action: str, accept: str, message: str) -> Response:
+    pet = apply_action(db, action)
+    return shape_response(PET_ACTION, (True, pet_values(pet), message.format(name=pet.name)), accept)
+
+conditional_stats = ConditionalStats()
+metrics.CallbackGauge("pet_http_not_modified_total", "Conditional GETs answered with 304.",
+                      lambda: conditional_stats.not_modified, type="counter")
+
+# PET_BACKUP_INTERVAL > 0: горячие снимки БД в PET_BACKUP_DIR (backup.py)
+backup_scheduler = None
+if float(os.environ.get("PET_BACKUP_INTERVAL", "0")) > 0:
+    try:
+        from backup import BackupScheduler
+    except ImportError:
+        from .backup import BackupScheduler
+    backup_scheduler = BackupScheduler([DATABASE_PATH])
+
+@app.on_event("startup")
+def start_background():
+    ensure_schema()
+    if backup_scheduler:
+        backup_scheduler.start()
+
+@app.on_event("shutdown")
+def stop_group_commit():
+    if backup_scheduler:
+        backup_scheduler.stop()
+    group_writer.stop()
+
+@app.get("/group-commit/stats")
+def group_commit_stats():
+    return group_writer.stats()
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/pet/conditional/stats")
+def get_conditional_stats():
+    return conditional_stats.snapshot()
 
 @app.get("/pet")
-def get_pet(db: Session = Depends(get_db)):
+def get_pet(if_none_match: str = Header(None), accept: str = Header(None), db: Session = Depends(get_db)):
     """Получить первого питомца (для упрощения)"""
     pet = db.query(Pet).first()
     if not pet:
         raise HTTPException(status_code=404, detail="No pet found. Create one first!")
     update_stats(pet)
+    # lastUpdated меняется на каждом чтении, в версию входят счётчик действий и видимое состояние
+    etag = state_etag(pet.version, *pet_values(pet), digits=1)
+    matched = etag_matches(if_none_match, etag)
+    conditional_stats.record(if_none_match, matched)
+    if matched:
+        db.rollback()
+        return Response(status_code=304, headers={"ETag": etag})
     db.commit()
-    return {
-        "id": pet.id,
-        "name": pet.name,
-        "hunger": pet.hunger,
-        "energy": pet.energy,
-        "mood": pet.mood,
-        "health": pet.health,
-        "status": get_status(pet),
-        "lastUpdated": pet.last_update.isoformat() if pet.last_update else None,
-        "createdAt": pet.created_at.isoformat() if pet.created_at else None
-    }
+    values = pet_values(pet) + (isoformat(pet.last_update), isoformat(pet.created_at))
+    return shape_response(PET_READ, values, accept, {"ETag": etag})
 
 @app.post("/pet")
-def create_pet(pet_data: PetCreate, db: Session = Depends(get_db)):
+def create_pet(pet_data: PetCreate, accept: str = Header(None), db: Session = Depends(get_db)):
     """Создать нового питомца"""
-    # Удаляем старого питомца если есть
+    # Удаляем старого питомца если есть - в той же транзакции, что и вставка: параллельный
+    # create не удалит нового питомца между вставкой и ответом
     db.query(Pet).delete()
-    db.commit()
-    
     pet = Pet(
         name=pet_data.name,
         hunger=50,
         energy=100,
-        mood=75,
-        health=100
+        mood=75
     )
     db.add(pet)
+    db.flush()
+    values = pet_values(pet) + (f"Pet {pet.name} created successfully!",)
     db.commit()
-    db.refresh(pet)
-    return {
-        "id": pet.id,
-        "name": pet.name,
-        "hunger": pet.hunger,
-        "energy": pet.energy,
-        "mood": pet.mood,
-        "health": pet.health,
-        "status": get_status(pet),
-        "message": f"Pet {pet.name} created successfully!"
-    }
+    return shape_response(PET_CREATED, values, accept)
 
 @app.post("/pet/feed")
-def feed_pet(db: Session = Depends(get_db)):
+def feed_pet(accept: str = Header(None), db: Session = Depends(get_db)):
     """Покормить питомца"""
-    pet = db.query(Pet).first()
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
-    update_stats(pet)
-    pet.hunger = max(0, pet.hunger - 30)
-    pet.mood = min(100, pet.mood + 10)
-    db.commit()
-    return {
-        "success": True,
-        "pet": {
-            "id": pet.id,
-            "name": pet.name,
-            "hunger": pet.hunger,
-            "energy": pet.energy,
-            "mood": pet.mood,
-            "health": pet.health,
-            "status": get_status(pet)
-        },
-        "message": f"{pet.name} has been fed!"
-    }
+    return action_response(db, "feed", accept, "{name} has been fed!")
 
 @app.post("/pet/play")
-def play_with_pet(db: Session = Depends(get_db)):
+def play_with_pet(accept: str = Header(None), db: Session = Depends(get_db)):
     """Поиграть с питомцем"""
-    pet = db.query(Pet).first()
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
-    update_stats(pet)
-    pet.mood = min(100, pet.mood + 30)
-    pet.energy = max(0, pet.energy - 20)
-    pet.hunger = max(0, pet.hunger - 10)
-    db.commit()
-    return {
-        "success": True,
-        "pet": {
-            "id": pet.id,
-            "name": pet.name,
-            "hunger": pet.hunger,
-            "energy": pet.energy,
-            "mood": pet.mood,
-            "health": pet.health,
-            "status": get_status(pet)
-        },
-        "message": f"{pet.name} is happy!"
-    }
+    return action_response(db, "play", accept, "{name} is happy!")
 
 @app.post("/pet/sleep")
-def sleep_pet(db: Session = Depends(get_db)):
+def sleep_pet(accept: str = Header(None), db: Session = Depends(get_db)):
     """Уложить питомца спать"""
-    pet = db.query(Pet).first()
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
-    update_stats(pet)
-    pet.energy = min(100, pet.energy + 50)
-    pet.hunger = max(0, pet.hunger - 5)
-    db.commit()
-    return {
-        "success": True,
-        "pet": {
-            "id": pet.id,
-            "name": pet.name,
-            "hunger": pet.hunger,
-            "energy": pet.energy,
-            "mood": pet.mood,
-            "health": pet.health,
-            "status": get_status(pet)
-        },
-        "message": f"{pet.name} is sleeping zzz..."
-    }
+    return action_response(db, "sleep", accept, "{name} is sleeping zzz...")
 
 @app.post("/pet/heal")
-def heal_pet(db: Session = Depends(get_db)):
+def heal_pet(accept: str = Header(None), db: Session = Depends(get_db)):
     """Вылечить питомца"""
-    pet = db.query(Pet).first()
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
-    update_stats(pet)
-    pet.health = min(100, pet.health + 50)
-    pet.mood = min(100, pet.mood + 20)
-    db.commit()
-    return {
-        "success": True,
-        "pet": {
-            "id": pet.id,
-            "name": pet.name,
-            "hunger": pet.hunger,
-            "energy": pet.energy,
-            "mood": pet.mood,
-            "health": pet.health,
-            "status": get_status(pet)
-        },
-        "message": f"{pet.name} is healthy now!"
-    }
+    return action_response(db, "heal", accept, "{name} is healthy now!")
 
 if __name__ == "__main__":
     import uvicorn
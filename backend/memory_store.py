@@ -0,0 +1,369 @@
+"""
+Хранилище питомцев simple_server в памяти (PET_SIMPLE_STORAGE=memory).
+
+Все питомцы лежат в колонках array: hunger/energy/mood/health по байту,
+last_update (float, epoch) и created_at (целые секунды), имена - в общем
+bytearray со смещениями. id питомца - номер строки + 1 (simple_server
+питомцев не удаляет). Около 20 байт на питомца плюс байты имени.
+Чтения и действия не ходят в SQLite; статус dead - это health == 0.
+
+Надёжность - бинарный журнал (wal.<поколение>) с итоговым состоянием
+строки после каждой записи: распад случайный, поэтому журналируется
+результат, а не действие. Журнал сбрасывается в ОС на каждой записи
+(переживает падение процесса) и fsync-ится раз в секунду, с
+PET_MEMORY_FSYNC=1 - на каждой записи. Раз в PET_MEMORY_SNAPSHOT_SECONDS
+(или когда журнал больше PET_MEMORY_SNAPSHOT_BYTES) колонки пишутся в
+компактный снимок, и начинается новое поколение журнала; старые удаляются
+после того, как снимок на диске. При старте читается снимок и
+проигрываются журналы его поколения и новее; оборванная последняя запись
+отбрасывается.
+"""
+import array
+import heapq
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from decay import pet_rng
+from projection import ticks_to_critical
+from rules import TICK_RULES
+
+MEMORY_DIR = os.environ.get('PET_MEMORY_DIR', '../pet_memory')
+MEMORY_FSYNC = os.environ.get('PET_MEMORY_FSYNC', '0') == '1'
+SNAPSHOT_SECONDS = float(os.environ.get('PET_MEMORY_SNAPSHOT_SECONDS', '300'))
+SNAPSHOT_WAL_BYTES = int(os.environ.get('PET_MEMORY_SNAPSHOT_BYTES', str(64 << 20)))
+SYNC_SECONDS = 1.0
+
+KIND_UPDATE = 1
+KIND_CREATE = 2
+# kind, id, hunger, energy, mood, health, last_update [, created_at, длина имени + имя]
+_UPDATE = struct.Struct('<BIbbbbd')
+_CREATE = struct.Struct('<BIbbbbdIH')
+SNAPSHOT_MAGIC = b'PETMEM01'
+# magic, поколение, число питомцев; колонки в порядке COLUMNS, смещения имён, имена, crc32
+_SNAPSHOT_HEADER = struct.Struct('<8sQQ')
+STATS = TICK_RULES.names
+INITIAL = tuple(TICK_RULES.initial.values())
+COLUMNS = (*STATS, 'last_update', 'created_at')
+
+
+class MemoryPetStore:
+    """`effects[action](state, **params) -> dict` - эффекты действий (как ACTION_EFFECTS в SQL)."""
+
+    def __init__(self, effects, interval, initial=INITIAL, directory=MEMORY_DIR, fsync=MEMORY_FSYNC,
+                 snapshot_seconds=SNAPSHOT_SECONDS, snapshot_bytes=SNAPSHOT_WAL_BYTES):
+        self.effects = effects
+        self.interval = interval
+        self.initial = initial
+        self.directory = directory
+        self.fsync = fsync
+        self.snapshot_seconds = snapshot_seconds
+        self.snapshot_bytes = snapshot_bytes
+        self.hunger = array.array('b')
+        self.energy = array.array('b')
+        self.mood = array.array('b')
+        self.health = array.array('b')
+        self.last_update = array.array('d')
+        self.created_at = array.array('I')
+        self.name_offsets = array.array('I', [0])
+        self.names = bytearray()
+        self.generation = 0
+        self.wal_bytes = 0
+        self.wal_records = 0
+        self.replayed = 0
+        self.snapshots = 0
+        self.last_snapshot = time.monotonic()
+        self._wal = None
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self.health)
+
+    # --- журнал ---
+
+    def _wal_path(self, generation):
+        return os.path.join(self.directory, f'wal.{generation:08d}')
+
+    def _snapshot_path(self):
+        return os.path.join(self.directory, 'snapshot')
+
+    def _append(self, record):
+        self._wal.write(record)
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+        self.wal_bytes += len(record)
+        self.wal_records += 1
+
+    def _log_update(self, i):
+        self._append(_UPDATE.pack(KIND_UPDATE, i + 1, self.hunger[i], self.energy[i], self.mood[i],
+                                  self.health[i], self.last_update[i]))
+
+    def _log_create(self, i):
+        name = self._name(i).encode()
+        self._append(_CREATE.pack(KIND_CREATE, i + 1, self.hunger[i], self.energy[i], self.mood[i],
+                                  self.health[i], self.last_update[i], self.created_at[i], len(name)) + name)
+
+    def _replay(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset < len(data):
+            kind = data[offset]
+            if kind == KIND_UPDATE and offset + _UPDATE.size <= len(data):
+                _, pet_id, *stats, last_update = _UPDATE.unpack_from(data, offset)
+                offset += _UPDATE.size
+                i = pet_id - 1
+                for column, value in zip(STATS, stats):
+                    getattr(self, column)[i] = value
+                self.last_update[i] = last_update
+            elif kind == KIND_CREATE and offset + _CREATE.size <= len(data):
+                _, pet_id, *stats, last_update, created_at, length = _CREATE.unpack_from(data, offset)
+                end = offset + _CREATE.size + length
+                if end > len(data):
+                    break
+                self._add(data[offset + _CREATE.size:end], stats, last_update, created_at)
+                offset = end
+            else:
+                # Оборванная запись в конце журнала (падение посреди write)
+                break
+            self.replayed += 1
+        return offset
+
+    # --- снимки ---
+
+    def _load_snapshot(self):
+        try:
+            with open(self._snapshot_path(), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if zlib.crc32(memoryview(data)[:-4]) != struct.unpack_from('<I', data, len(data) - 4)[0]:
+            raise ValueError(f'{self._snapshot_path()}: checksum mismatch')
+        magic, self.generation, count = _SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f'{self._snapshot_path()}: not a pet snapshot')
+        offset = _SNAPSHOT_HEADER.size
+        for column in (*COLUMNS, 'name_offsets'):
+            target = getattr(self, column)
+            del target[:]
+            size = (count + 1 if column == 'name_offsets' else count) * target.itemsize
+            target.frombytes(data[offset:offset + size])
+            offset += size
+        self.names = bytearray(data[offset:offset + self.name_offsets[-1]])
+
+    def snapshot(self):
+        """Снимок колонок и новое поколение журнала; старые журналы удаляются."""
+        with self._snapshot_lock:
+            with self._lock:
+                parts = [_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.generation + 1, len(self))]
+                parts += [getattr(self, column).tobytes() for column in (*COLUMNS, 'name_offsets')]
+                parts.append(bytes(self.names))
+                self._open_wal(self.generation + 1)
+            crc = 0
+            for part in parts:
+                crc = zlib.crc32(part, crc)
+            tmp = self._snapshot_path() + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.writelines(parts)
+                f.write(struct.pack('<I', crc))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._snapshot_path())
+            self._sync_directory()
+            self._remove_wals(below=self.generation)
+            self.snapshots += 1
+            self.last_snapshot = time.monotonic()
+
+    def _open_wal(self, generation):
+        previous = self._wal
+        self._wal = open(self._wal_path(generation), 'ab')
+        self.generation = generation
+        self.wal_bytes = self._wal.tell()
+        if previous is not None:
+            previous.flush()
+            os.fsync(previous.fileno())
+            previous.close()
+
+    def _sync_directory(self):
+        if os.name == 'posix':
+            fd = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _wal_generations(self):
+        return sorted(int(name[4:]) for name in os.listdir(self.directory) if name.startswith('wal.'))
+
+    def _remove_wals(self, below):
+        for generation in self._wal_generations():
+            if generation < below:
+                os.remove(self._wal_path(generation))
+
+    # --- жизненный цикл ---
+
+    def open(self):
+        """Снимок + журналы с диска, затем фоновый fsync и снимки."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_snapshot()
+        generations = [g for g in self._wal_generations() if g >= self.generation] or [self.generation]
+        for generation in generations:
+            path = self._wal_path(generation)
+            if os.path.exists(path):
+                valid = self._replay(path)
+                if valid < os.path.getsize(path):
+                    os.truncate(path, valid)
+        self._open_wal(generations[-1])
+        # Журналы, уже вошедшие в снимок (падение между снимком и удалением)
+        self._remove_wals(below=self.generation)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='pet-memory-store', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(SYNC_SECONDS):
+            try:
+                if not self.fsync:
+                    self._sync_wal()
+                due = time.monotonic() - self.last_snapshot >= self.snapshot_seconds
+                if self.wal_bytes and (due or self.wal_bytes >= self.snapshot_bytes):
+                    self.snapshot()
+            except Exception as exc:
+                print(f'✗ memory store sync failed: {exc}')
+
+    def _sync_wal(self):
+        # Без блокировки: запись не ждёт fsync; файл мог закрыться при смене поколения
+        try:
+            os.fsync(self._wal.fileno())
+        except (OSError, ValueError):
+            pass
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._wal is not None:
+            if self.wal_bytes:
+                self.snapshot()
+            self._wal.close()
+            self._wal = None
+
+    # --- питомцы ---
+
+    def _add(self, name, stats, last_update, created_at):
+        for column, value in zip(STATS, stats):
+            getattr(self, column).append(value)
+        self.last_update.append(last_update)
+        self.created_at.append(int(created_at))
+        self.names += name
+        self.name_offsets.append(len(self.names))
+        return len(self) - 1
+
+    def _name(self, i):
+        return self.names[self.name_offsets[i]:self.name_offsets[i + 1]].decode()
+
+    def _row(self, i):
+        health = self.health[i]
+        return {
+            'id': i + 1,
+            'name': self._name(i),
+            'hunger': self.hunger[i],
+            'energy': self.energy[i],
+            'mood': self.mood[i],
+            'health': health,
+            'status': 'dead' if health <= 0 else 'healthy',
+            'created_at': datetime.fromtimestamp(self.created_at[i]).isoformat(),
+            'last_update': datetime.fromtimestamp(self.last_update[i]).isoformat(),
+        }
+
+    def _index(self, pet_id):
+        if pet_id is None:
+            return len(self) - 1 if len(self) else None
+        return pet_id - 1 if 0 < pet_id <= len(self) else None
+
+    def _decay(self, i, now, rng):
+        """Как simple_server._apply_decay; True, если шкалы изменились."""
+        if self.health[i] <= 0:
+            return False
+        last_update = self.last_update[i]
+        ticks = int((now - last_update) // self.interval)
+        if ticks <= 0:
+            return False
+        if rng is None:
+            rng = pet_rng(i + 1, last_update)
+        old = tuple(getattr(self, column)[i] for column in STATS)
+        new = TICK_RULES.catch_up(*old, ticks, rng)[:4]
+        if new == old:
+            return False
+        for column, value in zip(STATS, new):
+            getattr(self, column)[i] = value
+        return True
+
+    def run(self, action=None, pet_id=None, rng=None, params=None):
+        """Распад и действие над питомцем (по умолчанию последним); строка-словарь или None."""
+        now = time.time()
+        with self._lock:
+            i = self._index(pet_id)
+            if i is None:
+                return None
+            changed = self._decay(i, now, rng)
+            if action is not None and self.health[i] > 0:
+                state = {column: getattr(self, column)[i] for column in STATS}
+                for column, value in self.effects[action](state, **(params or {})).items():
+                    getattr(self, column)[i] = value
+                changed = True
+            if changed:
+                self.last_update[i] = now
+                self._log_update(i)
+            return self._row(i)
+
+    def create(self, name):
+        now = time.time()
+        with self._lock:
+            i = self._add(name.encode(), self.initial, now, now)
+            self._log_create(i)
+            return self._row(i)
+
+    def attention(self, column, start, end, limit):
+        """Как /pets/attention по SQLite: critical_at или dead_at в (start, end], epoch-секунды."""
+        found = []
+        with self._lock:
+            for i in range(len(self)):
+                health = self.health[i]
+                if health <= 0:
+                    continue
+                at = self.last_update[i] + ticks_to_critical(self.hunger[i], self.energy[i], self.mood[i]) * self.interval
+                if column == 'dead_at':
+                    at += health * self.interval
+                if start < at <= end:
+                    found.append((at, i))
+            found = heapq.nsmallest(limit, found)
+            return [{'id': i + 1, 'name': self._name(i), 'at': datetime.fromtimestamp(at).isoformat(timespec='seconds')}
+                    for at, i in found]
+
+    def memory_bytes(self):
+        columns = sum(len(getattr(self, column)) * getattr(self, column).itemsize for column in COLUMNS)
+        return columns + len(self.name_offsets) * self.name_offsets.itemsize + len(self.names)
+
+    def stats(self):
+        return {
+            'pets': len(self),
+            'memory_bytes': self.memory_bytes(),
+            'generation': self.generation,
+            'wal_bytes': self.wal_bytes,
+            'wal_records': self.wal_records,
+            'replayed_records': self.replayed,
+            'snapshots': self.snapshots,
+            'fsync_every_write': self.fsync,
+        }
@@ -0,0 +1,357 @@
+"""
+Метрики в текстовом формате Prometheus (GET /metrics) без зависимостей.
+
+Общий модуль для main.py, main_new.py (через MetricsMiddleware и
+instrument_engine) и simple_server.py (через track_request напрямую).
+
+Запрос открывает RequestScope в contextvar; SQL-события и ожидание
+соединения из пула дописываются в него, в том числе из потоков
+threadpool, куда FastAPI копирует контекст. На запрос - несколько
+поисков в словаре и bisect под одной блокировкой на метрику.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+TICK_BUCKETS = (1, 2, 5, 10, 30, 100, 300, 1000, 3000, 10000, 100000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Регистрирует метрику; метрика с тем же именем заменяется."""
+        with self._lock:
+            self._metrics = [m for m in self._metrics if m.name != metric.name]
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+                for values, child in self._items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        lines = []
+        for values, child in self._items():
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Значение читается при выдаче /metrics: fn() -> число или {labels: число}."""
+
+    def __init__(self, name, help, fn, labelnames=(), type="gauge", registry=REGISTRY):
+        self.fn = fn
+        self.type = type
+        super().__init__(name, help, labelnames, registry)
+
+    def samples(self):
+        value = self.fn()
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(v)}" for values, v in items]
+
+
+# --- общие метрики ---
+
+REQUEST_DURATION = Histogram(
+    "pet_http_request_duration_seconds", "HTTP request latency.", ("route", "method", "status"))
+REQUESTS_IN_FLIGHT = Gauge("pet_http_requests_in_flight", "HTTP requests being served.")
+REQUEST_QUERIES = Histogram(
+    "pet_http_request_db_queries", "SQL statements executed per HTTP request.", ("route",), buckets=COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram(
+    "pet_http_request_db_seconds", "Time spent in SQL per HTTP request.", ("route",))
+DB_QUERY_DURATION = Histogram("pet_db_query_duration_seconds", "SQL statement latency.", ("engine",))
+POOL_WAIT = Histogram(
+    "pet_db_pool_wait_seconds", "Time waiting for a database connection from the pool.", ("pool",))
+DECAY_TICKS = Histogram(
+    "pet_decay_catch_up_ticks", "Decay ticks applied in one catch-up.", buckets=TICK_BUCKETS)
+
+
+class RequestScope:
+    __slots__ = ("method", "route", "status", "queries", "db_seconds", "started")
+
+    def __init__(self, method):
+        self.method = method
+        self.route = "unmatched"
+        self.status = None
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.started = time.perf_counter()
+
+
+_current = contextvars.ContextVar("pet_request_scope", default=None)
+
+
+@contextmanager
+def track_request(method):
+    """Меряет запрос; вызывающий выставляет scope.route и scope.status."""
+    scope = RequestScope(method)
+    token = _current.set(scope)
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+        yield scope
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        _current.reset(token)
+        status = str(scope.status) if scope.status is not None else "500"
+        REQUEST_DURATION.labels(scope.route, scope.method, status).observe(time.perf_counter() - scope.started)
+        REQUEST_QUERIES.labels(scope.route).observe(scope.queries)
+        REQUEST_DB_SECONDS.labels(scope.route).observe(scope.db_seconds)
+
+
+def record_query(seconds=None, engine="sqlite"):
+    """Одна SQL-операция; seconds=None - время неизвестно (sqlite3 trace callback)."""
+    scope = _current.get()
+    if scope is not None:
+        scope.queries += 1
+        if seconds is not None:
+            scope.db_seconds += seconds
+    if seconds is not None:
+        DB_QUERY_DURATION.labels(engine).observe(seconds)
+
+
+def record_db_time(seconds):
+    scope = _current.get()
+    if scope is not None:
+        scope.db_seconds += seconds
+
+
+def render():
+    return REGISTRY.render()
+
+
+def merge(texts, label="worker"):
+    """Сливает вывод render() нескольких процессов [(имя, текст)] в один.
+
+    Сэмплы одной метрики идут подряд, каждый с меткой label=имя процесса.
+    """
+    families = {}
+    for source, text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                family = families.setdefault(line.split(" ", 3)[2], ([], []))
+                if line not in family[0]:
+                    family[0].append(line)
+            elif line and family is not None:
+                sample, value = line.rsplit(" ", 1)
+                extra = f'{label}="{_escape(source)}"'
+                if sample.endswith("}"):
+                    sample = f"{sample[:-1]},{extra}}}"
+                else:
+                    sample = f"{sample}{{{extra}}}"
+                family[1].append(f"{sample} {value}")
+    return "".join("\n".join(headers + samples) + "\n" for headers, samples in families.values())
+
+
+# --- SQLAlchemy / ASGI ---
+
+def instrument_engine(engine, name):
+    """Число и время SQL-операций через события движка SQLAlchemy."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        record_query(time.perf_counter() - conn.info["query_started"].pop(), name)
+
+
+def timed_pool(pool_class, name):
+    """Подкласс пула SQLAlchemy, который меряет ожидание соединения."""
+
+    class TimedPool(pool_class):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                POOL_WAIT.labels(name).observe(time.perf_counter() - started)
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+class MetricsMiddleware:
+    """ASGI middleware: латентность по шаблону роута, in-flight и SQL на запрос.
+
+    Для SSE (/pet/stream) длительность - это время жизни потока.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._paths = None
+
+    def _route(self, scope):
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._paths is None and "app" in scope:
+            self._paths = {
+                getattr(r, "endpoint", None): r.path for r in scope["app"].routes if hasattr(r, "path")
+            }
+        return (self._paths or {}).get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with track_request(scope["method"]) as request:
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    request.status = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                request.route = self._route(scope)
@@ -0,0 +1,253 @@
+"""
+Версии схемы БД в таблице schema_version (schema, version).
+
+У каждой схемы (main - pets и журнал main.py/main_new.py по шардам,
+simple - pet из simple_server.py) упорядоченный список шагов и своя
+строка версии: обе схемы могут жить в одном файле digital_pet.db (README
+направляет туда оба сервера), и версия одной не пропускает шаги другой.
+На старте ensure() читает версию одним SELECT и, если БД уже на последней
+версии, больше ничего не делает; иначе недостающие шаги выполняются в
+одной транзакции BEGIN IMMEDIATE (несколько воркеров не мигрируют
+одновременно: второй после блокировки перечитывает версию).
+
+Шаги повторяют историю схемы. Первый шаг - CREATE TABLE IF NOT EXISTS,
+колонки в существующие таблицы добавляются по PRAGMA table_info: БД,
+созданные до версий (create_all, старый init_db), стоят на 0 и проходят
+шаги без ошибок. Так же с нуля проходят файлы, размеченные прежним
+PRAGMA user_version: шаги идемпотентны. Новая колонка или индекс в models.py - это новый шаг
+в конце списка, старые шаги не меняются.
+"""
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import sqlite_tuning
+
+MAIN_DATETIME = "%Y-%m-%d %H:%M:%S.%f"  # как DateTime SQLAlchemy в SQLite
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_columns(conn, table, columns):
+    present = _columns(conn, table)
+    for column, definition in columns:
+        if column not in present:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+# --- main.py / main_new.py (models.py) ---
+
+def _main_pets(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pets ("
+        "id INTEGER NOT NULL PRIMARY KEY, user_id VARCHAR, name VARCHAR, hunger FLOAT, mood FLOAT, energy FLOAT, "
+        "last_update DATETIME DEFAULT (CURRENT_TIMESTAMP), created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))"
+    )
+    for column in ("id", "user_id", "name"):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_pets_{column} ON pets ({column})")
+
+
+def _main_event_log(conn):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pet_events (id INTEGER NOT NULL PRIMARY KEY, user_id VARCHAR NOT NULL, "
+        "kind VARCHAR NOT NULL, name VARCHAR, created_at DATETIME NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_pet_events_user_id_id ON pet_events (user_id, id)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pet_snapshots (id INTEGER NOT NULL PRIMARY KEY, user_id VARCHAR NOT NULL, "
+        "event_id INTEGER NOT NULL, taken_at DATETIME NOT NULL, name VARCHAR, hunger FLOAT, mood FLOAT, energy FLOAT)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_pet_snapshots_user_id_event_id ON pet_snapshots (user_id, event_id)"
+    )
+
+
+def _main_projection(conn):
+    _add_columns(conn, "pets", (("sad_at", "DATETIME"), ("critical_at", "DATETIME")))
+    for column in ("sad_at", "critical_at"):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_pets_{column} ON pets ({column})")
+    backfill_projections(conn, "main")
+
+
+def _main_version(conn):
+    _add_columns(conn, "pets", (("version", "INTEGER NOT NULL DEFAULT 0"),))
+
+
+def _main_snapshot_unique(conn):
+    # Параллельные чтения могли записать один снимок дважды; остаётся первый
+    conn.execute(
+        "DELETE FROM pet_snapshots WHERE id NOT IN (SELECT MIN(id) FROM pet_snapshots GROUP BY user_id, event_id)"
+    )
+    conn.execute("DROP INDEX IF EXISTS ix_pet_snapshots_user_id_event_id")
+    conn.execute(
+        "CREATE UNIQUE INDEX ix_pet_snapshots_user_id_event_id ON pet_snapshots (user_id, event_id)"
+    )
+
+
+def _backfill_main(conn):
+    from projection import linear_projection
+    from rules import PET_RULES
+
+    rows = conn.execute(
+        "SELECT id, hunger, mood, energy, last_update FROM pets WHERE critical_at IS NULL AND last_update IS NOT NULL "
+        "AND hunger IS NOT NULL AND mood IS NOT NULL AND energy IS NOT NULL"  # без шкал (загрузка) прогноза нет
+    ).fetchall()
+    params = []
+    for pet_id, hunger, mood, energy, last_update in rows:
+        try:
+            at = datetime.fromisoformat(last_update)
+        except ValueError:
+            continue
+        projected = linear_projection({"hunger": hunger, "mood": mood, "energy": energy}, PET_RULES, at)
+        params.append(tuple(value.strftime(MAIN_DATETIME) if value else None
+                            for value in (projected["sad_at"], projected["critical_at"])) + (pet_id,))
+    conn.executemany("UPDATE pets SET sad_at = ?, critical_at = ? WHERE id = ?", params)
+
+
+# --- simple_server.py ---
+
+def _simple_pet(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pet (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            hunger INTEGER DEFAULT 50,
+            energy INTEGER DEFAULT 100,
+            mood INTEGER DEFAULT 50,
+            health INTEGER DEFAULT 100,
+            status TEXT DEFAULT 'healthy',
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_update TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    _add_columns(conn, "pet", (("last_update", "TEXT"), ("status", "TEXT DEFAULT 'healthy'")))
+    conn.execute("UPDATE pet SET last_update = ? WHERE last_update IS NULL", (datetime.now().isoformat(),))
+
+
+def _simple_projection(conn):
+    _add_columns(conn, "pet", (("critical_at", "TEXT"), ("dead_at", "TEXT")))
+    for column in ("critical_at", "dead_at"):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_pet_{column} ON pet ({column})")
+    backfill_projections(conn, "simple")
+
+
+def _backfill_simple(conn):
+    from projection import tick_projection
+    from rules import TICK_RULES
+
+    rows = conn.execute(
+        "SELECT id, hunger, energy, mood, health, status, last_update FROM pet WHERE dead_at IS NULL"
+    ).fetchall()
+    params = []
+    for pet_id, hunger, energy, mood, health, status, last_update in rows:
+        try:
+            at = datetime.fromisoformat(last_update) if last_update else datetime.now()
+        except ValueError:
+            at = datetime.now()
+        params.append((*tick_projection(hunger, energy, mood, health, status, at, TICK_RULES.unit_seconds), pet_id))
+    conn.executemany("UPDATE pet SET critical_at = ?, dead_at = ? WHERE id = ?", params)
+
+
+def backfill_projections(conn, schema):
+    """Прогноз порогов для строк без него (по индексу прогнозной колонки).
+
+    Шаг миграции для старых строк; transfer.py вызывает после загрузки,
+    строки из файла могут прийти без прогноза.
+    """
+    (_backfill_main if schema == "main" else _backfill_simple)(conn)
+
+
+# Номер версии - позиция шага в списке (с 1)
+MIGRATIONS = {
+    "main": (
+        ("pets table", _main_pets),
+        ("event log tables", _main_event_log),
+        ("sad_at/critical_at projections", _main_projection),
+        ("pets.version action counter", _main_version),
+        ("unique pet_snapshots (user_id, event_id)", _main_snapshot_unique),
+    ),
+    "simple": (
+        ("pet table", _simple_pet),
+        ("critical_at/dead_at projections", _simple_projection),
+    ),
+}
+
+_checked = set()
+_lock = threading.Lock()
+
+
+def schema_version(conn, schema):
+    try:
+        row = conn.execute("SELECT version FROM schema_version WHERE schema = ?", (schema,)).fetchone()
+    except sqlite3.OperationalError:  # таблицы версий ещё нет
+        return 0
+    return row[0] if row else 0
+
+
+def migrate(conn, schema):
+    """Доводит БД до последней версии schema; возвращает имена выполненных шагов.
+
+    conn - sqlite3 соединение с isolation_level=None.
+    """
+    steps = MIGRATIONS[schema]
+    if schema_version(conn, schema) >= len(steps):
+        return []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_version (schema TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        version = schema_version(conn, schema)
+        applied = []
+        for name, step in steps[version:]:
+            step(conn)
+            applied.append(name)
+        conn.execute("INSERT OR REPLACE INTO schema_version (schema, version) VALUES (?, ?)", (schema, len(steps)))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return applied
+
+
+def ensure(path, schema):
+    """migrate() для файла один раз за процесс."""
+    key = (os.path.abspath(path), schema)
+    if key in _checked:
+        return []
+    with _lock:
+        if key in _checked:
+            return []
+        conn = sqlite_tuning.connect(path, isolation_level=None)
+        try:
+            applied = migrate(conn, schema)
+        finally:
+            conn.close()
+        _checked.add(key)
+    if applied:
+        print(f"✓ {path}: schema {schema} migrated ({', '.join(applied)})")
+    return applied
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations to a Digital Pet database")
+    parser.add_argument("schema", choices=tuple(MIGRATIONS))
+    parser.add_argument("--db", default="./digital_pet.db")
+    args = parser.parse_args()
+    conn = sqlite_tuning.connect(args.db, isolation_level=None)
+    try:
+        applied = migrate(conn, args.schema)
+        print(f"{args.db}: version {schema_version(conn, args.schema)}/{len(MIGRATIONS[args.schema])}, applied {applied or 'nothing'}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
 from sqlalchemy.sql import func
 import sys
 import os
@@ -19,3 +19,35 @@ class Pet(Base):
     energy = Column(Float, default=100.0)
     last_update = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Прогноз порогов (projection.py), пересчитывается при действиях
+    sad_at = Column(DateTime, index=True)
+    critical_at = Column(DateTime, index=True)
+    # Счётчик действий для ETag состояния; распад (чтения, sweeper) его не меняет
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+class PetEvent(Base):
+    """Журнал действий (только INSERT); состояние - см. event_log.py."""
+    __tablename__ = "pet_events"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)
+    name = Column(String)  # только для create
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (Index("ix_pet_events_user_id_id", "user_id", "id"),)
+
+class PetSnapshot(Base):
+    """Состояние питомца сразу после события event_id."""
+    __tablename__ = "pet_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False)
+    event_id = Column(Integer, nullable=False)
+    taken_at = Column(DateTime, nullable=False)
+    name = Column(String)
+    hunger = Column(Float)
+    mood = Column(Float)
+    energy = Column(Float)
+
+    __table_args__ = (Index("ix_pet_snapshots_user_id_event_id", "user_id", "event_id", unique=True),)
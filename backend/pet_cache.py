@@ -0,0 +1,248 @@
+"""
+Read-through кэш состояния питомцев для main.py (ключ - user_id).
+
+GET /pet/state отвечает из кэша, распад считается на лету. Посчитанный
+распад помечает запись "грязной" и уходит в БД пачками раз в
+PET_CACHE_FLUSH_INTERVAL секунд и при остановке приложения.
+
+Грязная запись хранит только материализованный распад, который всегда
+можно пересчитать из строки в БД, поэтому вытеснение (LRU, TTL) и
+инвалидация после действий просто выбрасывают её. При сбросе UPDATE
+не перезаписывает строку, если в БД уже есть более новая last_update.
+
+Кэш включается явно (PET_CACHE=1): без него чтение пишет распад в БД
+сразу, с ним распад последних PET_CACHE_FLUSH_INTERVAL секунд живёт
+только в памяти. Действия кэш не задерживает. Размер ограничен и числом
+записей (PET_CACHE_MAX_ENTRIES), и оценкой занятой памяти
+(PET_CACHE_MAX_BYTES): вытесняются самые давние записи, пока оба
+предела не соблюдены.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import bindparam, func
+sys.path.insert(0, os.path.dirname(__file__))
+try:
+    from database import shard_for
+    from models import Pet
+except ImportError:
+    from .database import shard_for
+    from .models import Pet
+
+CACHE_ENABLED = os.environ.get("PET_CACHE", "0") == "1"
+CACHE_MAX_ENTRIES = int(os.environ.get("PET_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.environ.get("PET_CACHE_MAX_BYTES", str(16 << 20)))
+CACHE_TTL_SECONDS = float(os.environ.get("PET_CACHE_TTL", "300"))
+CACHE_FLUSH_INTERVAL = float(os.environ.get("PET_CACHE_FLUSH_INTERVAL", "5"))
+CACHE_FLUSH_BATCH = 500
+
+
+class CachedPet:
+    __slots__ = ("user_id", "name", "hunger", "mood", "energy", "last_update", "version", "base_update",
+                 "loaded_at", "dirty", "size")
+
+    def __init__(self, user_id, name, hunger, mood, energy, last_update, version, loaded_at):
+        self.user_id = user_id
+        self.name = name
+        self.hunger = hunger
+        self.mood = mood
+        self.energy = energy
+        self.last_update = last_update
+        # Счётчик действий строки (Pet.version) - для ETag; после действия запись инвалидируется
+        self.version = version
+        # last_update строки в БД, от которой посчитан распад
+        self.base_update = last_update
+        self.loaded_at = loaded_at
+        self.dirty = False
+        self.size = 0
+
+    def copy(self):
+        clone = CachedPet(self.user_id, self.name, self.hunger, self.mood, self.energy, self.last_update,
+                          self.version, self.loaded_at)
+        clone.base_update = self.base_update
+        return clone
+
+
+# Запись без строк user_id и name: объект, три float, два datetime и узел OrderedDict
+# (ссылки, хэш, слот таблицы) - оценка по sys.getsizeof, а не точный подсчёт
+ENTRY_OVERHEAD = (sys.getsizeof(CachedPet("", "", 0.0, 0.0, 0.0, None, 0, 0.0)) + 3 * sys.getsizeof(0.0)
+                  + 2 * sys.getsizeof(datetime.min) + 100)
+
+
+class PetStateCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL_SECONDS,
+                 flush_interval=CACHE_FLUSH_INTERVAL, shard_for=shard_for, enabled=CACHE_ENABLED):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.shard_for = shard_for
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, user_id, now):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if now - entry.loaded_at > self.ttl:
+                self._remove(user_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry
+
+    def put(self, pet, version, now):
+        """Кладёт загруженного из БД питомца, если с начала загрузки
+        (`version`) не было инвалидаций; иначе возвращает несвязанную запись."""
+        entry = CachedPet(pet.user_id, pet.name, pet.hunger, pet.mood, pet.energy, pet.last_update, pet.version, now)
+        entry.size = ENTRY_OVERHEAD + sys.getsizeof(entry.user_id) + sys.getsizeof(entry.name)
+        with self._lock:
+            if version != self.version:
+                return entry
+            self._remove(pet.user_id)
+            self._entries[pet.user_id] = entry
+            self.bytes += entry.size
+            while len(self._entries) > self.max_entries or (self.bytes > self.max_bytes and len(self._entries) > 1):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def _remove(self, user_id):
+        """Под self._lock: убирает запись и её размер; возвращает запись или None."""
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.bytes -= entry.size
+        return entry
+
+    def refresh(self, entry, decay, dirty=True):
+        """Применяет decay(entry) на текущий момент и возвращает снимок.
+
+        С dirty=False распад не попадёт в БД, пока запись не пометят mark_dirty().
+        """
+        with self._lock:
+            decay(entry)
+            if dirty:
+                entry.dirty = True
+            return entry.copy()
+
+    def mark_dirty(self, entry):
+        with self._lock:
+            entry.dirty = True
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self.version += 1
+            if self._remove(user_id) is not None:
+                self.invalidations += 1
+
+    def flush(self):
+        with self._lock:
+            dirty = [entry for entry in self._entries.values() if entry.dirty]
+            for entry in dirty:
+                entry.dirty = False
+            rows = [
+                {
+                    "uid": entry.user_id,
+                    "base": entry.base_update,
+                    "new_hunger": entry.hunger,
+                    "new_mood": entry.mood,
+                    "new_energy": entry.energy,
+                    "now": entry.last_update,
+                }
+                for entry in dirty
+            ]
+        if not rows:
+            return 0
+        table = Pet.__table__
+        stmt = (
+            table.update()
+            .where(table.c.user_id == bindparam("uid"))
+            .where(func.julianday(table.c.last_update) <= func.julianday(bindparam("base")))
+            .values(
+                hunger=bindparam("new_hunger"),
+                mood=bindparam("new_mood"),
+                energy=bindparam("new_energy"),
+                last_update=bindparam("now"),
+            )
+        )
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(self.shard_for(row["uid"]), []).append(row)
+        for shard, shard_rows in by_shard.items():
+            db = shard.SessionLocal()
+            try:
+                for start in range(0, len(shard_rows), CACHE_FLUSH_BATCH):
+                    db.execute(stmt, shard_rows[start:start + CACHE_FLUSH_BATCH])
+                db.commit()
+            finally:
+                db.close()
+        with self._lock:
+            for entry, row in zip(dirty, rows):
+                entry.base_update = row["now"]
+            self.flushes += 1
+            self.flushed_rows += len(rows)
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:
+                print(f"✗ pet cache flush failed: {exc}")
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pet-cache-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.enabled:
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "flushes": self.flushes,
+                "flushed_rows": self.flushed_rows,
+                "dirty": sum(1 for entry in self._entries.values() if entry.dirty),
+            }
+
+
+pet_cache = PetStateCache()
@@ -0,0 +1,292 @@
+"""
+Server-Sent Events для состояния питомцев (GET /pet/stream в main.py).
+
+Вместо таймера на каждое соединение один планировщик на процесс держит
+кучу "когда у питомца изменится отображаемое целое значение". Распад
+линейный, поэтому момент следующего изменения считается аналитически,
+и пока ничего не меняется, подписчики не стоят ни одного пробуждения.
+Действия публикуются сразу через notify(), в том числе из потоков
+threadpool, где выполняются sync-роуты.
+
+Подписчик - это очередь из одного сообщения (побеждает последнее) и
+приостановленный генератор, поэтому десятки тысяч простаивающих
+подписок стоят только памяти.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import threading
+from collections import deque
+from datetime import datetime
+
+HEARTBEAT_SECONDS = 25
+# Минимальная пауза между пересчётами одного питомца
+MIN_RESCHEDULE_SECONDS = 0.05
+# Просыпаемся чуть позже точного момента пересечения, чтобы округление уже сменилось
+CROSSING_SLACK_SECONDS = 0.001
+
+
+def _displayed(value):
+    return math.floor(value + 0.5)
+
+
+class WatchedPet:
+    __slots__ = ("user_id", "name", "hunger", "mood", "energy", "last_update",
+                 "subscribers", "generation", "published")
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.subscribers = set()
+        self.generation = 0
+        self.published = None
+
+    def load(self, row):
+        self.name = row.name
+        self.hunger = row.hunger
+        self.mood = row.mood
+        self.energy = row.energy
+        self.last_update = row.last_update or datetime.utcnow()
+
+
+class Subscriber:
+    __slots__ = ("watched", "queue")
+
+    def __init__(self, watched):
+        self.watched = watched
+        self.queue = asyncio.Queue(maxsize=1)
+
+
+class PetStreamHub:
+    """`rules` - линейные правила (rules.PET_RULES): распад, границы и пороги
+    статусов; `render(pet) -> dict` - тело события."""
+
+    def __init__(self, rules, render):
+        self.rules = rules
+        self.render = render
+        self.loop = None
+        self.published = 0
+        self.fanout_seconds_max = 0.0
+        self._fanout_total = 0.0
+        self._delivery = deque(maxlen=2048)
+        self._watched = {}
+        self._subscribers = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._heartbeat_task = None
+        self._loop_thread = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._wakeup = asyncio.Event()
+        self._task = self.loop.create_task(self._schedule())
+        self._heartbeat_task = self.loop.create_task(self._heartbeat())
+
+    async def stop(self):
+        for task in (self._task, self._heartbeat_task):
+            if task is not None:
+                task.cancel()
+        self.loop = None
+
+    # --- состояние ---
+
+    def _current(self, pet, now):
+        minutes = max(0.0, (now - pet.last_update).total_seconds() / 60)
+        values = {stat: getattr(pet, stat) for stat in self.rules.names}
+        values.update(self.rules.decayed(values, minutes))
+        return values
+
+    def _seconds_to_change(self, values):
+        """Через сколько секунд изменится целое значение шкалы или статус."""
+        candidates = []
+        slopes = {}  # шкала -> изменение в минуту, пока она не у границы
+        for stat in self.rules.decaying:
+            value = values[stat.name]
+            shown = _displayed(value)
+            rate = abs(stat.decay)
+            if stat.decay < 0:
+                if shown > stat.low:
+                    candidates.append((value - (shown - 0.5)) / rate * 60)
+                if value > stat.low:
+                    slopes[stat.name] = -rate
+            else:
+                if shown < stat.high:
+                    candidates.append((shown + 0.5 - value) / rate * 60)
+                if value < stat.high:
+                    slopes[stat.name] = rate
+        # Статус - первая метка, у которой среднее шкал выше порога (rules.Rules.statuses)
+        for _, stats, bound in self.rules.statuses:
+            slope = sum(slopes.get(stat, 0) for stat in stats)
+            gap = sum(values[stat] for stat in stats) - bound * len(stats)
+            if gap > 0 and slope < 0:
+                candidates.append(gap / -slope * 60)
+            elif gap <= 0 and slope > 0:
+                candidates.append(-gap / slope * 60)
+        if not candidates:
+            return None
+        return max(MIN_RESCHEDULE_SECONDS, min(candidates) + CROSSING_SLACK_SECONDS)
+
+    def _render(self, pet, values):
+        return self.render(_View(pet.name, **values))
+
+    def _refresh(self, pet):
+        values = self._current(pet, datetime.utcnow())
+        body = self._render(pet, values)
+        key = tuple(_displayed(v) for v in values.values()) + (body.get("status"),)
+        if key != pet.published:
+            pet.published = key
+            self._publish(pet, json.dumps(body))
+        pet.generation += 1
+        delay = self._seconds_to_change(values)
+        if delay is not None:
+            heapq.heappush(self._heap, (self.loop.time() + delay, next(self._seq), pet.user_id, pet.generation))
+            self._wakeup.set()
+
+    def _publish(self, pet, payload):
+        started = self.loop.time()
+        message = (f"event: state\ndata: {payload}\n\n", started)
+        for subscriber in pet.subscribers:
+            queue = subscriber.queue
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+        elapsed = self.loop.time() - started
+        self.published += 1
+        self._fanout_total += elapsed
+        self.fanout_seconds_max = max(self.fanout_seconds_max, elapsed)
+
+    async def _schedule(self):
+        while True:
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - self.loop.time())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            if len(self._heap) > 2 * len(self._watched) + 1024:
+                self._compact()
+            now = self.loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, user_id, generation = heapq.heappop(self._heap)
+                pet = self._watched.get(user_id)
+                if pet is not None and pet.generation == generation:
+                    self._refresh(pet)
+
+    def _compact(self):
+        """Выбрасывает из кучи записи, устаревшие после действий и отписок."""
+        self._heap = [
+            item for item in self._heap
+            if item[2] in self._watched and self._watched[item[2]].generation == item[3]
+        ]
+        heapq.heapify(self._heap)
+
+    async def _heartbeat(self):
+        message = (": ping\n\n", None)
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            for pet in list(self._watched.values()):
+                for subscriber in pet.subscribers:
+                    if subscriber.queue.empty():
+                        subscriber.queue.put_nowait(message)
+
+    # --- подписки ---
+
+    def is_watching(self, user_id):
+        return user_id in self._watched
+
+    def subscribe(self, user_id, row=None):
+        pet = self._watched.get(user_id)
+        if pet is None:
+            pet = self._watched[user_id] = WatchedPet(user_id)
+            pet.load(row)
+            self._refresh(pet)
+        subscriber = Subscriber(pet)
+        pet.subscribers.add(subscriber)
+        self._subscribers += 1
+        body = self._render(pet, self._current(pet, datetime.utcnow()))
+        subscriber.queue.put_nowait((f"event: state\ndata: {json.dumps(body)}\n\n", None))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        pet = subscriber.watched
+        if subscriber in pet.subscribers:
+            pet.subscribers.discard(subscriber)
+            self._subscribers -= 1
+        if not pet.subscribers and self._watched.get(pet.user_id) is pet:
+            del self._watched[pet.user_id]
+            pet.generation += 1
+
+    async def events(self, user_id, row=None, load=None):
+        """Генератор SSE-сообщений; подписка живёт, пока его итерируют.
+
+        row нужен, только если питомца ещё никто не смотрит. Последний
+        подписчик может уйти до первого next(), тогда строку читает
+        `await load()`; если питомца уже нет, поток пустой.
+        """
+        if row is None and user_id not in self._watched and load is not None:
+            row = await load()
+        if row is None and user_id not in self._watched:
+            return
+        # Между проверкой и subscribe нет await: наблюдение не пропадёт
+        subscriber = self.subscribe(user_id, row)
+        try:
+            while True:
+                message, published_at = await subscriber.queue.get()
+                if published_at is not None:
+                    self._delivery.append(self.loop.time() - published_at)
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    def notify(self, user_id, row):
+        """Новое состояние после действия; можно вызывать из любого потока."""
+        loop = self.loop
+        if loop is None:
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._on_action(user_id, row)
+        else:
+            loop.call_soon_threadsafe(self._on_action, user_id, row)
+
+    def _on_action(self, user_id, row):
+        pet = self._watched.get(user_id)
+        if pet is None:
+            return
+        pet.load(row)
+        pet.published = None
+        self._refresh(pet)
+
+    def stats(self):
+        delivery = sorted(self._delivery)
+
+        def pct(p):
+            return round(delivery[min(len(delivery) - 1, int(p / 100 * len(delivery)))] * 1000, 3) if delivery else 0.0
+
+        return {
+            "subscribers": self._subscribers,
+            "watched_pets": len(self._watched),
+            "scheduled": len(self._heap),
+            "published": self.published,
+            "fanout_ms_avg": round(self._fanout_total / self.published * 1000, 3) if self.published else 0.0,
+            "fanout_ms_max": round(self.fanout_seconds_max * 1000, 3),
+            "delivery_ms_p50": pct(50),
+            "delivery_ms_p99": pct(99),
+        }
+
+
+class _View:
+    """Минимальный объект с полями питомца для render()/get_status()."""
+
+    __slots__ = ("name", "hunger", "mood", "energy")
+
+    def __init__(self, name, hunger, mood, energy):
+        self.name = name
+        self.hunger = hunger
+        self.mood = mood
+        self.energy = energy
@@ -0,0 +1,292 @@
+"""
+Сэмплирующий профайлер медленных запросов для main.py (PET_PROFILE=1).
+
+Отдельный поток раз в PET_PROFILE_INTERVAL_MS снимает стеки всех потоков
+(sys._current_frames), пока идёт хотя бы один запрос. По окончании
+запроса профиль сохраняется, если запрос попал в выборку
+(PET_PROFILE_SAMPLE_RATE) или шёл дольше PET_PROFILE_SLOW_MS:
+
+  *.folded      - свёрнутые стеки для flamegraph.pl / speedscope;
+  *.trace.json  - Chrome trace (chrome://tracing, Perfetto) со стеками
+                  по потокам и SQL-операторами запроса.
+
+В профиль попадают все потоки за время запроса: sync-роуты работают в
+threadpool, и заранее неизвестно, в каком потоке. При параллельных
+запросах в нём будут и чужие стеки; SQL-операторы привязаны точно
+(через contextvar, как в metrics.py). В каталоге хранятся последние
+PET_PROFILE_KEEP профилей. Без PET_PROFILE=1 middleware и события
+SQLAlchemy не подключаются.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+PROFILE_ENABLED = os.environ.get("PET_PROFILE", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PET_PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_SLOW_MS = float(os.environ.get("PET_PROFILE_SLOW_MS", "200"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PET_PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("PET_PROFILE_DIR", "./profiles")
+PROFILE_KEEP = int(os.environ.get("PET_PROFILE_KEEP", "200"))
+# Долгоживущие и служебные пути не профилируются
+PROFILE_EXCLUDE = ("/metrics", "/admin", "/pet/stream", "/docs", "/openapi.json")
+MAX_STACK_DEPTH = 64
+MAX_SAMPLES = 200_000
+RECENT_REQUESTS = 100
+
+
+class ProfileScope:
+    __slots__ = ("method", "path", "sampled", "started", "wall_started", "statements")
+
+    def __init__(self, method, path, sampled):
+        self.method = method
+        self.path = path
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.statements = []
+
+
+_current = contextvars.ContextVar("pet_profile_scope", default=None)
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfiler:
+    def __init__(self, enabled=PROFILE_ENABLED, sample_rate=PROFILE_SAMPLE_RATE, slow_ms=PROFILE_SLOW_MS,
+                 interval_ms=PROFILE_INTERVAL_MS, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow = slow_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.keep = keep
+        self.captured = 0
+        self._samples = deque(maxlen=MAX_SAMPLES)
+        self._recent = deque(maxlen=RECENT_REQUESTS)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    # --- сэмплер ---
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pet-profiler", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while True:
+            self._wakeup.wait()
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            batch = []
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack.reverse()
+                batch.append((now, names.get(ident, str(ident)), tuple(stack)))
+            with self._lock:
+                self._samples.extend(batch)
+            time.sleep(self.interval)
+
+    # --- запросы ---
+
+    def begin(self, method, path):
+        scope = ProfileScope(method, path, random.random() < self.sample_rate)
+        with self._lock:
+            self._active += 1
+            self._wakeup.set()
+        return scope, _current.set(scope)
+
+    def end(self, scope, token, status):
+        _current.reset(token)
+        finished = time.perf_counter()
+        with self._lock:
+            self._active -= 1
+            if not self._active:
+                self._wakeup.clear()
+            duration = finished - scope.started
+            if not scope.sampled and duration < self.slow:
+                return None
+            samples = []
+            for sample in reversed(self._samples):
+                if sample[0] < scope.started:
+                    break
+                if sample[0] <= finished:
+                    samples.append(sample)
+            samples.reverse()
+        return self._record(scope, status, duration, samples)
+
+    def _record(self, scope, status, duration, samples):
+        stamp = datetime.fromtimestamp(scope.wall_started).strftime("%Y%m%d-%H%M%S-%f")
+        slug = scope.path.strip("/").replace("/", "_") or "root"
+        name = f"{stamp}-{scope.method}-{slug}-{round(duration * 1000)}ms"
+        summary = {
+            "name": name,
+            "method": scope.method,
+            "path": scope.path,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "started_at": datetime.fromtimestamp(scope.wall_started).isoformat(),
+            "sampled": scope.sampled,
+            "slow": duration >= self.slow,
+            "samples": len(samples),
+            "queries": len(scope.statements),
+        }
+        with self._lock:
+            self.captured += 1
+            self._recent.append(summary)
+        return name, scope, samples, summary
+
+    def record_statement(self, started, seconds, statement):
+        scope = _current.get()
+        if scope is not None:
+            scope.statements.append((started, seconds, statement))
+
+    # --- файлы ---
+
+    def write(self, name, scope, samples, summary):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        with open(path + ".folded", "w") as f:
+            f.write(self._folded(samples))
+        with open(path + ".trace.json", "w") as f:
+            json.dump(self._chrome_trace(scope, samples, summary), f)
+        self._rotate()
+
+    def _folded(self, samples):
+        counts = {}
+        for _, thread, stack in samples:
+            key = ";".join([thread] + [_frame_label(code) for code in stack])
+            counts[key] = counts.get(key, 0) + 1
+        return "".join(f"{key} {count}\n" for key, count in sorted(counts.items()))
+
+    def _chrome_trace(self, scope, samples, summary):
+        def us(t):
+            return round((t - scope.started) * 1_000_000, 1)
+
+        tids = {}
+
+        def tid(thread):
+            # Trace Event Format ждёт числовые tid; имена - через метаданные thread_name
+            if thread not in tids:
+                tids[thread] = len(tids) + 1
+                events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tids[thread],
+                               "args": {"name": thread}})
+            return tids[thread]
+
+        events = []
+        events.append({
+            "name": f"{scope.method} {scope.path}", "ph": "X", "ts": 0, "dur": summary["duration_ms"] * 1000,
+            "pid": 1, "tid": tid("request"), "args": {"status": summary["status"]},
+        })
+        for started, seconds, statement in scope.statements:
+            events.append({"name": statement[:120], "ph": "X", "ts": us(started), "dur": round(seconds * 1e6, 1),
+                           "pid": 1, "tid": tid("sql"), "args": {"statement": statement}})
+        # Соседние сэмплы потока с общим префиксом стека склеиваются в B/E-события
+        open_stacks = {}
+        last_seen = {}
+        for ts, thread, stack in samples:
+            current = open_stacks.get(thread, ())
+            common = 0
+            while common < min(len(current), len(stack)) and current[common] is stack[common]:
+                common += 1
+            for code in reversed(current[common:]):
+                events.append({"name": _frame_label(code), "ph": "E", "ts": us(ts), "pid": 1, "tid": tid(thread)})
+            for code in stack[common:]:
+                events.append({"name": _frame_label(code), "ph": "B", "ts": us(ts), "pid": 1, "tid": tid(thread)})
+            open_stacks[thread] = stack
+            last_seen[thread] = ts
+        for thread, stack in open_stacks.items():
+            end = us(last_seen[thread] + self.interval)
+            for code in reversed(stack):
+                events.append({"name": _frame_label(code), "ph": "E", "ts": end, "pid": 1, "tid": tid(thread)})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": summary}
+
+    def _rotate(self):
+        profiles = sorted(f for f in os.listdir(self.directory) if f.endswith(".trace.json"))
+        for stale in profiles[:-self.keep] if self.keep else []:
+            base = stale[:-len(".trace.json")]
+            for suffix in (".trace.json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, base + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def slowest(self, limit=20):
+        with self._lock:
+            recent = list(self._recent)
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow * 1000,
+            "directory": os.path.abspath(self.directory),
+            "captured": self.captured,
+            "slowest": sorted(recent, key=lambda item: item["duration_ms"], reverse=True)[:limit],
+        }
+
+
+def instrument_engine(engine, profiler):
+    """SQL-операторы запроса в профиль (только при включённом профайлере)."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["profile_started"].pop()
+        profiler.record_statement(started, time.perf_counter() - started, statement)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: профиль выборки запросов и всех медленных запросов."""
+
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(PROFILE_EXCLUDE):
+            await self.app(scope, receive, send)
+            return
+        self.profiler.start()
+        profile, token = self.profiler.begin(scope["method"], scope["path"])
+        status = None
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            captured = self.profiler.end(profile, token, status or 500)
+            if captured is not None:
+                # Запись файлов - не в event loop
+                asyncio.get_running_loop().run_in_executor(None, self.profiler.write, *captured)
+
+
+profiler = RequestProfiler()
@@ -0,0 +1,79 @@
+"""
+Прогноз моментов, когда шкалы питомца пересекут пороги.
+
+Распад идёт с постоянной скоростью, поэтому при каждой записи питомца
+можно сразу посчитать, когда он станет Sad, упрётся шкалой в границу
+(дальше теряет здоровье) или умрёт. Эти моменты хранятся в
+индексированных колонках, и запросы вида "кому станет грустно в
+ближайший час" становятся range scan по индексу без расчёта распада.
+
+Чистый распад прогноз не меняет (линия та же), его пересчитывают только
+действия и создание питомца. Для simple_server шаги случайные (1-2 за
+тик), прогноз строится по среднему шагу и обновляется при каждой записи.
+"""
+import math
+from datetime import timedelta
+
+# Среднее значение шага decay.sample_steps
+EXPECTED_STEP = 1.5
+
+
+def minutes_until_sum(values, rates, target):
+    """Через сколько минут сумма max(0, v - r*t) опустится до target (0 - уже).
+
+    Шкалы с другой нижней границей передаются сдвинутыми на неё.
+    """
+    current = sum(values)
+    if current <= target:
+        return 0.0
+    # Сумма кусочно-линейна: наклон уменьшается, когда очередная шкала доходит до нуля
+    slope = sum(rate for value, rate in zip(values, rates) if value > 0)
+    elapsed = 0.0
+    for zero_at, rate in sorted((value / rate, rate) for value, rate in zip(values, rates) if value > 0):
+        reached = elapsed + (current - target) / slope
+        if reached <= zero_at:
+            return reached
+        current -= slope * (zero_at - elapsed)
+        elapsed = zero_at
+        slope -= rate
+    return None
+
+
+def linear_projection(state, rules, at):
+    """main.py: sad_at и critical_at по линейным правилам (rules.PET_RULES).
+
+    sad_at - когда среднее шкал последнего порога статусов опустится до
+    него (дальше статус по умолчанию), critical_at - когда первая
+    убывающая шкала дойдёт до нижней границы.
+    """
+    _, stats, bound = rules.statuses[-1]
+    falling = [rules.stats[name] for name in stats if rules.stats[name].decay < 0]
+    steady = sum(state[name] for name in stats if rules.stats[name].decay >= 0)
+    sad = minutes_until_sum(
+        [state[stat.name] - stat.low for stat in falling], [-stat.decay for stat in falling],
+        bound * len(stats) - steady - sum(stat.low for stat in falling),
+    )
+    critical = min((state[stat.name] - stat.low) / -stat.decay for stat in rules.decaying if stat.decay < 0)
+    return {
+        "sad_at": at + timedelta(minutes=sad) if sad is not None else None,
+        "critical_at": at + timedelta(minutes=critical),
+    }
+
+
+def ticks_to_critical(hunger, energy, mood, stat_min=0, stat_max=100):
+    """Ожидаемое число тиков, пока одна из шкал не упрётся в границу."""
+    margin = max(0, min(stat_max - hunger, energy - stat_min, mood - stat_min))
+    return math.ceil(margin / EXPECTED_STEP)
+
+
+def tick_projection(hunger, energy, mood, health, status, at, interval):
+    """simple_server: critical_at (начало потери здоровья) и dead_at, строки ISO.
+
+    Здоровье в критическом состоянии теряет 1 за тик.
+    """
+    if status == "dead" or health <= 0:
+        critical, dead = at, at
+    else:
+        critical = at + timedelta(seconds=ticks_to_critical(hunger, energy, mood) * interval)
+        dead = critical + timedelta(seconds=health * interval)
+    return critical.isoformat(timespec="seconds"), dead.isoformat(timespec="seconds")
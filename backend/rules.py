@@ -0,0 +1,360 @@
+"""
+Правила питомца: шкалы, распад, границы, эффекты действий и статусы.
+
+Правила описаны данными (Stat, Action, статусы) и компилируются в три формы:
+  - скалярную: функции, сгенерированные под конкретные шкалы, над объектами
+    с атрибутами (State со __slots__, строка ORM, SimpleNamespace) или
+    кортежем значений (catch_up);
+  - SQL: выражения для SQLAlchemy (decayed/effects с least/greatest =
+    func.min/func.max) и текст для sqlite3 (decay_sql/effect_sql), из
+    которых собирается один параметризованный UPDATE на действие;
+  - пакетную NumPy: шкалы пачки питомцев как массивы (sweeper.py).
+
+Наборов правил два:
+  PET_RULES  - main.py и main_new.py: hunger/mood/energy - "запас" шкалы,
+               линейно убывает (единиц в минуту); статус Happy/Okay/Sad по
+               среднему. Кормление повышает hunger.
+  TICK_RULES - simple_server.py: hunger - голод, растёт; энергия и
+               настроение падают на случайные 1-2 за тик
+               (decay.sample_steps); пока шкала на границе, здоровье теряет
+               1 за тик. Кормление понижает hunger на amount.
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+try:
+    from decay import STAT_MAX, STAT_MIN, sample_steps
+except ImportError:
+    from .decay import STAT_MAX, STAT_MIN, sample_steps
+
+
+def _numpy():
+    # NumPy нужен только пакетной форме; simple_server работает без него
+    import numpy
+    return numpy
+
+
+class Stat:
+    """Шкала: начальное значение, распад за единицу времени (со знаком) и границы.
+
+    В правилах с тиками важен только знак распада: шаг случайный (1-2).
+    """
+
+    __slots__ = ("name", "initial", "decay", "low", "high")
+
+    def __init__(self, name, initial, decay=0, low=STAT_MIN, high=STAT_MAX):
+        self.name = name
+        self.initial = initial
+        self.decay = decay
+        self.low = low
+        self.high = high
+
+
+class Action:
+    """Действие: шкала -> прибавка; строка - имя параметра ("-amount" вычитается).
+
+    Результат зажимается границей шкалы со стороны изменения.
+    """
+
+    __slots__ = ("name", "deltas", "params")
+
+    def __init__(self, name, deltas, **params):
+        self.name = name
+        self.deltas = deltas
+        self.params = params
+
+    def terms(self):
+        """[(шкала, знак, величина)]; величина - число или имя параметра."""
+        terms = []
+        for stat, delta in self.deltas.items():
+            if isinstance(delta, str):
+                sign = -1 if delta.startswith("-") else 1
+                terms.append((stat, sign, delta.lstrip("+-")))
+            else:
+                terms.append((stat, 1 if delta > 0 else -1, abs(delta)))
+        return terms
+
+
+def _compile(name, args, lines, namespace):
+    """def name(args): lines - исходник сохраняется в fn.source для отладки."""
+    source = f"def {name}({', '.join(args)}):\n" + "".join(f"    {line}\n" for line in lines)
+    namespace = dict(namespace)
+    exec(compile(source, f"<rules.{name}>", "exec"), namespace)
+    fn = namespace[name]
+    fn.source = source
+    return fn
+
+
+class Rules:
+    """Набор правил и скомпилированные из него функции.
+
+    `statuses` - [(метка, шкалы, порог)]: первая метка, у которой среднее
+    шкал больше порога, иначе `default_status`. `unit_seconds` - единица
+    распада (минута для линейного, тик для `ticks=True`). `neglect` -
+    (шкала, потеря за тик), пока любая убывающая шкала на границе.
+    """
+
+    def __init__(self, name, stats, actions, statuses, default_status, unit_seconds, ticks=False, neglect=None):
+        self.name = name
+        self.stats = {stat.name: stat for stat in stats}
+        self.names = tuple(self.stats)
+        self.decaying = tuple(stat for stat in stats if stat.decay)
+        self.actions = {action.name: action for action in actions}
+        self.statuses = tuple(statuses)
+        self.default_status = default_status
+        self.status_labels = tuple(label for label, _, _ in self.statuses) + (default_status,)
+        self.unit_seconds = unit_seconds
+        self.ticks = ticks
+        self.neglect = neglect
+        self.initial = {stat.name: stat.initial for stat in stats}
+        # Скорость убывания в единицах за unit_seconds (для projection.py и pet_stream.py)
+        self.rates = {stat.name: abs(stat.decay) for stat in self.decaying}
+
+        self.State = type(f"{name.title()}State", (), {
+            "__slots__": self.names,
+            "__init__": _compile("__init__", ["self"] + [f"{n}={self.initial[n]!r}" for n in self.names],
+                                 [f"self.{n} = {n}" for n in self.names], {}),
+            "__repr__": lambda s: f"{type(s).__name__}({', '.join(f'{n}={getattr(s, n)!r}' for n in self.names)})",
+        })
+        self._compile_scalar()
+        self.effect_funcs = {action: self._effect_func(action) for action in self.actions}
+
+    # --- скалярная форма ---
+
+    def _status_expr(self, ref):
+        lines = []
+        for label, stats, bound in self.statuses:
+            total = " + ".join(ref(stat) for stat in stats)
+            value = f"({total}) / {len(stats)}" if len(stats) > 1 else total
+            lines.append(f"if {value} > {bound!r}: return {label!r}")
+        lines.append(f"return {self.default_status!r}")
+        return lines
+
+    def _decay_lines(self):
+        """Распад над локальными переменными; `units` - минуты или тики."""
+        lines = []
+        if not self.ticks:
+            for stat in self.decaying:
+                n = stat.name
+                if stat.decay < 0:
+                    lines += [f"{n} = {n} - units * {-stat.decay!r}", f"if {n} < {stat.low!r}: {n} = {stat.low!r}"]
+                else:
+                    lines += [f"{n} = {n} + units * {stat.decay!r}", f"if {n} > {stat.high!r}: {n} = {stat.high!r}"]
+            return lines
+        lines.append("if units > 0:")
+        for stat in self.decaying:
+            n = stat.name
+            if stat.decay < 0:
+                lines.append(f"    {n} = {n} - sample_steps(units, {n} - {stat.low!r}, rng)")
+            else:
+                lines.append(f"    {n} = {n} + sample_steps(units, {stat.high!r} - {n}, rng)")
+        if self.neglect:
+            target, loss = self.neglect
+            low = self.stats[target].low
+            at_limit = " or ".join(
+                f"{stat.name} <= {stat.low!r}" if stat.decay < 0 else f"{stat.name} >= {stat.high!r}"
+                for stat in self.decaying
+            )
+            lines += [f"    if {at_limit}:",
+                      f"        {target} = {target} - units * {loss!r}",
+                      f"        if {target} < {low!r}: {target} = {low!r}"]
+        return lines
+
+    def _compile_scalar(self):
+        namespace = {"sample_steps": sample_steps, "random": random}
+        names = self.names
+        load = [f"{n} = s.{n}" for n in names]
+        store = [f"s.{n} = {n}" for n in names]
+
+        self.status = _compile("status", ["s"], self._status_expr(lambda n: f"s.{n}"), namespace)
+        local_status = _compile("status", list(names), self._status_expr(lambda n: n), namespace)
+        namespace["_status"] = local_status
+        # decay(s, units, rng): распад на месте; catch_up(*шкалы, units, rng) -> (*шкалы, статус)
+        self.decay = _compile("decay", ["s", "units", "rng=random"], load + self._decay_lines() + store + ["return s"],
+                              namespace)
+        self.catch_up = _compile("catch_up", [*names, "units", "rng=random"],
+                                 self._decay_lines() + [f"return {', '.join(names)}, _status({', '.join(names)})"],
+                                 namespace)
+        self.appliers = {}
+        for action in self.actions.values():
+            lines = []
+            for stat, sign, amount in action.terms():
+                bound = self.stats[stat]
+                value = f"s.{stat} {'+' if sign > 0 else '-'} {amount if isinstance(amount, str) else repr(amount)}"
+                lines.append(f"v = {value}")
+                if sign > 0:
+                    lines.append(f"s.{stat} = v if v < {bound.high!r} else {bound.high!r}")
+                else:
+                    lines.append(f"s.{stat} = v if v > {bound.low!r} else {bound.low!r}")
+            params = [f"{name}={default!r}" for name, default in action.params.items()]
+            self.appliers[action.name] = _compile(action.name, ["s", *params], lines + ["return s"], namespace)
+
+    def state(self, source=None, **values):
+        """State со значениями из объекта/словаря source (недостающие - начальные)."""
+        if source is not None:
+            get = source.get if isinstance(source, dict) else lambda n, d: getattr(source, n, d)
+            values = {**{n: get(n, self.initial[n]) for n in self.names}, **values}
+        return self.State(**values)
+
+    def apply(self, action, s, **params):
+        """Действие над объектом s на месте; s возвращается."""
+        return self.appliers[action](s, **params)
+
+    # --- общая форма: числа или SQL-выражения ---
+
+    def decayed(self, values, units, least=min, greatest=max):
+        """Шкалы после линейного распада за units; values - числа или выражения SQLAlchemy."""
+        if self.ticks:
+            raise ValueError(f"{self.name}: tick decay is random and cannot be expressed in SQL")
+        result = {}
+        for stat in self.decaying:
+            if stat.decay < 0:
+                result[stat.name] = greatest(stat.low, values[stat.name] - units * -stat.decay)
+            else:
+                result[stat.name] = least(stat.high, values[stat.name] + units * stat.decay)
+        return result
+
+    def effects(self, action, values, least=min, greatest=max, **params):
+        """Новые значения изменённых действием шкал.
+
+        Работает и с числами, и с SQL-выражениями (least=func.min, greatest=func.max).
+        """
+        spec = self.actions[action]
+        result = {}
+        for stat, sign, amount in spec.terms():
+            if isinstance(amount, str):
+                amount = params.get(amount, spec.params.get(amount))
+            bound = self.stats[stat]
+            if sign > 0:
+                result[stat] = least(bound.high, values[stat] + amount)
+            else:
+                result[stat] = greatest(bound.low, values[stat] - amount)
+        return result
+
+    def _effect_func(self, action):
+        def apply(state, **params):
+            return self.effects(action, state, **params)
+        apply.__name__ = action
+        return apply
+
+    # --- SQL для sqlite3 ---
+
+    def decay_sql(self, units):
+        """{шкала: SQL} линейного распада колонок; units - SQL-выражение (минуты)."""
+        return self.decayed({n: _Sql(n) for n in self.names}, _Sql(f"({units})"), _sql_least, _sql_greatest)
+
+    def effect_sql(self, action, values=None):
+        """{шкала: SQL} эффекта действия; values - SQL текущих значений (по умолчанию :шкала).
+
+        Параметры действия - именованные (:amount).
+        """
+        values = {n: _Sql(v) for n, v in (values or {n: f":{n}" for n in self.names}).items()}
+        params = {name: f":{name}" for name in self.actions[action].params}
+        return self.effects(action, values, _sql_least, _sql_greatest, **params)
+
+    # --- пакетная форма (NumPy) ---
+
+    def decay_batch(self, arrays, units, rng=None):
+        """Распад пачки: {шкала: массив}, units - массив минут/тиков; новые массивы.
+
+        Для тиков rng - numpy.random.Generator: сумма тиков шагов {1, 2}
+        считается как units + Binomial(units, 1/2), как decay.sample_steps.
+        """
+        np = _numpy()
+        result = dict(arrays)
+        if not self.ticks:
+            for stat in self.decaying:
+                value = arrays[stat.name] + units * stat.decay
+                result[stat.name] = np.maximum(value, stat.low) if stat.decay < 0 else np.minimum(value, stat.high)
+            return result
+        rng = rng if rng is not None else np.random.default_rng()
+        for stat in self.decaying:
+            value = arrays[stat.name]
+            distance = value - stat.low if stat.decay < 0 else stat.high - value
+            sampled = np.where(units < distance, units, 0)
+            steps = np.where(units >= distance, distance, np.minimum(distance, units + rng.binomial(sampled, 0.5)))
+            result[stat.name] = value - steps if stat.decay < 0 else value + steps
+        if self.neglect:
+            target, loss = self.neglect
+            at_limit = np.zeros(len(units), dtype=bool)
+            for stat in self.decaying:
+                value = result[stat.name]
+                at_limit |= (value <= stat.low) if stat.decay < 0 else (value >= stat.high)
+            current = arrays[target]
+            result[target] = np.where(at_limit, np.maximum(self.stats[target].low, current - units * loss), current)
+        return result
+
+    def apply_batch(self, action, arrays, **params):
+        """Действие над пачкой: {шкала: массив} -> новые массивы изменённых шкал."""
+        np = _numpy()
+        return self.effects(action, arrays, np.minimum, np.maximum, **params)
+
+    def status_batch(self, arrays):
+        """Индексы в status_labels для пачки."""
+        np = _numpy()
+        conditions = [sum(arrays[stat] for stat in stats) / len(stats) > bound for _, stats, bound in self.statuses]
+        return np.select(conditions, list(range(len(conditions))), default=len(conditions))
+
+
+class _Sql(str):
+    """Текст SQL-выражения: + - * дают текст, так что decayed/effects строят и SQL."""
+
+    def __add__(self, other):
+        return _Sql(f"{self} + {other}")
+
+    def __sub__(self, other):
+        return _Sql(f"{self} - {other}")
+
+    def __mul__(self, other):
+        return _Sql(f"{self} * {other}")
+
+
+def _sql_least(a, b):
+    return _Sql(f"MIN({a}, {b})")
+
+
+def _sql_greatest(a, b):
+    return _Sql(f"MAX({a}, {b})")
+
+
+PET_RULES = Rules(
+    "pet",
+    stats=(
+        Stat("hunger", 100.0, decay=-0.5),
+        Stat("mood", 100.0, decay=-0.3),
+        Stat("energy", 100.0, decay=-0.3),
+    ),
+    actions=(
+        Action("feed", {"hunger": 30, "mood": 10}),
+        Action("play", {"mood": 30, "energy": -10}),
+        Action("sleep", {"energy": 50, "hunger": -5}),
+        # +100 просто заполняет все шкалы
+        Action("heal", {"hunger": 100, "mood": 100, "energy": 100}),
+    ),
+    statuses=(("Happy", ("hunger", "mood", "energy"), 80), ("Okay", ("hunger", "mood", "energy"), 50)),
+    default_status="Sad",
+    unit_seconds=60,
+)
+
+TICK_RULES = Rules(
+    "tick",
+    stats=(
+        Stat("hunger", 50, decay=1),
+        Stat("energy", 100, decay=-1),
+        Stat("mood", 50, decay=-1),
+        Stat("health", 100),
+    ),
+    actions=(
+        Action("feed", {"hunger": "-amount"}, amount=30),
+        Action("play", {"energy": -20, "mood": 20, "hunger": 10}),
+        Action("sleep", {"energy": 50, "hunger": 8}),
+        Action("heal", {"health": 30}),
+    ),
+    statuses=(("healthy", ("health",), 0),),
+    default_status="dead",
+    unit_seconds=20,
+    ticks=True,
+    neglect=("health", 1),
+)
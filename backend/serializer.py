@@ -0,0 +1,284 @@
+"""
+Сериализация ответов: JSON или MessagePack по заголовку Accept.
+
+Ответы с питомцем имеют фиксированную форму, поэтому для каждой формы
+(Shape) кодировщик собирается один раз: ключи и разделители заранее
+закодированы, на запрос остаются только значения. Модели Pydantic на
+выходе не создаются и не валидируются.
+
+MessagePack отдаётся только тем, кто явно просит
+application/msgpack (x-msgpack, vnd.msgpack) в Accept - ботам и нативным
+клиентам; браузеры с */* получают JSON. Кодировщик MessagePack свой
+(без зависимостей, нужен и simple_server.py); если установлен пакет
+msgpack, произвольные объекты пакуются им.
+
+Числа в формах должны быть конечными (шкалы зажаты в [0, 100]).
+"""
+import json
+import re
+import struct
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+
+try:
+    import msgpack as _msgpack
+except ImportError:
+    _msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = {MSGPACK, "application/x-msgpack", "application/vnd.msgpack"}
+
+
+def _isoformat(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+_dumps_json = json.JSONEncoder(separators=(",", ":"), default=_isoformat).encode
+_DOUBLE = struct.Struct(">Bd").pack
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept):
+    """MSGPACK, если он явно указан в Accept с q не ниже, чем у JSON; иначе JSON."""
+    if not accept or "msgpack" not in accept:
+        return JSON
+    best_json = best_msgpack = 0.0
+    for item in accept.split(","):
+        media, _, params = item.strip().partition(";")
+        media = media.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media in MSGPACK_TYPES:
+            best_msgpack = max(best_msgpack, q)
+        elif media in (JSON, "application/*", "*/*"):
+            best_json = max(best_json, q)
+    return MSGPACK if best_msgpack > 0 and best_msgpack >= best_json else JSON
+
+
+# --- MessagePack ---
+
+def _pack_str(value):
+    data = value.encode()
+    n = len(data)
+    if n < 32:
+        return bytes((0xA0 | n,)) + data
+    if n < 0x100:
+        return bytes((0xD9, n)) + data
+    if n < 0x10000:
+        return b"\xda" + n.to_bytes(2, "big") + data
+    return b"\xdb" + n.to_bytes(4, "big") + data
+
+
+def _pack_int(value):
+    if 0 <= value < 0x80:
+        return bytes((value,))
+    if -32 <= value < 0:
+        return bytes((value & 0xFF,))
+    if value >= 0:
+        for code, size in ((0xCC, 1), (0xCD, 2), (0xCE, 4), (0xCF, 8)):
+            if value < 1 << (8 * size):
+                return bytes((code,)) + value.to_bytes(size, "big")
+    else:
+        for code, size in ((0xD0, 1), (0xD1, 2), (0xD2, 4), (0xD3, 8)):
+            if value >= -(1 << (8 * size - 1)):
+                return bytes((code,)) + value.to_bytes(size, "big", signed=True)
+    raise OverflowError(f"integer out of range: {value}")
+
+
+def _header(value, fix, small, large):
+    if value < 16:
+        return bytes((fix | value,))
+    if value < 0x10000:
+        return bytes((small,)) + value.to_bytes(2, "big")
+    return bytes((large,)) + value.to_bytes(4, "big")
+
+
+def _pack(value):
+    if value is None:
+        return b"\xc0"
+    if value is True:
+        return b"\xc3"
+    if value is False:
+        return b"\xc2"
+    if isinstance(value, int):
+        return _pack_int(value)
+    if isinstance(value, float):
+        return _DOUBLE(0xCB, value)
+    if isinstance(value, str):
+        return _pack_str(value)
+    if isinstance(value, dict):
+        return _header(len(value), 0x80, 0xDE, 0xDF) + b"".join(
+            _pack(str(key)) + _pack(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return _header(len(value), 0x90, 0xDC, 0xDD) + b"".join(_pack(item) for item in value)
+    if isinstance(value, (bytes, bytearray)):
+        return bytes((0xC4, len(value))) + value if len(value) < 0x100 else \
+            b"\xc6" + len(value).to_bytes(4, "big") + value
+    if hasattr(value, "isoformat"):
+        return _pack_str(value.isoformat())
+    raise TypeError(f"cannot pack {type(value).__name__}")
+
+
+def packb(value):
+    """Произвольный объект в MessagePack (даты - строки ISO)."""
+    if _msgpack is not None:
+        return _msgpack.packb(value, default=_isoformat)
+    return _pack(value)
+
+
+def unpackb(data):
+    """Обратное к packb для типов, которые пишет этот модуль (клиенты, проверки)."""
+    value, end = _unpack(memoryview(data), 0)
+    if end != len(data):
+        raise ValueError("trailing data")
+    return value
+
+
+def _unpack(data, i):
+    code = data[i]
+    i += 1
+    if code < 0x80:
+        return code, i
+    if code >= 0xE0:
+        return code - 0x100, i
+    if 0xA0 <= code < 0xC0:
+        n = code & 0x1F
+        return bytes(data[i:i + n]).decode(), i + n
+    if 0x80 <= code < 0x90:
+        return _unpack_map(data, i, code & 0x0F)
+    if 0x90 <= code < 0xA0:
+        return _unpack_array(data, i, code & 0x0F)
+    if code in (0xC0, 0xC2, 0xC3):
+        return {0xC0: None, 0xC2: False, 0xC3: True}[code], i
+    if code == 0xCB:
+        return struct.unpack_from(">d", data, i)[0], i + 8
+    if code == 0xCA:
+        return struct.unpack_from(">f", data, i)[0], i + 4
+    sizes = {0xCC: 1, 0xCD: 2, 0xCE: 4, 0xCF: 8, 0xD0: 1, 0xD1: 2, 0xD2: 4, 0xD3: 8}
+    if code in sizes:
+        size = sizes[code]
+        return int.from_bytes(data[i:i + size], "big", signed=code >= 0xD0), i + size
+    lengths = {0xD9: 1, 0xDA: 2, 0xDB: 4, 0xC4: 1, 0xC5: 2, 0xC6: 4}
+    if code in lengths:
+        size = lengths[code]
+        n = int.from_bytes(data[i:i + size], "big")
+        i += size
+        raw = bytes(data[i:i + n])
+        return (raw if code in (0xC4, 0xC5, 0xC6) else raw.decode()), i + n
+    counts = {0xDC: (2, _unpack_array), 0xDD: (4, _unpack_array), 0xDE: (2, _unpack_map), 0xDF: (4, _unpack_map)}
+    if code in counts:
+        size, reader = counts[code]
+        return reader(data, i + size, int.from_bytes(data[i:i + size], "big"))
+    raise ValueError(f"unsupported msgpack type 0x{code:02x}")
+
+
+def _unpack_array(data, i, n):
+    items = []
+    for _ in range(n):
+        item, i = _unpack(data, i)
+        items.append(item)
+    return items, i
+
+
+def _unpack_map(data, i, n):
+    result = {}
+    for _ in range(n):
+        key, i = _unpack(data, i)
+        result[key], i = _unpack(data, i)
+    return result, i
+
+
+# --- формы ответов ---
+
+# Выражения для значения `v` по виду поля: (JSON -> str, MessagePack -> bytes)
+_KINDS = {
+    "str": ("_jstr(v)", "_mstr(v)"),
+    "str?": ("'null' if v is None else _jstr(v)", "b'\\xc0' if v is None else _mstr(v)"),
+    "int": ("'%d' % v", "_mbyte((v,)) if 0 <= v < 128 else _mint(v)"),
+    "float": ("_frepr(float(v))", "_double(0xCB, v)"),
+    "number": ("repr(v)", "_mpack(v)"),
+    "number?": ("'null' if v is None else repr(v)", "_mpack(v)"),
+    "bool": ("'true' if v else 'false'", "b'\\xc3' if v else b'\\xc2'"),
+    "any": ("_jany(v)", "_mpack(v)"),
+}
+_NAMESPACE = {
+    "_jstr": encode_basestring_ascii, "_mstr": _pack_str, "_mint": _pack_int, "_mbyte": bytes,
+    "_frepr": float.__repr__, "_double": _DOUBLE, "_mpack": _pack, "_jany": _dumps_json,
+}
+
+
+class Shape:
+    """Объект с фиксированными ключами: fields - [(ключ, вид)], вид - из _KINDS или вложенная Shape.
+
+    Значения передаются кортежем в порядке полей (вложенная форма - кортежем же).
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = tuple(fields)
+        self.keys = tuple(key for key, _ in self.fields)
+        namespace = dict(_NAMESPACE)
+        json_parts, msgpack_parts = [], []
+        for index, (key, kind) in enumerate(self.fields):
+            if isinstance(kind, Shape):
+                namespace[f"_json{index}"], namespace[f"_msgpack{index}"] = kind._json, kind.msgpack
+                json_expr, msgpack_expr = f"_json{index}(v)", f"_msgpack{index}(v)"
+            else:
+                json_expr, msgpack_expr = _KINDS[kind]
+            value = f"values[{index}]"
+            prefix = ("{" if index == 0 else ",") + encode_basestring_ascii(key) + ":"
+            json_parts += [repr(prefix), f"({_bind(json_expr, value)})"]
+            msgpack_parts += [repr(_pack_str(key)), f"({_bind(msgpack_expr, value)})"]
+        json_parts.append(repr("}"))
+        header = _header(len(self.fields), 0x80, 0xDE, 0xDF)
+        self._json = _compile(f"{name}_json", "''.join((" + ", ".join(json_parts) + ",))", namespace)
+        self.msgpack = _compile(f"{name}_msgpack",
+                                f"b''.join(({header!r}, " + ", ".join(msgpack_parts) + ",))", namespace)
+
+    def json(self, values):
+        return self._json(values).encode()
+
+    def encode(self, values, media=JSON):
+        return self.msgpack(values) if media == MSGPACK else self._json(values).encode()
+
+    def render(self, values, accept=None):
+        """(тело, Content-Type) по заголовку Accept."""
+        media = negotiate(accept)
+        return self.encode(values, media), media
+
+    def dict(self, values):
+        return {key: kind.dict(value) if isinstance(kind, Shape) else value
+                for (key, kind), value in zip(self.fields, values)}
+
+
+def _bind(expr, value):
+    """Подставляет выражение значения вместо идентификатора v в шаблоне из _KINDS."""
+    return re.sub(r"\bv\b", value, expr)
+
+
+def _compile(name, expr, namespace):
+    source = f"def {name}(values):\n    return {expr}\n"
+    exec(compile(source, f"<serializer.{name}>", "exec"), namespace)
+    fn = namespace[name]
+    fn.source = source
+    return fn
+
+
+def dumps(value, media=JSON):
+    """Произвольный объект (не форма) в JSON или MessagePack."""
+    return packb(value) if media == MSGPACK else _dumps_json(value).encode()
+
+
+def render(value, accept=None):
+    """(тело, Content-Type) для произвольного объекта по заголовку Accept."""
+    media = negotiate(accept)
+    return dumps(value, media), media
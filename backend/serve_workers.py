@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""
+Production-запуск main.py: несколько процессов uvicorn на одном порту.
+
+    python serve_workers.py [--workers N] [--host 0.0.0.0] [--port 8000] [--app main:app]
+
+Супервизор сам открывает слушающий сокет и передаёт его воркерам
+(multiprocessing, spawn), так что соединения распределяет ядро. Каждый
+воркер импортирует приложение заново - свои engine и соединения SQLite
+на процесс (записи с busy_timeout и retry_busy), - прогревает пулы и
+только потом начинает принимать запросы. Упавший воркер перезапускается,
+при частых падениях - с растущей паузой. SIGTERM/Ctrl+C останавливают
+всех (uvicorn дорабатывает текущие запросы).
+
+Кэши воркеров согласуются через хаб инвалидаций, метрики всех процессов
+доступны через /metrics любого воркера (см. workers.py). Число воркеров
+по умолчанию - PET_WORKERS или число ядер.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+import metrics
+import workers
+
+DEFAULT_WORKERS = int(os.environ.get("PET_WORKERS", "0")) or os.cpu_count() or 1
+STOP_TIMEOUT = 30
+RESTART_DELAY = 0.5
+MAX_RESTART_DELAY = 30
+# Воркер, проживший меньше, считается упавшим при старте: пауза перед рестартом растёт
+MIN_UPTIME = 5
+
+WORKER_RESTARTS = metrics.Counter("pet_worker_restarts_total", "Worker processes restarted after exiting.",
+                                  ("worker",))
+WORKERS_ALIVE = metrics.Gauge("pet_workers_alive", "Worker processes currently running.")
+
+
+def prewarm(app):
+    """Схема БД, соединения со всеми шардами и схема OpenAPI до первого запроса."""
+    import database
+
+    database.ensure_schema()
+    for shard in database.shards:
+        for engine in {shard.engine, shard.read_engine}:
+            with engine.connect() as conn:
+                conn.exec_driver_sql("SELECT 1")
+    app.openapi()
+    metrics.render()
+
+
+def run_worker(index, sock, app_path, log_level):
+    os.environ["PET_WORKER_ID"] = str(index)
+    # workers.py импортирован ещё при распаковке run_worker (spawn), до PET_WORKER_ID
+    workers.WORKER_ID = str(index)
+    workers.IS_PRIMARY = index == 0
+    import uvicorn
+    from uvicorn.importer import import_from_string
+
+    app = import_from_string(app_path)
+    prewarm(app)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level, lifespan="on"))
+    server.run(sockets=[sock])
+
+
+def bind_socket(host, port, backlog):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    def __init__(self, app_path, sock, workers, log_level):
+        self.app_path = app_path
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = {}
+        self.started = {}
+        self.delays = {}
+        self.stopping = False
+
+    def spawn(self, index):
+        proc = self.context.Process(target=run_worker, args=(index, self.sock, self.app_path, self.log_level),
+                                    name=f"pet-worker-{index}")
+        proc.start()
+        self.processes[index] = proc
+        self.started[index] = time.monotonic()
+
+    def watch(self):
+        for index in range(self.workers):
+            self.spawn(index)
+        restart_at = {}
+        while not self.stopping:
+            time.sleep(0.2)
+            now = time.monotonic()
+            for index, proc in list(self.processes.items()):
+                if proc.is_alive() or self.stopping:
+                    continue
+                if index not in restart_at:
+                    crashed_early = now - self.started[index] < MIN_UPTIME
+                    delay = min(MAX_RESTART_DELAY, self.delays.get(index, RESTART_DELAY) * 2) if crashed_early \
+                        else RESTART_DELAY
+                    self.delays[index] = delay
+                    restart_at[index] = now + delay
+                    print(f"✗ worker {index} (pid {proc.pid}) exited with {proc.exitcode}, restart in {delay:.1f}s")
+                elif now >= restart_at[index]:
+                    del restart_at[index]
+                    WORKER_RESTARTS.labels(str(index)).inc()
+                    self.spawn(index)
+            WORKERS_ALIVE.set(sum(proc.is_alive() for proc in self.processes.values()))
+            workers.write_metrics("supervisor")
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+
+    def shutdown(self):
+        for proc in self.processes.values():
+            if proc.is_alive():
+                proc.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for proc in self.processes.values():
+            proc.join(max(0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Digital Pet API with several worker processes")
+    parser.add_argument("--app", default="main:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+    hub = workers.InvalidationHub().start()
+    worker_dir = tempfile.mkdtemp(prefix="pet-workers-")
+    # spawn копирует окружение родителя
+    os.environ.update(PET_WORKER_HUB=hub.address, PET_WORKER_DIR=worker_dir)
+    workers.WORKER_DIR = worker_dir
+
+    supervisor = Supervisor(args.app, sock, args.workers, args.log_level)
+    signal.signal(signal.SIGTERM, supervisor.stop)
+    signal.signal(signal.SIGINT, supervisor.stop)
+    print(f"🚀 Digital Pet API: {args.workers} workers on http://{args.host}:{args.port}")
+    try:
+        supervisor.watch()
+    finally:
+        supervisor.shutdown()
+        hub.stop()
+        sock.close()
+        shutil.rmtree(worker_dir, ignore_errors=True)
+        print("✓ Workers stopped")
+
+
+if __name__ == "__main__":
+    main()
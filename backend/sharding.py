@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Шардирование питомцев main.py по user_id (PET_SHARDS=N).
+
+Каждый user_id попадает в один из N файлов SQLite по consistent hash:
+кольцо из VNODES точек на шард, ключ - blake2b(user_id). Шард 0 - это
+прежний digital_pet.db, остальные лежат рядом (digital_pet.shard<i>.db),
+поэтому PET_SHARDS=1 ничего не меняет, а при переходе N -> N+1 переезжает
+примерно 1/(N+1) питомцев.
+
+Engine, пулы и group commit на шард - в database.py. Здесь только
+маршрутизация и перенос питомцев при смене N (сервер остановлен):
+
+    python sharding.py rebalance --from 1 --to 4 [--db ./digital_pet.db] [--dry-run]
+
+Перенос идёт кусками: сначала строки pets и pet_events пишутся в целевой
+шард (если питомца там ещё нет), затем удаляются из исходного. Повторный
+запуск после сбоя доделывает перенос. Снимки pet_snapshots переехавших
+питомцев удаляются: id событий в новом файле другие, а состояние
+восстанавливается из журнала.
+"""
+import bisect
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import sqlite_tuning
+
+SHARD_COUNT = int(os.environ.get("PET_SHARDS", "1"))
+VNODES = 64
+REBALANCE_CHUNK = 5000
+# Таблицы с user_id, которые переезжают вместе с питомцем
+MOVED_TABLES = ("pets", "pet_events")
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, shards, vnodes=VNODES):
+        if shards < 1:
+            raise ValueError("need at least one shard")
+        self.shards = shards
+        points = sorted((_hash(f"shard-{shard}#{vnode}"), shard) for shard in range(shards) for vnode in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard(self, user_id):
+        if self.shards == 1:
+            return 0
+        index = bisect.bisect(self._points, _hash(user_id))
+        return self._owners[index % len(self._owners)]
+
+
+def shard_path(database, index):
+    """Шард 0 - сам database, остальные - digital_pet.shard<i>.db рядом с ним."""
+    if index == 0:
+        return database
+    base, ext = os.path.splitext(database)
+    return f"{base}.shard{index}{ext}"
+
+
+# --- перенос ---
+
+def _copy_schema(source, target):
+    """Таблицы и индексы исходного шарда в целевом (если их там нет)."""
+    for kind in ("table", "index"):
+        for (sql,) in source.execute(
+            "SELECT sql FROM sqlite_master WHERE type = ? AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%'", (kind,)
+        ):
+            # Первое вхождение - после CREATE [UNIQUE]
+            target.execute(sql.replace(f"{kind.upper()} ", f"{kind.upper()} IF NOT EXISTS ", 1))
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})") if row[1] != "id"]
+
+
+def _move(conn, user_ids, tables):
+    """Питомцы user_ids из main в dst: сначала запись в dst, потом удаление из main."""
+    conn.execute("DELETE FROM temp.moving")
+    conn.executemany("INSERT INTO temp.moving (user_id) VALUES (?)", ((uid,) for uid in user_ids))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM temp.fresh")
+        conn.execute(
+            "INSERT INTO temp.fresh SELECT user_id FROM temp.moving "
+            "WHERE NOT EXISTS (SELECT 1 FROM dst.pets WHERE dst.pets.user_id = temp.moving.user_id)"
+        )
+        for table in (table for table in MOVED_TABLES if table in tables):
+            columns = ", ".join(_columns(conn, "main", table))
+            conn.execute(
+                f"INSERT INTO dst.{table} ({columns}) SELECT {columns} FROM main.{table} "
+                f"WHERE user_id IN (SELECT user_id FROM temp.fresh) ORDER BY id"
+            )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table in (table for table in (*MOVED_TABLES, "pet_snapshots") if table in tables):
+            conn.execute(f"DELETE FROM main.{table} WHERE user_id IN (SELECT user_id FROM temp.moving)")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def rebalance(database, old_count, new_count, dry_run=False, chunk=REBALANCE_CHUNK):
+    """Переносит питомцев из раскладки old_count в new_count; возвращает {(из, в): число}."""
+    ring = HashRing(new_count)
+    moves = {}
+    for source_index in range(old_count):
+        path = shard_path(database, source_index)
+        if not os.path.exists(path):
+            continue
+        conn = sqlite_tuning.connect(path, isolation_level=None)
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if "pets" not in tables:
+                continue
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS moving (user_id TEXT PRIMARY KEY)")
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS fresh (user_id TEXT PRIMARY KEY)")
+            # Список переезжающих целиком до переноса: keyset по id ломается от удалений
+            pending = {}
+            after = 0
+            while True:
+                rows = conn.execute(
+                    "SELECT id, user_id FROM pets WHERE id > ? ORDER BY id LIMIT ?", (after, chunk)
+                ).fetchall()
+                if not rows:
+                    break
+                after = rows[-1][0]
+                for _, user_id in rows:
+                    target = ring.shard(user_id)
+                    if target != source_index:
+                        pending.setdefault(target, []).append(user_id)
+            for target, user_ids in pending.items():
+                moves[(source_index, target)] = len(user_ids)
+                if dry_run:
+                    continue
+                target_path = shard_path(database, target)
+                with sqlite_tuning.connect(target_path) as target_conn:
+                    _copy_schema(conn, target_conn)
+                target_conn.close()
+                conn.execute("ATTACH DATABASE ? AS dst", (target_path,))
+                try:
+                    for start in range(0, len(user_ids), chunk):
+                        _move(conn, user_ids[start:start + chunk], tables)
+                finally:
+                    conn.execute("DETACH DATABASE dst")
+        finally:
+            conn.close()
+    return moves
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shard tools for main.py databases")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebalance_parser = sub.add_parser("rebalance", help="move pets after changing PET_SHARDS (server stopped)")
+    rebalance_parser.add_argument("--from", dest="old", type=int, required=True)
+    rebalance_parser.add_argument("--to", dest="new", type=int, required=True)
+    rebalance_parser.add_argument("--db", default="./digital_pet.db")
+    rebalance_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    moves = rebalance(args.db, args.old, args.new, args.dry_run)
+    for (source, target), count in sorted(moves.items()):
+        print(f"shard {source} -> {target}: {count} pets")
+    print(f"{'would move' if args.dry_run else 'moved'} {sum(moves.values())} pets")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,19 +3,58 @@
 Simple HTTP Backend Server for Digital Pet
 Runs without FastAPI/Uvicorn dependencies
 """
+import argparse
+import functools
 import json
-import random
+import queue
+import selectors
+import signal
+import socket
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from urllib.parse import urlparse
+from urllib.parse import parse_qs, urlparse
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from decay import pet_rng
+from rules import TICK_RULES
+from projection import tick_projection
+from conditional import ConditionalStats, etag_matches, state_etag
+from group_commit import GroupCommitWriter
+import metrics
+import migrations
+import serializer
+import sqlite_tuning
+from sqlite_tuning import retry_busy
 
 # Ensure we're in the right directory
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-DATABASE = '../digital_pet.db'
-DECAY_INTERVAL_SECONDS = 20
+DATABASE = os.environ.get('PET_SIMPLE_DATABASE', '../digital_pet.db')
+# sqlite или memory (колонки в памяти + журнал, см. memory_store.py)
+STORAGE = os.environ.get('PET_SIMPLE_STORAGE', 'sqlite')
+DECAY_INTERVAL_SECONDS = TICK_RULES.unit_seconds
+POOL_SIZE = 4
+
+# Режим --mode threaded
+DEFAULT_WORKERS = 16
+DEFAULT_QUEUE_SIZE = 64
+KEEPALIVE_TIMEOUT = 5
+# Простаивающие keep-alive соединения сверх лимита закрываются, самые старые первыми
+DEFAULT_MAX_IDLE = 1024
+DRAIN_TIMEOUT = 30
+
+# Метка route в /metrics; остальные пути считаются как 'unmatched'
+ROUTES = {'/', '/pet', '/pet/feed', '/pet/play', '/pet/sleep', '/pet/heal', '/pets/attention', '/stats', '/metrics'}
+
+# Прогнозные колонки (projection.py) для /pets/attention
+ATTENTION_COLUMNS = {'critical': 'critical_at', 'dead': 'dead_at'}
 
 
 def _parse_dt(value):
@@ -27,131 +66,371 @@ def _parse_dt(value):
         return datetime.now()
 
 
-def _get_latest_pet_id(cursor):
-    cursor.execute('SELECT MAX(id) FROM pet')
-    row = cursor.fetchone()
-    return row[0] if row and row[0] is not None else None
+class ConnectionPool:
+    """Небольшой пул sqlite3-соединений, общий для всех запросов.
+
+    Соединения открываются лениво (не больше `size`) и работают в режиме
+    autocommit, чтобы границы транзакций задавал unit_of_work().
+    С read_only=True соединения открываются как mode=ro и транзакция
+    только читающая; durable=True ставит synchronous=FULL (писатель group commit).
+    """
+
+    def __init__(self, database, size=POOL_SIZE, read_only=False, durable=False):
+        self.database = database
+        self.size = size
+        self.read_only = read_only
+        self.durable = durable
+        self.connects = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite_tuning.connect(
+            self.database, read_only=self.read_only, durable=self.durable,
+            isolation_level=None, check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.set_trace_callback(_trace_statement)
+        return conn
 
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self.connects < self.size:
+                self.connects += 1
+                return self._connect()
+        started = time.perf_counter()
+        conn = self._idle.get()
+        metrics.POOL_WAIT.labels('read' if self.read_only else 'write').observe(time.perf_counter() - started)
+        return conn
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    @contextmanager
+    def unit_of_work(self):
+        """Одно соединение и одна транзакция на весь запрос."""
+        conn = self.acquire()
+        started = time.perf_counter()
+        try:
+            conn.execute('BEGIN' if self.read_only else 'BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            self.release(conn)
+            metrics.record_db_time(time.perf_counter() - started)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
 
-def update_pet_stats(pet_id):
-    """Автоматически обновляет показатели питомца с учетом времени."""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
 
-    cursor.execute(
-        'SELECT hunger, energy, mood, health, status, last_update FROM pet WHERE id = ?',
-        (pet_id,),
-    )
-    row = cursor.fetchone()
-
-    if not row:
-        conn.close()
-        return
-
-    hunger, energy, mood, health, status, last_update = row
-
-    if status == 'dead' or health <= 0:
-        cursor.execute(
-            """
-            UPDATE pet
-            SET health = 0, status = 'dead', last_update = ?
-            WHERE id = ?
-            """,
-            (datetime.now().isoformat(), pet_id),
-        )
-        conn.commit()
-        conn.close()
-        return
+def _trace_statement(statement):
+    # sqlite3 не сообщает время оператора: время считается на транзакцию в unit_of_work
+    metrics.record_query()
 
-    now = datetime.now()
-    last_dt = _parse_dt(last_update)
-    ticks = int((now - last_dt).total_seconds() // DECAY_INTERVAL_SECONDS)
 
+_pool = None
+_read_pool = None
+_writer_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE)
+    return _pool
+
+
+def get_read_pool():
+    """Пул mode=ro соединений для чтений (или общий пул без read split)."""
+    global _read_pool
+    if not sqlite_tuning.READ_SPLIT:
+        return get_pool()
+    if _read_pool is None:
+        with _pool_lock:
+            if _read_pool is None:
+                _read_pool = ConnectionPool(DATABASE, read_only=True)
+    return _read_pool
+
+
+def get_writer_pool():
+    """Одно соединение с synchronous=FULL для потока group commit."""
+    global _writer_pool
+    if _writer_pool is None:
+        with _pool_lock:
+            if _writer_pool is None:
+                _writer_pool = ConnectionPool(DATABASE, size=1, durable=True)
+    return _writer_pool
+
+
+# PET_GROUP_COMMIT=1: записи идут через один поток и коммитятся пачками;
+# пачка подтверждается после fsync своего COMMIT.
+group_writer = GroupCommitWriter(lambda: get_writer_pool().unit_of_work(), name='pet-group-commit')
+
+
+STATE_COLUMNS = ('hunger', 'energy', 'mood', 'health', 'status')
+
+conditional_stats = ConditionalStats()
+metrics.CallbackGauge('pet_http_not_modified_total', 'Conditional GETs answered with 304.',
+                      lambda: conditional_stats.not_modified, type='counter')
+
+# Эффекты действий (rules.TICK_RULES) поверх уже посчитанного распада (:hunger и т.д.).
+ACTION_EFFECTS = {action: TICK_RULES.effect_sql(action) for action in TICK_RULES.actions}
+
+
+def _update_sql(effects):
+    assignments = ', '.join(f"{col} = {effects.get(col, ':' + col)}" for col in STATE_COLUMNS)
+    return f'UPDATE pet SET {assignments}, last_update = :now WHERE id = :id RETURNING *'
+
+
+# Те же эффекты над числами - для хранилища в памяти
+ACTION_FUNCS = TICK_RULES.effect_funcs
+
+# Задаётся в serve() при --storage memory
+memory_store = None
+
+
+_DECAY_SQL = _update_sql({})
+_ACTION_SQL = {name: _update_sql(effects) for name, effects in ACTION_EFFECTS.items()}
+_PROJECTION_SQL = 'UPDATE pet SET critical_at = ?, dead_at = ? WHERE id = ?'
+
+
+def _projection(row, at):
+    """(critical_at, dead_at) для состояния строки на момент at."""
+    return tick_projection(row['hunger'], row['energy'], row['mood'], row['health'], row['status'],
+                           at, DECAY_INTERVAL_SECONDS)
+
+
+def _apply_decay(row, now, rng=None):
+    """Считает распад для строки питомца, не обращаясь к БД.
+
+    Возвращает (state, changed), где state - новые значения STATE_COLUMNS.
+    """
+    state = {col: row[col] for col in STATE_COLUMNS}
+
+    if state['status'] == 'dead' or state['health'] <= 0:
+        changed = state['health'] != 0 or state['status'] != 'dead'
+        state.update(health=0, status='dead')
+        return state, changed
+
+    ticks = int((now - _parse_dt(row['last_update'])).total_seconds() // DECAY_INTERVAL_SECONDS)
     if ticks <= 0:
-        conn.close()
-        return
-
-    for _ in range(ticks):
-        # Все шкалы кроме здоровья убывают сами по себе на 1-2 единицы.
-        hunger = min(100, hunger + random.randint(1, 2))
-        energy = max(0, energy - random.randint(1, 2))
-        mood = max(0, mood - random.randint(1, 2))
-
-    # Если любая из шкал достигла критического значения, здоровье медленно падает.
-    if hunger >= 100 or energy <= 0 or mood <= 0:
-        health = max(0, health - ticks)
-
-    status = 'dead' if health <= 0 else 'healthy'
-
-    cursor.execute(
-        """
-        UPDATE pet
-        SET hunger = ?, energy = ?, mood = ?, health = ?, status = ?, last_update = ?
-        WHERE id = ?
-        """,
-        (hunger, energy, mood, health, status, now.isoformat(), pet_id),
+        return state, False
+
+    metrics.DECAY_TICKS.observe(ticks)
+    if rng is None:
+        rng = pet_rng(row['id'], row['last_update'])
+
+    # Все шкалы кроме здоровья убывают сами по себе на 1-2 единицы за тик.
+    hunger, energy, mood, health, status = TICK_RULES.catch_up(
+        state['hunger'], state['energy'], state['mood'], state['health'], ticks, rng
     )
+    state.update(hunger=hunger, energy=energy, mood=mood, health=health, status=status)
+    # Шкалы, упёршиеся в границы, дальше не меняются - тогда и писать нечего.
+    return state, any(state[col] != row[col] for col in STATE_COLUMNS)
+
+
+def run_pet_action(action=None, pet_id=None, rng=None, params=None):
+    """Поиск питомца, распад, действие и чтение результата в одной транзакции.
+
+    Без pet_id берётся последний созданный питомец. Возвращает итоговую
+    строку (из UPDATE ... RETURNING, без повторного SELECT) или None.
+    Мёртвый питомец действия не получает.
+    """
+    if memory_store is not None:
+        return memory_store.run(action, pet_id, rng, params)
+    if action is None and sqlite_tuning.READ_SPLIT:
+        # Чтение без распада не требует записи и не трогает писателя.
+        with get_read_pool().unit_of_work() as conn:
+            row = _load_pet(conn, pet_id)
+            if row is None or not _apply_decay(row, datetime.now(), rng)[1]:
+                return row
 
-    conn.commit()
-    conn.close()
+    def job(conn):
+        return _pet_action_in(conn, action, pet_id, rng, params)
+
+    if group_writer.enabled:
+        return group_writer.run(job)
+
+    def direct():
+        with get_pool().unit_of_work() as conn:
+            return job(conn)
+
+    return retry_busy(direct)
+
+
+def _load_pet(conn, pet_id):
+    if pet_id is None:
+        return conn.execute('SELECT * FROM pet ORDER BY id DESC LIMIT 1').fetchone()
+    return conn.execute('SELECT * FROM pet WHERE id = ?', (pet_id,)).fetchone()
+
+
+def _pet_action_in(conn, action, pet_id, rng, params):
+    now = datetime.now()
+    row = _load_pet(conn, pet_id)
+    if row is None:
+        return None
+
+    state, changed = _apply_decay(row, now, rng)
+    if action is not None and state['status'] != 'dead':
+        sql = _ACTION_SQL[action]
+    elif changed:
+        sql = _DECAY_SQL
+    else:
+        return row
+
+    values = dict(params or {}, id=row['id'], now=now.isoformat(), **state)
+    row = conn.execute(sql, values).fetchone()
+    # Шаги случайные, так что прогноз обновляется при любой записи
+    conn.execute(_PROJECTION_SQL, (*_projection(row, now), row['id']))
+    return row
+
+
+def update_pet_stats(pet_id, rng=None):
+    """Автоматически обновляет показатели питомца с учетом времени.
+
+    `rng` позволяет передать свой ГСЧ (например, random.Random(seed));
+    по умолчанию берётся pet_rng() для этого питомца.
+    """
+    run_pet_action(pet_id=pet_id, rng=rng)
+
+
+# Ответ с питомцем кодируется заранее собранной формой (serializer.py), без dict
+PET_PAYLOAD = serializer.Shape('pet_payload', [
+    ('id', 'int'), ('name', 'str'), ('hunger', 'int'), ('energy', 'int'), ('mood', 'int'), ('health', 'int'),
+    ('status', 'str'), ('created_at', 'str?'),
+])
+
+
+def _pet_payload(row):
+    """Значения PET_PAYLOAD; первые семь - видимое состояние для ETag."""
+    return (row['id'], row['name'], int(row['hunger']), int(row['energy']), int(row['mood']), int(row['health']),
+            row['status'], row['created_at'])
 
 
 def init_db():
-    """Initialize database if it doesn't exist"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS pet (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            hunger INTEGER DEFAULT 50,
-            energy INTEGER DEFAULT 100,
-            mood INTEGER DEFAULT 50,
-            health INTEGER DEFAULT 100,
-            status TEXT DEFAULT 'healthy',
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            last_update TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    )
+    """Создаёт или мигрирует таблицу pet (migrations.py); на актуальной БД - один SELECT версии."""
+    migrations.ensure(DATABASE, 'simple')
 
-    cursor.execute('PRAGMA table_info(pet)')
-    columns = {row[1] for row in cursor.fetchall()}
-    if 'last_update' not in columns:
-        cursor.execute("ALTER TABLE pet ADD COLUMN last_update TEXT")
-        cursor.execute(
-            "UPDATE pet SET last_update = ? WHERE last_update IS NULL",
-            (datetime.now().isoformat(),),
-        )
-    if 'status' not in columns:
-        cursor.execute("ALTER TABLE pet ADD COLUMN status TEXT DEFAULT 'healthy'")
 
-    conn.commit()
-    conn.close()
+def _instrumented(handler):
+    """Латентность, статус и число SQL-операторов запроса для /metrics."""
+
+    @functools.wraps(handler)
+    def wrapper(self):
+        self._status = None
+        path = urlparse(self.path).path
+        with metrics.track_request(self.command) as request:
+            request.route = path if path in ROUTES else 'unmatched'
+            try:
+                handler(self)
+            finally:
+                request.status = self._status
+
+    return wrapper
 
 
 class PetRequestHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        parsed_path = urlparse(self.path)
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
 
-        # CORS headers
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
+    def _send_cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Accept, Content-Type, If-None-Match')
+        self.send_header('Access-Control-Expose-Headers', 'ETag')
+
+    def _send_json(self, response, code=200, etag=None):
+        """JSON или MessagePack по Accept; кортеж - значения PET_PAYLOAD."""
+        accept = self.headers.get('Accept')
+        if isinstance(response, tuple):
+            body, content_type = PET_PAYLOAD.render(response, accept)
+        else:
+            body, content_type = serializer.render(response, accept)
+        # CORS headers
+        self.send_response(code)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept')
+        if etag:
+            self.send_header('ETag', etag)
+        self._send_cors_headers()
+        self._send_connection_header()
         self.end_headers()
+        self.wfile.write(body)
 
+    def _send_not_modified(self, etag):
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self._send_cors_headers()
+        self._send_connection_header()
+        self.end_headers()
+
+    def _send_connection_header(self):
+        # При остановке сервера keep-alive соединения закрываются после ответа.
+        draining = getattr(self.server, 'draining', None)
+        if draining is not None and draining.is_set():
+            self.send_header('Connection', 'close')
+
+    def _send_text(self, text, content_type):
+        body = text.encode()
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self._send_connection_header()
+        self.end_headers()
+        self.wfile.write(body)
+
+    @_instrumented
+    def do_GET(self):
+        parsed_path = urlparse(self.path)
+
+        etag = None
         if parsed_path.path == '/':
             response = {'message': 'Digital Pet API', 'status': 'running'}
         elif parsed_path.path == '/pet':
             response = self.get_pet()
+            if isinstance(response, tuple):
+                etag = state_etag(*response[:7])
+                if_none_match = self.headers.get('If-None-Match')
+                matched = etag_matches(if_none_match, etag)
+                conditional_stats.record(if_none_match, matched)
+                if matched:
+                    self._send_not_modified(etag)
+                    return
+        elif parsed_path.path == '/pets/attention':
+            response = self.pets_needing_attention(parse_qs(parsed_path.query))
+        elif parsed_path.path == '/stats':
+            response = {
+                'conditional': conditional_stats.snapshot(),
+                'group_commit': group_writer.stats(),
+                'sqlite': sqlite_tuning.lock_stats.snapshot(),
+                'memory': memory_store.stats() if memory_store is not None else None,
+            }
+        elif parsed_path.path == '/metrics':
+            self._send_text(metrics.render(), metrics.CONTENT_TYPE)
+            return
         else:
             response = {'error': 'Not found'}
 
-        self.wfile.write(json.dumps(response).encode())
+        self._send_json(response, etag=etag)
 
+    @_instrumented
     def do_POST(self):
         parsed_path = urlparse(self.path)
         content_length = int(self.headers.get('Content-Length', 0))
@@ -163,12 +442,6 @@ class PetRequestHandler(BaseHTTPRequestHandler):
             except Exception:
                 data = {}
 
-        # CORS headers
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-
         if parsed_path.path == '/pet':
             try:
                 response = self.create_pet(data.get('name', 'Pet'))
@@ -185,206 +458,421 @@ class PetRequestHandler(BaseHTTPRequestHandler):
         else:
             response = {'error': 'Not found'}
 
-        self.wfile.write(json.dumps(response).encode())
+        self._send_json(response)
 
+    @_instrumented
     def do_OPTIONS(self):
         self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self._send_cors_headers()
+        self.send_header('Content-Length', '0')
+        self._send_connection_header()
         self.end_headers()
 
     def get_pet(self):
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        pet_id = _get_latest_pet_id(cursor)
-        if pet_id is not None:
-            update_pet_stats(pet_id)
-
-        cursor.execute('SELECT * FROM pet ORDER BY id DESC LIMIT 1')
-        row = cursor.fetchone()
-        conn.close()
-
+        row = run_pet_action()
         if row:
+            return _pet_payload(row)
+        return {'error': 'No pet found', **TICK_RULES.initial, 'status': 'healthy'}
+
+    def pets_needing_attention(self, query):
+        """Питомцы, которые станут критичными / умрут в ближайшие within секунд (по индексу)."""
+        kind = query.get('kind', ['dead'])[0]
+        column = ATTENTION_COLUMNS.get(kind)
+        if column is None:
+            return {'error': f'Unknown kind: {kind}'}
+        try:
+            within = int(query.get('within', ['86400'])[0])
+            limit = max(1, min(1000, int(query.get('limit', ['100'])[0])))
+        except ValueError:
+            return {'error': 'within and limit must be integers'}
+        now = datetime.now()
+        if memory_store is not None:
             return {
-                'id': row['id'],
-                'name': row['name'],
-                'hunger': int(row['hunger']),
-                'energy': int(row['energy']),
-                'mood': int(row['mood']),
-                'health': int(row['health']),
-                'status': row['status'],
-                'created_at': row['created_at'],
+                'kind': kind,
+                'now': now.isoformat(timespec='seconds'),
+                'pets': memory_store.attention(column, now.timestamp(), now.timestamp() + within, limit),
             }
+        with get_read_pool().unit_of_work() as conn:
+            rows = conn.execute(
+                f"SELECT id, name, {column} FROM pet WHERE {column} > ? AND {column} <= ? "
+                f"AND status != 'dead' ORDER BY {column} LIMIT ?",
+                (now.isoformat(timespec='seconds'), (now + timedelta(seconds=within)).isoformat(timespec='seconds'),
+                 limit),
+            ).fetchall()
         return {
-            'error': 'No pet found',
-            'hunger': 50,
-            'energy': 100,
-            'mood': 50,
-            'health': 100,
-            'status': 'healthy',
+            'kind': kind,
+            'now': now.isoformat(timespec='seconds'),
+            'pets': [{'id': row['id'], 'name': row['name'], 'at': row[column]} for row in rows],
         }
 
     def create_pet(self, name):
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        now = datetime.now().isoformat()
-        cursor.execute(
-            """
-            INSERT INTO pet (name, hunger, energy, mood, health, status, created_at, last_update)
-            VALUES (?, 50, 100, 50, 100, 'healthy', ?, ?)
-            """,
-            (name, now, now),
-        )
-        conn.commit()
-        pet_id = cursor.lastrowid
-        conn.close()
-        return {
-            'id': pet_id,
-            'name': name,
-            'hunger': 50,
-            'energy': 100,
-            'mood': 50,
-            'health': 100,
-            'status': 'healthy',
-        }
-
-    def feed_pet(self, amount=30):
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        pet_id = _get_latest_pet_id(cursor)
+        created = datetime.now()
+        now = created.isoformat()
+        initial = TICK_RULES.initial
+        critical_at, dead_at = tick_projection(*initial.values(), 'healthy', created, DECAY_INTERVAL_SECONDS)
+
+        def insert(conn):
+            return conn.execute(
+                """
+                INSERT INTO pet (name, hunger, energy, mood, health, status, created_at, last_update,
+                                 critical_at, dead_at)
+                VALUES (:name, :hunger, :energy, :mood, :health, 'healthy', :now, :now, :critical_at, :dead_at)
+                """,
+                dict(initial, name=name, now=now, critical_at=critical_at, dead_at=dead_at),
+            ).lastrowid
+
+        def direct():
+            with get_pool().unit_of_work() as conn:
+                return insert(conn)
+
+        if memory_store is not None:
+            pet_id = memory_store.create(name)['id']
+        else:
+            pet_id = group_writer.run(insert) if group_writer.enabled else retry_busy(direct)
+        return _pet_payload(dict(initial, id=pet_id, name=name, status='healthy', created_at=now))
 
-        if pet_id is None:
-            conn.close()
+    def _action(self, action, **params):
+        row = run_pet_action(action, params=params)
+        if row is None:
             return {'error': 'No pet found'}
+        return _pet_payload(row)
 
-        update_pet_stats(pet_id)
-        cursor.execute('SELECT status FROM pet WHERE id = ?', (pet_id,))
-        row = cursor.fetchone()
-        if row and row[0] == 'dead':
-            conn.close()
-            return self.get_pet()
-
+    def feed_pet(self, amount=30):
         try:
             safe_amount = int(amount)
         except (TypeError, ValueError):
             safe_amount = 30
         safe_amount = max(1, min(100, safe_amount))
-
-        cursor.execute(
-            """
-            UPDATE pet
-            SET hunger = MAX(0, hunger - ?), last_update = ?
-            WHERE id = ?
-            """,
-            (safe_amount, datetime.now().isoformat(), pet_id),
-        )
-        conn.commit()
-        conn.close()
-        return self.get_pet()
+        return self._action('feed', amount=safe_amount)
 
     def play_pet(self):
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        pet_id = _get_latest_pet_id(cursor)
-
-        if pet_id is None:
-            conn.close()
-            return {'error': 'No pet found'}
-
-        update_pet_stats(pet_id)
-        cursor.execute('SELECT status FROM pet WHERE id = ?', (pet_id,))
-        row = cursor.fetchone()
-        if row and row[0] == 'dead':
-            conn.close()
-            return self.get_pet()
-
-        cursor.execute(
-            """
-            UPDATE pet
-            SET energy = MAX(0, energy - 20),
-                mood = MIN(100, mood + 20),
-                hunger = MIN(100, hunger + 10),
-                last_update = ?
-            WHERE id = ?
-            """,
-            (datetime.now().isoformat(), pet_id),
-        )
-        conn.commit()
-        conn.close()
-        return self.get_pet()
+        return self._action('play')
 
     def sleep_pet(self):
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        pet_id = _get_latest_pet_id(cursor)
-
-        if pet_id is None:
-            conn.close()
-            return {'error': 'No pet found'}
-
-        update_pet_stats(pet_id)
-        cursor.execute('SELECT status FROM pet WHERE id = ?', (pet_id,))
-        row = cursor.fetchone()
-        if row and row[0] == 'dead':
-            conn.close()
-            return self.get_pet()
-
-        cursor.execute(
-            """
-            UPDATE pet
-            SET energy = MIN(100, energy + 50),
-                hunger = MIN(100, hunger + 8),
-                last_update = ?
-            WHERE id = ?
-            """,
-            (datetime.now().isoformat(), pet_id),
-        )
-        conn.commit()
-        conn.close()
-        return self.get_pet()
+        return self._action('sleep')
 
     def heal_pet(self):
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        pet_id = _get_latest_pet_id(cursor)
-
-        if pet_id is None:
-            conn.close()
-            return {'error': 'No pet found'}
-
-        update_pet_stats(pet_id)
-        cursor.execute('SELECT status FROM pet WHERE id = ?', (pet_id,))
-        row = cursor.fetchone()
-        if row and row[0] == 'dead':
-            conn.close()
-            return self.get_pet()
-
-        cursor.execute(
-            """
-            UPDATE pet
-            SET health = MIN(100, health + 30), last_update = ?
-            WHERE id = ?
-            """,
-            (datetime.now().isoformat(), pet_id),
-        )
-        conn.commit()
-        conn.close()
-        return self.get_pet()
+        return self._action('heal')
 
     def log_message(self, format, *args):
         # Suppress default logging
         pass
 
 
-if __name__ == '__main__':
-    init_db()
-    server = HTTPServer(('0.0.0.0', 8000), PetRequestHandler)
-    print('✓ Digital Pet Backend Server running on http://localhost:8000')
-    print('✓ Endpoints: GET /pet, POST /pet, POST /pet/feed, POST /pet/play, POST /pet/sleep, POST /pet/heal')
+class KeepAlivePetRequestHandler(PetRequestHandler):
+    """HTTP/1.1 с keep-alive; простаивающее соединение закрывается по таймауту.
+
+    В PooledHTTPServer между запросами соединение не держит рабочий поток:
+    handle() обрабатывает готовые запросы и выставляет idle, сервер ставит
+    сокет в selector (park) и возвращает в очередь, когда придут данные.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    # Заголовки и тело уходят отдельными write(); без TCP_NODELAY keep-alive
+    # упирается в Nagle + delayed ACK (~40 мс на запрос).
+    disable_nagle_algorithm = True
+    idle = False
+
+    def handle(self):
+        if not hasattr(self.server, 'park'):
+            return super().handle()
+        self.idle = False
+        self.handle_one_request()
+        # Запросы, уже прочитанные в буфер rfile (pipelining), selector не увидит
+        while not self.close_connection and self._buffered():
+            self.handle_one_request()
+        self.idle = not self.close_connection
+
+    def _buffered(self):
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def resume(self):
+        """Следующий запрос соединения, вернувшегося из selector."""
+        try:
+            self.handle()
+        finally:
+            self.finish()
+
+    def finish(self):
+        # rfile/wfile простаивающего соединения нужны следующему запросу
+        if not self.idle:
+            super().finish()
+
+
+class ThreadLocalPool(ConnectionPool):
+    """У каждого рабочего потока своё постоянное sqlite3-соединение."""
+
+    def __init__(self, database, read_only=False):
+        super().__init__(database, size=None, read_only=read_only)
+        self._local = threading.local()
+        self._all = []
+
+    def acquire(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            with self._lock:
+                self.connects += 1
+                self._all.append(conn)
+        return conn
+
+    def release(self, conn):
+        pass
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer с фиксированным пулом рабочих потоков.
+
+    Принятые соединения ставятся в ограниченную очередь; если она полна,
+    клиент сразу получает 503. Keep-alive соединения между запросами ждут
+    в selector отдельного потока, а не в рабочих: простаивающие клиенты не
+    занимают пул, их не больше max_idle, и после KEEPALIVE_TIMEOUT без
+    запросов они закрываются. drain() перестаёт принимать новые запросы,
+    дожидается обработки очереди и останавливает потоки.
+    """
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 max_idle=DEFAULT_MAX_IDLE):
+        self.request_queue_size = queue_size
+        super().__init__(server_address, handler_class)
+        self.draining = threading.Event()
+        self.rejected = 0
+        self.idle_closed = 0
+        self.max_idle = max_idle
+        self._requests = queue.Queue(maxsize=queue_size)
+        # handler -> срок простоя; трогает только поток _watch_idle
+        self._idle = OrderedDict()
+        self._parking = []
+        self._parking_lock = threading.Lock()
+        self._parking_closed = False
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._idle_thread = threading.Thread(target=self._watch_idle, name='pet-keepalive', daemon=True)
+        self._idle_thread.start()
+        self._workers = [
+            threading.Thread(target=self._work, name=f'pet-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def process_request(self, request, client_address):
+        self._enqueue(request, client_address, None)
+
+    def _enqueue(self, request, client_address, handler):
+        try:
+            self._requests.put_nowait((request, client_address, handler))
+        except queue.Full:
+            self.rejected += 1
+            if handler is not None:
+                self._release(handler)
+            self._reject(request)
+
+    def _reject(self, request):
+        body = json.dumps({'error': 'Server busy'}).encode()
+        try:
+            request.sendall(
+                b'HTTP/1.1 503 Service Unavailable\r\n'
+                b'Content-Type: application/json\r\n'
+                b'Access-Control-Allow-Origin: *\r\n'
+                b'Retry-After: 1\r\n'
+                b'Connection: close\r\n'
+                + f'Content-Length: {len(body)}\r\n\r\n'.encode()
+                + body
+            )
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address, handler = item
+            idle = False
+            try:
+                if handler is None:
+                    handler = self.RequestHandlerClass(request, client_address, self)
+                else:
+                    handler.resume()
+                idle = getattr(handler, 'idle', False)
+            except Exception:
+                self.handle_error(request, client_address)
+            if not idle:
+                self.shutdown_request(request)
+            elif self.draining.is_set():
+                self._close_idle(handler)
+            else:
+                # Последнее действие с handler в этом потоке: дальше он в selector
+                self.park(handler)
+
+    # --- простаивающие keep-alive соединения ---
+
+    def park(self, handler):
+        """Ставит соединение в selector до следующего запроса."""
+        with self._parking_lock:
+            parked = not self._parking_closed
+            if parked:
+                self._parking.append(handler)
+        if not parked:
+            self._close_idle(handler)
+            return
+        try:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            pass  # поток selector уже разбужен или остановлен
+
+    def _release(self, handler):
+        handler.idle = False
+        try:
+            handler.finish()
+        except OSError:
+            pass
+
+    def _close_idle(self, handler):
+        self._release(handler)
+        self.shutdown_request(handler.request)
+
+    def _unwatch(self, handler):
+        del self._idle[handler]
+        self._selector.unregister(handler.request)
+
+    def _watch_idle(self):
+        while not self.draining.is_set():
+            timeout = None
+            if self._idle:
+                timeout = max(0.0, next(iter(self._idle.values())) - time.monotonic())
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._wakeup_r:
+                    self._wakeup_r.recv(4096)
+                    continue
+                handler = key.data
+                self._unwatch(handler)
+                self._enqueue(handler.request, handler.client_address, handler)
+            with self._parking_lock:
+                parking, self._parking = self._parking, []
+            deadline = time.monotonic() + KEEPALIVE_TIMEOUT
+            for handler in parking:
+                if len(self._idle) >= self.max_idle:
+                    oldest = next(iter(self._idle))
+                    self._unwatch(oldest)
+                    self._close_idle(oldest)
+                    self.idle_closed += 1
+                self._idle[handler] = deadline
+                self._selector.register(handler.request, selectors.EVENT_READ, handler)
+            now = time.monotonic()
+            while self._idle and next(iter(self._idle.values())) <= now:
+                handler = next(iter(self._idle))
+                self._unwatch(handler)
+                self._close_idle(handler)
+                self.idle_closed += 1
+        with self._parking_lock:
+            self._parking_closed = True
+            parking, self._parking = self._parking, []
+        for handler in list(self._idle) + parking:
+            self._close_idle(handler)
+        self._idle.clear()
+        self._selector.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        self.draining.set()
+        self.socket.close()
+        try:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            pass
+        deadline = time.monotonic() + timeout
+        self._idle_thread.join(max(0, deadline - time.monotonic()))
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join(max(0, deadline - time.monotonic()))
+        return not any(worker.is_alive() for worker in [self._idle_thread, *self._workers])
+
+
+def serve(mode='simple', host='0.0.0.0', port=8000, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+          storage=STORAGE):
+    global _pool, _read_pool, memory_store
+    if storage == 'memory':
+        from memory_store import MemoryPetStore
+        memory_store = MemoryPetStore(ACTION_FUNCS, DECAY_INTERVAL_SECONDS).open()
+    else:
+        init_db()
+    if mode == 'threaded':
+        _pool = ThreadLocalPool(DATABASE)
+        _read_pool = ThreadLocalPool(DATABASE, read_only=True)
+        server = PooledHTTPServer((host, port), KeepAlivePetRequestHandler, workers, queue_size)
+    else:
+        server = HTTPServer((host, port), PetRequestHandler)
+
+    # PET_SWEEPER_INTERVAL > 0: фоновый массовый распад всех питомцев (нужен numpy)
+    sweeper = None
+    if float(os.environ.get('PET_SWEEPER_INTERVAL', '0')) > 0 and memory_store is None:
+        from sweeper import DecaySweeper
+        sweeper = DecaySweeper(DATABASE, 'simple')
+        sweeper.start()
+    # PET_BACKUP_INTERVAL > 0: горячие снимки БД в PET_BACKUP_DIR (backup.py)
+    backups = None
+    if float(os.environ.get('PET_BACKUP_INTERVAL', '0')) > 0 and memory_store is None:
+        from backup import BackupScheduler
+        backups = BackupScheduler([DATABASE])
+        backups.start()
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f'✓ Digital Pet Backend Server running on http://localhost:{port} ({mode}, {storage})')
+    print('✓ Endpoints: GET /pet, POST /pet, POST /pet/feed, POST /pet/play, POST /pet/sleep, POST /pet/heal, '
+          'GET /pets/attention')
     try:
         server.serve_forever()
     except KeyboardInterrupt:
-        print('\n✓ Server stopped')
+        pass
+    if isinstance(server, PooledHTTPServer):
+        drained = server.drain()
+        print(f'✓ Drained {"cleanly" if drained else "with timeout"}, rejected {server.rejected} requests')
+    server.server_close()
+    if sweeper:
+        sweeper.stop()
+    if backups:
+        backups.stop()
+    if memory_store is not None:
+        memory_store.close()
+    group_writer.stop()
+    if _writer_pool is not None:
+        _writer_pool.close()
+    get_read_pool().close()
+    get_pool().close()
+    print('\n✓ Server stopped')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Digital Pet backend without FastAPI')
+    parser.add_argument('--mode', choices=('simple', 'threaded'), default=os.environ.get('PET_SERVER_MODE', 'simple'))
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument('--storage', choices=('sqlite', 'memory'), default=STORAGE)
+    args = parser.parse_args()
+    serve(args.mode, args.host, args.port, args.workers, args.queue_size, args.storage)
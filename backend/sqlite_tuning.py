@@ -0,0 +1,125 @@
+"""
+Общие настройки SQLite для database.py (SQLAlchemy) и simple_server.py.
+
+PET_SQLITE_PROFILE:
+  "tuned"   - WAL, synchronous=NORMAL, большой page cache, mmap, temp_store
+              в памяти и busy_timeout (по умолчанию);
+  "default" - как раньше, без PRAGMA.
+
+Чтения можно отправлять в отдельные соединения mode=ro (PET_SQLITE_READ_SPLIT):
+в WAL они не блокируют писателя и не блокируются им. retry_busy() повторяет
+операцию с экспоненциальной паузой и джиттером, если SQLite всё же ответил
+"database is locked" (например, при повышении отложенной транзакции до записи,
+где busy_timeout не помогает).
+
+durable=True (соединение писателя group commit) поверх профиля ставит
+synchronous=FULL: каждый COMMIT делает fsync, и подтверждённая запись
+переживает сбой ОС или питания, а не только падение процесса.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+
+STORAGE_PROFILE = os.environ.get("PET_SQLITE_PROFILE", "tuned")
+READ_SPLIT = os.environ.get("PET_SQLITE_READ_SPLIT", "1") == "1"
+BUSY_RETRIES = 5
+BUSY_BASE_DELAY = 0.005
+
+PROFILES = {
+    "default": {},
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,  # 64 МиБ
+        "mmap_size": 268435456,  # 256 МиБ
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+# Соединение, которое подтверждает запись только после fsync
+DURABLE_PRAGMAS = {"synchronous": "FULL"}
+
+# Эти PRAGMA пишут в файл и недоступны соединениям mode=ro
+_WRITE_PRAGMAS = {"journal_mode"}
+
+
+class LockStats:
+    def __init__(self):
+        self.lock_errors = 0
+        self.retries = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, retried, failed):
+        with self._lock:
+            self.lock_errors += 1
+            self.retries += retried
+            self.failures += failed
+
+    def snapshot(self):
+        with self._lock:
+            return {"lock_errors": self.lock_errors, "retries": self.retries, "failures": self.failures}
+
+
+lock_stats = LockStats()
+
+
+def profile_pragmas(profile=None):
+    return PROFILES[profile or STORAGE_PROFILE]
+
+
+def apply_pragmas(dbapi_connection, profile=None, read_only=False, durable=False):
+    """Применяет PRAGMA профиля к DB-API соединению (sqlite3 или адаптер aiosqlite)."""
+    pragmas = dict(profile_pragmas(profile))
+    if durable:
+        pragmas.update(DURABLE_PRAGMAS)
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            if read_only and name in _WRITE_PRAGMAS:
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = 1")
+    finally:
+        cursor.close()
+
+
+def read_only_uri(path):
+    return f"file:{os.path.abspath(path)}?mode=ro"
+
+
+def connect(path, read_only=False, profile=None, durable=False, **kwargs):
+    """sqlite3.connect с PRAGMA профиля; read_only открывает файл как mode=ro."""
+    if read_only:
+        conn = sqlite3.connect(read_only_uri(path), uri=True, **kwargs)
+    else:
+        conn = sqlite3.connect(path, **kwargs)
+    apply_pragmas(conn, profile, read_only, durable)
+    return conn
+
+
+def is_busy_error(exc):
+    orig = getattr(exc, "orig", exc)
+    if not isinstance(orig, sqlite3.OperationalError):
+        return False
+    message = str(orig).lower()
+    return "locked" in message or "busy" in message
+
+
+def retry_busy(fn, attempts=BUSY_RETRIES, base_delay=BUSY_BASE_DELAY):
+    """Вызывает fn(), повторяя при "database is locked" с джиттером."""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as exc:
+            if not is_busy_error(exc):
+                raise
+            last = attempt == attempts - 1
+            lock_stats.record(retried=0 if last else 1, failed=1 if last else 0)
+            if last:
+                raise
+            time.sleep(base_delay * (2 ** attempt) * random.uniform(0.5, 1.5))
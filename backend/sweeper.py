@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""
+Фоновый массовый распад для всех питомцев (NumPy).
+
+Обычно распад ленивый и считается по одному питомцу при запросе. Для
+дашбордов, уведомлений "питомцу грустно" и уборки мёртвых питомцев
+sweeper проходит таблицу кусками по PET_SWEEPER_CHUNK строк (keyset по id),
+считает распад и переходы статусов векторно и пишет результат одним
+executemany на кусок. UPDATE не трогает строку, если её last_update
+изменился после чтения (действие успело раньше).
+
+Схемы:
+  main   - таблица pets из models.py: линейный распад rules.PET_RULES,
+           статус Happy/Okay/Sad по среднему шкал;
+  simple - таблица pet из simple_server.py: тики rules.TICK_RULES
+           со случайными шагами 1-2 (как TICK_RULES.catch_up), здоровье и
+           статус dead. last_update сдвигается на целое число тиков,
+           чтобы частые проходы не теряли остаток тика. Заодно
+           пересчитывается прогноз critical_at/dead_at (projection.py);
+           в main линейный прогноз от распада не меняется.
+
+    python sweeper.py --schema main --db ./digital_pet.db [--interval 60] [--once]
+
+Из приложений включается через PET_SWEEPER_INTERVAL (секунды, 0 - выключен).
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import metrics
+import sqlite_tuning
+from decay import STAT_MAX, STAT_MIN
+from projection import EXPECTED_STEP
+from rules import PET_RULES, TICK_RULES
+
+SWEEPER_INTERVAL = float(os.environ.get("PET_SWEEPER_INTERVAL", "0"))
+SWEEPER_CHUNK = int(os.environ.get("PET_SWEEPER_CHUNK", "50000"))
+
+SIMPLE_DECAY_INTERVAL_SECONDS = TICK_RULES.unit_seconds
+SAD = PET_RULES.status_labels.index("Sad")
+
+SWEEP_PETS = metrics.Counter("pet_sweeper_pets_total", "Pets processed by the decay sweeper.", ("schema",))
+SWEEP_UPDATED = metrics.Counter("pet_sweeper_updated_total", "Pet rows rewritten by the decay sweeper.", ("schema",))
+SWEEP_TRANSITIONS = metrics.Counter(
+    "pet_sweeper_transitions_total", "Status transitions found by the decay sweeper.", ("schema", "status"))
+SWEEP_DURATION = metrics.Gauge("pet_sweeper_last_duration_seconds", "Duration of the last full sweep.", ("schema",))
+SWEEP_PROGRESS = metrics.Gauge("pet_sweeper_last_id", "Last pet id processed in the current sweep.", ("schema",))
+
+
+class DecaySweeper:
+    """`on_transition(status, ids)` вызывается для питомцев, перешедших в Sad или dead."""
+
+    def __init__(self, database, schema="main", chunk=SWEEPER_CHUNK, interval=SWEEPER_INTERVAL,
+                 on_transition=None, seed=None):
+        if schema not in ("main", "simple"):
+            raise ValueError(f"unknown schema: {schema}")
+        self.database = database
+        self.schema = schema
+        self.chunk = chunk
+        self.interval = interval
+        self.on_transition = on_transition
+        self.rng = np.random.default_rng(seed)
+        self.sweeps = 0
+        self.last_sweep = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- распад ---
+
+    def _main_chunk(self, rows, now):
+        ids, hunger, mood, energy, elapsed, stamps = zip(*rows)
+        minutes = np.maximum(np.asarray(elapsed, dtype=np.float64), 0.0) / PET_RULES.unit_seconds
+        old = {stat: np.asarray(values, dtype=np.float64) for stat, values in
+               zip(("hunger", "mood", "energy"), (hunger, mood, energy))}
+        new = PET_RULES.decay_batch(old, minutes)
+        changed = (minutes > 0) & np.any([new[stat] != old[stat] for stat in old], axis=0)
+        sad = (PET_RULES.status_batch(old) != SAD) & (PET_RULES.status_batch(new) == SAD)
+        transitions = {"Sad": np.asarray(ids)[sad]}
+        now_text = now.strftime("%Y-%m-%d %H:%M:%S.%f")
+        index = np.flatnonzero(changed)
+        params = [
+            (float(new["hunger"][i]), float(new["mood"][i]), float(new["energy"][i]), now_text, ids[i], stamps[i])
+            for i in index.tolist()
+        ]
+        return params, transitions
+
+    def _simple_chunk(self, rows, now):
+        ids, hunger, energy, mood, health, dead, elapsed, stamps = zip(*rows)
+        ticks = np.maximum(np.floor(np.asarray(elapsed, dtype=np.float64) / SIMPLE_DECAY_INTERVAL_SECONDS), 0)
+        ticks = ticks.astype(np.int64)
+        old = {stat: np.asarray(values, dtype=np.int64) for stat, values in
+               zip(("hunger", "energy", "mood", "health"), (hunger, energy, mood, health))}
+        active = (ticks > 0) & ~np.asarray(dead, dtype=bool) & (old["health"] > 0)
+        ticks = np.where(active, ticks, 0)
+
+        new = TICK_RULES.decay_batch(old, ticks, self.rng)
+        hunger, energy, mood, new_health = new["hunger"], new["energy"], new["mood"], new["health"]
+        died = active & (new_health <= 0)
+        transitions = {"dead": np.asarray(ids)[died]}
+
+        advance = ticks * SIMPLE_DECAY_INTERVAL_SECONDS
+        # Прогноз как projection.tick_projection, смещения от старого last_update в секундах
+        margin = np.maximum(np.minimum(np.minimum(STAT_MAX - hunger, energy - STAT_MIN), mood - STAT_MIN), 0)
+        to_critical = np.where(died, 0, np.ceil(margin / EXPECTED_STEP).astype(np.int64))
+        critical_at = advance + to_critical * SIMPLE_DECAY_INTERVAL_SECONDS
+        dead_at = critical_at + new_health * SIMPLE_DECAY_INTERVAL_SECONDS
+        index = np.flatnonzero(active)
+        params = [
+            (int(hunger[i]), int(energy[i]), int(mood[i]), int(new_health[i]),
+             "dead" if new_health[i] <= 0 else "healthy", int(advance[i]), int(critical_at[i]), int(dead_at[i]),
+             ids[i], stamps[i])
+            for i in index.tolist()
+        ]
+        return params, transitions
+
+    # --- проход ---
+
+    def _queries(self):
+        if self.schema == "main":
+            select = (
+                "SELECT id, hunger, mood, energy, (julianday(:now) - julianday(last_update)) * 86400.0, last_update "
+                "FROM pets WHERE id > :after AND last_update IS NOT NULL ORDER BY id LIMIT :limit"
+            )
+            update = (
+                "UPDATE pets SET hunger = ?, mood = ?, energy = ?, last_update = ? "
+                "WHERE id = ? AND last_update = ?"
+            )
+        else:
+            select = (
+                "SELECT id, hunger, energy, mood, health, status = 'dead', "
+                "(julianday(:now) - julianday(last_update)) * 86400.0, last_update "
+                "FROM pet WHERE id > :after AND last_update IS NOT NULL ORDER BY id LIMIT :limit"
+            )
+            update = (
+                "UPDATE pet SET hunger = ?, energy = ?, mood = ?, health = ?, status = ?, "
+                "last_update = strftime('%Y-%m-%dT%H:%M:%f', julianday(last_update) + ? / 86400.0), "
+                "critical_at = strftime('%Y-%m-%dT%H:%M:%S', julianday(last_update) + ? / 86400.0), "
+                "dead_at = strftime('%Y-%m-%dT%H:%M:%S', julianday(last_update) + ? / 86400.0) "
+                "WHERE id = ? AND last_update = ?"
+            )
+        return select, update
+
+    def sweep(self):
+        """Один проход по всей таблице; возвращает статистику прохода."""
+        started = time.perf_counter()
+        # main.py хранит UTC, simple_server - локальное время
+        now = datetime.utcnow() if self.schema == "main" else datetime.now()
+        now_param = now.strftime("%Y-%m-%d %H:%M:%S.%f") if self.schema == "main" else now.isoformat()
+        select, update = self._queries()
+        process = self._main_chunk if self.schema == "main" else self._simple_chunk
+        totals = {"pets": 0, "updated": 0, "transitions": {}}
+        conn = sqlite_tuning.connect(self.database, isolation_level=None)
+        try:
+            after = 0
+            while not self._stop.is_set():
+                rows = conn.execute(select, {"now": now_param, "after": after, "limit": self.chunk}).fetchall()
+                if not rows:
+                    break
+                params, transitions = process(rows, now)
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    updated = conn.executemany(update, params).rowcount if params else 0
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                after = rows[-1][0]
+                totals["pets"] += len(rows)
+                totals["updated"] += updated
+                SWEEP_PETS.labels(self.schema).inc(len(rows))
+                SWEEP_UPDATED.labels(self.schema).inc(updated)
+                SWEEP_PROGRESS.labels(self.schema).set(after)
+                for status, ids in transitions.items():
+                    if len(ids):
+                        totals["transitions"][status] = totals["transitions"].get(status, 0) + len(ids)
+                        SWEEP_TRANSITIONS.labels(self.schema, status).inc(len(ids))
+                        if self.on_transition is not None:
+                            self.on_transition(status, ids.tolist())
+        finally:
+            conn.close()
+        elapsed = time.perf_counter() - started
+        SWEEP_DURATION.labels(self.schema).set(elapsed)
+        totals["seconds"] = round(elapsed, 3)
+        totals["pets_per_second"] = round(totals["pets"] / elapsed) if elapsed else 0
+        self.sweeps += 1
+        self.last_sweep = totals
+        return totals
+
+    # --- фон ---
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as exc:
+                print(f"✗ decay sweep failed: {exc}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pet-decay-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {"schema": self.schema, "interval": self.interval, "sweeps": self.sweeps, "last": self.last_sweep}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk decay sweeper for Digital Pet databases")
+    parser.add_argument("--schema", choices=("main", "simple"), default="main")
+    parser.add_argument("--db", default="./digital_pet.db")
+    parser.add_argument("--chunk", type=int, default=SWEEPER_CHUNK)
+    parser.add_argument("--interval", type=float, default=SWEEPER_INTERVAL or 60)
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+    sweeper = DecaySweeper(args.db, args.schema, args.chunk, args.interval)
+    while True:
+        print(sweeper.sweep())
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули backend импортируются плоско (как их импортируют серверы из backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
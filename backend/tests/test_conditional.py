@@ -0,0 +1,39 @@
+import pytest
+
+from conditional import ConditionalStats, etag_matches, state_etag
+
+
+def test_state_etag_quantizes_floats():
+    assert state_etag("Rex", 50.04, 10, digits=1) == state_etag("Rex", 49.96, 10, digits=1)
+    assert state_etag("Rex", 50.04, digits=1) != state_etag("Rex", 50.16, digits=1)
+    assert state_etag("Rex", 50.4) == state_etag("Rex", 49.6)
+    assert state_etag(1, "Rex", 50.0) != state_etag(2, "Rex", 50.0)
+
+
+def test_state_etag_is_weak():
+    assert state_etag("Rex").startswith('W/"')
+
+
+@pytest.mark.parametrize("if_none_match, matched", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    ("{etag}", True),
+    ("{strong}", True),
+    ('W/"other", {etag}', True),
+    ('"other"', False),
+])
+def test_etag_matches(if_none_match, matched):
+    etag = state_etag("Rex", 10)
+    header = if_none_match.format(etag=etag, strong=etag[2:]) if if_none_match else if_none_match
+    assert etag_matches(header, etag) is matched
+
+
+def test_conditional_stats():
+    stats = ConditionalStats()
+    stats.record(None, False)
+    stats.record('W/"x"', False)
+    stats.record('W/"x"', True)
+    snapshot = stats.snapshot()
+    assert (snapshot["requests"], snapshot["conditional"], snapshot["not_modified"]) == (3, 2, 1)
+    assert snapshot["not_modified_rate"] == pytest.approx(1 / 3, abs=1e-4)
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from decay import pet_rng, sample_steps
+
+
+@pytest.mark.parametrize("ticks, distance", [(0, 10), (-3, 10), (5, 0), (5, -2)])
+def test_sample_steps_nothing_to_do(ticks, distance):
+    assert sample_steps(ticks, distance) == 0
+
+
+@pytest.mark.parametrize("ticks, distance", [(10, 10), (50, 7), (10_000, 100)])
+def test_sample_steps_clamps_at_distance(ticks, distance):
+    # Каждый шаг не меньше 1: за ticks >= distance шкала точно у границы
+    assert sample_steps(ticks, distance) == distance
+
+
+def test_sample_steps_bounds():
+    rng = random.Random(1)
+    for _ in range(2000):
+        ticks = rng.randint(1, 99)
+        distance = rng.randint(ticks + 1, 100)
+        steps = sample_steps(ticks, distance, rng)
+        assert ticks <= steps <= min(2 * ticks, distance)
+
+
+def test_sample_steps_matches_loop_distribution():
+    # Сумма ticks шагов {1, 2}: среднее 1.5 * ticks, дисперсия ticks / 4
+    rng = random.Random(7)
+    ticks, samples = 40, 20_000
+    values = [sample_steps(ticks, 100, rng) for _ in range(samples)]
+    mean = sum(values) / samples
+    variance = sum((value - mean) ** 2 for value in values) / samples
+    assert mean == pytest.approx(1.5 * ticks, abs=0.05)
+    assert variance == pytest.approx(ticks / 4, rel=0.05)
+
+
+def test_pet_rng_is_reproducible_with_seed():
+    first = pet_rng(3, "2024-01-01T00:00:00", seed="s")
+    second = pet_rng(3, "2024-01-01T00:00:00", seed="s")
+    other = pet_rng(4, "2024-01-01T00:00:00", seed="s")
+    draws = [first.getrandbits(32) for _ in range(5)]
+    assert draws == [second.getrandbits(32) for _ in range(5)]
+    assert draws != [other.getrandbits(32) for _ in range(5)]
+
+
+def test_pet_rng_without_seed_is_shared_random(monkeypatch):
+    monkeypatch.setattr("decay.DECAY_SEED", None)
+    assert pet_rng(1, "x") is random
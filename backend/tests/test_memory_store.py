@@ -0,0 +1,106 @@
+import os
+import random
+
+import pytest
+
+from memory_store import _UPDATE, KIND_UPDATE, MemoryPetStore
+from rules import TICK_RULES
+
+
+def _store(directory, **kwargs):
+    return MemoryPetStore(TICK_RULES.effect_funcs, TICK_RULES.unit_seconds, directory=str(directory),
+                          snapshot_seconds=3600, **kwargs).open()
+
+
+def _crash(store):
+    """Останавливает фоновый поток без снимка, как при падении процесса."""
+    store._stop.set()
+    store._thread.join()
+    store._wal.close()
+
+
+def _rows(store):
+    return [store._row(i) for i in range(len(store))]
+
+
+@pytest.fixture
+def populated(tmp_path):
+    store = _store(tmp_path)
+    rng = random.Random(0)
+    for name in ("Rex", "Мурка", "x" * 300):
+        store.create(name)
+    for _ in range(20):
+        store.run(rng.choice(sorted(TICK_RULES.actions)), pet_id=rng.randint(1, 3), rng=rng)
+    return store
+
+
+def test_wal_replay_restores_state(tmp_path, populated):
+    expected = _rows(populated)
+    _crash(populated)
+    restored = _store(tmp_path)
+    try:
+        assert _rows(restored) == expected
+        assert restored.replayed == populated.wal_records
+    finally:
+        restored.close()
+
+
+@pytest.mark.parametrize("cut", [1, 5, _UPDATE.size - 1])
+def test_truncated_wal_tail_is_dropped(tmp_path, populated, cut):
+    expected = _rows(populated)
+    _crash(populated)
+    path = populated._wal_path(populated.generation)
+    size = os.path.getsize(path)
+    # Следующая запись (обновление питомца 1), оборванная посередине
+    with open(path, "ab") as f:
+        f.write(_UPDATE.pack(KIND_UPDATE, 1, 16, 32, 48, 64, 0.0)[:cut])
+    restored = _store(tmp_path)
+    try:
+        assert _rows(restored) == expected
+        assert os.path.getsize(path) == size
+        # После обрезки журнал снова пишется с целой записи
+        restored.create("Next")
+    finally:
+        restored.close()
+    reopened = _store(tmp_path)
+    try:
+        assert _rows(reopened)[:-1] == expected
+        assert reopened._row(len(reopened) - 1)["name"] == "Next"
+    finally:
+        reopened.close()
+
+
+def test_snapshot_then_wal(tmp_path, populated):
+    populated.snapshot()
+    populated.run("feed", pet_id=1, params={"amount": 5})
+    expected = _rows(populated)
+    generation = populated.generation
+    _crash(populated)
+    restored = _store(tmp_path)
+    try:
+        assert _rows(restored) == expected
+        assert restored.generation == generation
+        assert restored._wal_generations() == [generation]
+    finally:
+        restored.close()
+
+
+def test_corrupt_snapshot_is_rejected(tmp_path, populated):
+    populated.close()
+    path = populated._snapshot_path()
+    with open(path, "r+b") as f:
+        f.seek(20)
+        f.write(b"\xff")
+    with pytest.raises(ValueError, match="checksum"):
+        _store(tmp_path)
+
+
+def test_dead_pet_ignores_actions(tmp_path):
+    store = _store(tmp_path)
+    try:
+        pet = store.create("Rex")
+        store.health[0] = 0
+        assert store.run("heal", pet_id=pet["id"])["health"] == 0
+        assert store.run(pet_id=99) is None
+    finally:
+        store.close()
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+
+import migrations
+
+
+def _tables(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+
+def _versions(path):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute("SELECT schema, version FROM schema_version"))
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("schema", sorted(migrations.MIGRATIONS))
+def test_ensure_is_idempotent(tmp_path, schema):
+    path = str(tmp_path / "pets.db")
+    applied = migrations.ensure(path, schema)
+    assert applied == [name for name, _ in migrations.MIGRATIONS[schema]]
+    assert migrations.ensure(path, schema) == []
+    # Новый процесс: версия читается из файла, шаги не повторяются
+    migrations._checked.clear()
+    assert migrations.ensure(path, schema) == []
+    assert _versions(path) == {schema: len(migrations.MIGRATIONS[schema])}
+
+
+@pytest.mark.parametrize("order", [("simple", "main"), ("main", "simple")])
+def test_schemas_share_one_file(tmp_path, order):
+    path = str(tmp_path / "digital_pet.db")
+    for schema in order:
+        migrations.ensure(path, schema)
+    assert {"pet", "pets", "pet_events", "pet_snapshots"} <= _tables(path)
+    assert _versions(path) == {schema: len(steps) for schema, steps in migrations.MIGRATIONS.items()}
+
+
+def test_legacy_user_version_file_is_migrated_from_scratch(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA user_version = 2")
+    conn.close()
+    migrations.ensure(path, "main")
+    assert "pets" in _tables(path)
+
+
+def test_pre_versioned_table_gets_new_columns_and_projections(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE pets (id INTEGER PRIMARY KEY, user_id VARCHAR, name VARCHAR, "
+                 "hunger FLOAT, mood FLOAT, energy FLOAT, last_update DATETIME, created_at DATETIME)")
+    conn.execute("INSERT INTO pets (user_id, name, hunger, mood, energy, last_update) "
+                 "VALUES ('u', 'Rex', 90, 90, 90, '2024-01-01 00:00:00.000000')")
+    conn.commit()
+    conn.close()
+    migrations.ensure(path, "main")
+    conn = sqlite3.connect(path)
+    try:
+        version, sad_at, critical_at = conn.execute("SELECT version, sad_at, critical_at FROM pets").fetchone()
+    finally:
+        conn.close()
+    assert version == 0
+    assert sad_at is not None and critical_at is not None
+
+
+def test_duplicate_snapshots_are_dropped_before_unique_index(tmp_path):
+    path = str(tmp_path / "snapshots.db")
+    conn = sqlite3.connect(path, isolation_level=None)
+    steps = migrations.MIGRATIONS["main"]
+    for _, step in steps[:2]:
+        step(conn)
+    for _ in range(3):
+        conn.execute("INSERT INTO pet_snapshots (user_id, event_id, taken_at) VALUES ('u', 5, '2024-01-01')")
+    conn.execute("CREATE TABLE schema_version (schema TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    conn.execute("INSERT INTO schema_version VALUES ('main', 2)")
+    conn.close()
+    migrations.ensure(path, "main")
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM pet_snapshots").fetchone() == (1,)
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO pet_snapshots (user_id, event_id, taken_at) VALUES ('u', 5, '2024-01-01')")
+    finally:
+        conn.close()
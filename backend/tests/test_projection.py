@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from projection import linear_projection, minutes_until_sum, tick_projection, ticks_to_critical
+from rules import PET_RULES
+
+AT = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def test_minutes_until_sum_linear_and_piecewise():
+    assert minutes_until_sum([10, 10], [1, 1], 30) == 0.0
+    assert minutes_until_sum([10, 10], [1, 1], 10) == pytest.approx(5.0)
+    # Первая шкала обнуляется на 2-й минуте, дальше сумма падает медленнее
+    assert minutes_until_sum([2, 10], [1, 1], 4) == pytest.approx(2 + 4)
+    assert minutes_until_sum([5, 5], [1, 1], -1) is None
+
+
+@pytest.mark.parametrize("state", [
+    {"hunger": 100.0, "mood": 100.0, "energy": 100.0},
+    {"hunger": 90.0, "mood": 10.0, "energy": 60.0},
+    {"hunger": 3.0, "mood": 100.0, "energy": 100.0},
+])
+def test_linear_projection_matches_decay(state):
+    projected = linear_projection(state, PET_RULES, AT)
+    sad_minutes = (projected["sad_at"] - AT).total_seconds() / 60
+    critical_minutes = (projected["critical_at"] - AT).total_seconds() / 60
+
+    def status(minutes):
+        return PET_RULES.status(PET_RULES.decay(PET_RULES.state(state), minutes))
+
+    assert status(sad_minutes - 0.01) != "Sad"
+    assert status(sad_minutes + 0.01) == "Sad"
+    before = PET_RULES.decayed(state, critical_minutes - 0.01)
+    after = PET_RULES.decayed(state, critical_minutes)
+    assert min(before.values()) > 0
+    assert min(after.values()) == pytest.approx(0, abs=1e-9)
+
+
+def test_linear_projection_already_sad():
+    state = {"hunger": 10.0, "mood": 10.0, "energy": 10.0}
+    assert linear_projection(state, PET_RULES, AT)["sad_at"] == AT
+
+
+def test_ticks_to_critical_uses_expected_step():
+    assert ticks_to_critical(50, 100, 50) == 34  # ceil(50 / 1.5)
+    assert ticks_to_critical(100, 40, 40) == 0
+
+
+def test_tick_projection():
+    critical, dead = tick_projection(50, 100, 50, 10, "healthy", AT, 20)
+    assert critical == (AT + timedelta(seconds=34 * 20)).isoformat(timespec="seconds")
+    assert dead == (AT + timedelta(seconds=(34 + 10) * 20)).isoformat(timespec="seconds")
+    assert tick_projection(50, 100, 50, 0, "dead", AT, 20) == (AT.isoformat(timespec="seconds"),) * 2
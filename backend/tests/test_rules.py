@@ -0,0 +1,104 @@
+import random
+import sqlite3
+
+import pytest
+
+from rules import PET_RULES, TICK_RULES
+
+STATES = [
+    {"hunger": 100.0, "mood": 100.0, "energy": 100.0},
+    {"hunger": 0.0, "mood": 0.0, "energy": 0.0},
+    {"hunger": 12.5, "mood": 81.0, "energy": 3.25},
+    {"hunger": 99.9, "mood": 50.0, "energy": 49.5},
+]
+MINUTES = [0.0, 0.5, 7.0, 90.0, 10_000.0]
+
+
+def _sqlite(rows):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE pets (hunger REAL, mood REAL, energy REAL)")
+    conn.executemany("INSERT INTO pets VALUES (:hunger, :mood, :energy)", rows)
+    return conn
+
+
+@pytest.mark.parametrize("minutes", MINUTES)
+@pytest.mark.parametrize("state", STATES)
+def test_linear_decay_scalar_sql_numpy_agree(state, minutes):
+    np = pytest.importorskip("numpy")
+    scalar = PET_RULES.decay(PET_RULES.state(state), minutes)
+    generic = PET_RULES.decayed(state, minutes)
+    sql = PET_RULES.decay_sql(":minutes")
+    names = list(sql)
+    row = _sqlite([state]).execute(f"SELECT {', '.join(sql[n] for n in names)} FROM pets",
+                                   {"minutes": minutes}).fetchone()
+    batch = PET_RULES.decay_batch({n: np.array([state[n]]) for n in PET_RULES.names}, np.array([minutes]))
+    for name, from_sql in zip(names, row):
+        assert getattr(scalar, name) == pytest.approx(generic[name])
+        assert from_sql == pytest.approx(generic[name])
+        assert batch[name][0] == pytest.approx(generic[name])
+        assert PET_RULES.stats[name].low <= generic[name] <= PET_RULES.stats[name].high
+
+
+@pytest.mark.parametrize("action", sorted(PET_RULES.actions))
+@pytest.mark.parametrize("state", STATES)
+def test_linear_effects_scalar_sql_numpy_agree(state, action):
+    np = pytest.importorskip("numpy")
+    generic = PET_RULES.effects(action, state)
+    scalar = PET_RULES.apply(action, PET_RULES.state(state))
+    sql = PET_RULES.effect_sql(action)
+    names = list(sql)
+    row = _sqlite([state]).execute(f"SELECT {', '.join(sql[n] for n in names)}", state).fetchone()
+    batch = PET_RULES.apply_batch(action, {n: np.array([state[n]]) for n in PET_RULES.names})
+    assert set(names) == set(generic)
+    for name, from_sql in zip(names, row):
+        assert getattr(scalar, name) == pytest.approx(generic[name])
+        assert from_sql == pytest.approx(generic[name])
+        assert batch[name][0] == pytest.approx(generic[name])
+        assert PET_RULES.stats[name].low <= generic[name] <= PET_RULES.stats[name].high
+
+
+def test_status_scalar_and_batch_agree():
+    np = pytest.importorskip("numpy")
+    states = STATES + [{"hunger": 80.0, "mood": 80.0, "energy": 80.0}, {"hunger": 50.0, "mood": 50.0, "energy": 50.0}]
+    labels = [PET_RULES.status(PET_RULES.state(state)) for state in states]
+    indexes = PET_RULES.status_batch({n: np.array([state[n] for state in states]) for n in PET_RULES.names})
+    assert labels == [PET_RULES.status_labels[index] for index in indexes]
+    # Порог строгий: среднее ровно 80 - ещё не Happy, ровно 50 - уже Sad
+    assert labels[-2:] == ["Okay", "Sad"]
+
+
+def test_tick_effects_use_parameters_and_clamp():
+    state = TICK_RULES.state(hunger=20)
+    assert TICK_RULES.apply("feed", state, amount=50).hunger == 0
+    assert TICK_RULES.effects("feed", {"hunger": 60}, amount=25) == {"hunger": 35}
+    assert TICK_RULES.effect_sql("feed")["hunger"] == "MAX(0, :hunger - :amount)"
+
+
+def test_tick_catch_up_stays_in_bounds_and_neglect_costs_health():
+    rng = random.Random(3)
+    for _ in range(500):
+        values = [rng.randint(0, 100) for _ in TICK_RULES.names]
+        *stats, status = TICK_RULES.catch_up(*values, rng.randint(0, 300), rng)
+        assert all(0 <= value <= 100 for value in stats)
+        assert status == ("healthy" if stats[-1] > 0 else "dead")
+    hunger, energy, mood, health, _ = TICK_RULES.catch_up(100, 0, 0, 40, 10, rng)
+    assert (hunger, energy, mood, health) == (100, 0, 0, 30)
+
+
+def test_tick_decay_batch_stays_in_bounds():
+    np = pytest.importorskip("numpy")
+    rng = np.random.default_rng(5)
+    size = 1000
+    arrays = {n: rng.integers(0, 101, size) for n in TICK_RULES.names}
+    units = rng.integers(0, 200, size)
+    result = TICK_RULES.decay_batch(arrays, units, rng)
+    for name in TICK_RULES.names:
+        assert ((result[name] >= 0) & (result[name] <= 100)).all()
+    # Голод только растёт, энергия и настроение только падают
+    assert (result["hunger"] >= arrays["hunger"]).all()
+    assert (result["energy"] <= arrays["energy"]).all()
+
+
+def test_linear_rules_reject_sql_for_ticks():
+    with pytest.raises(ValueError):
+        TICK_RULES.decayed({"hunger": 1, "energy": 1, "mood": 1}, 1)
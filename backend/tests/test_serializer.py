@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import serializer
+from serializer import JSON, MSGPACK, Shape, negotiate, packb, unpackb
+
+PET = Shape("pet", [("id", "int"), ("name", "str"), ("hunger", "number"), ("mood", "float"),
+                    ("note", "str?"), ("alive", "bool")])
+ACTION = Shape("action", [("success", "bool"), ("pet", PET), ("message", "str")])
+VALUES = (7, "Мурка \"кот\"", 12.5, 80, None, True)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("*/*", JSON),
+    ("application/json", JSON),
+    ("application/msgpack", MSGPACK),
+    ("application/x-msgpack, application/json;q=0.5", MSGPACK),
+    ("application/json, application/msgpack;q=0.8", JSON),
+    ("application/msgpack;q=0", JSON),
+    ("application/vnd.msgpack;q=bad", JSON),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+
+@pytest.mark.parametrize("value", [
+    None, True, False, 0, 127, 128, -1, -33, 2 ** 40, -(2 ** 40), 1.5, "", "x" * 31, "y" * 300, "z" * 70_000,
+    [], list(range(20)), {"a": 1, "b": [1, 2, {"c": None}]}, {str(i): i for i in range(20)}, b"\x00\x01",
+])
+def test_pack_roundtrip(monkeypatch, value):
+    # Собственный кодировщик, даже если пакет msgpack установлен
+    monkeypatch.setattr(serializer, "_msgpack", None)
+    assert unpackb(packb(value)) == value
+
+
+def test_pack_dates_as_isoformat(monkeypatch):
+    monkeypatch.setattr(serializer, "_msgpack", None)
+    at = datetime(2024, 1, 2, 3, 4, 5)
+    assert unpackb(packb({"at": at})) == {"at": at.isoformat()}
+
+
+def test_unpack_rejects_trailing_data():
+    with pytest.raises(ValueError):
+        unpackb(packb(1) + b"\x00")
+
+
+def test_shape_json_matches_json_dumps():
+    body = PET.json(VALUES)
+    assert json.loads(body) == dict(zip(PET.keys, (7, "Мурка \"кот\"", 12.5, 80.0, None, True)))
+    assert isinstance(json.loads(body)["mood"], float)
+
+
+def test_shape_msgpack_matches_dict():
+    body, media = ACTION.render((True, VALUES, "fed"), "application/msgpack")
+    assert media == MSGPACK
+    assert unpackb(body) == {"success": True, "pet": PET.dict(VALUES) | {"mood": 80.0}, "message": "fed"}
+
+
+def test_shape_render_defaults_to_json():
+    body, media = ACTION.render((False, VALUES, "no"), None)
+    assert media == JSON
+    assert json.loads(body)["pet"]["name"] == VALUES[1]
@@ -0,0 +1,85 @@
+import sqlite3
+from collections import Counter
+
+import pytest
+
+import migrations
+from sharding import HashRing, rebalance, shard_path
+
+
+def _pets(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(row[0] for row in conn.execute("SELECT user_id FROM pets"))
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "digital_pet.db")
+    migrations.ensure(path, "main")
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO pets (user_id, name, hunger, mood, energy) VALUES (?, ?, 50, 50, 50)",
+                     ((f"user-{i}", f"Pet {i}") for i in range(300)))
+    conn.executemany("INSERT INTO pet_events (user_id, kind, created_at) VALUES (?, 'feed', '2024-01-01')",
+                     ((f"user-{i}",) for i in range(300)))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_ring_is_stable_and_spreads_keys():
+    ring = HashRing(4)
+    counts = Counter(ring.shard(f"user-{i}") for i in range(4000))
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 500
+    assert all(HashRing(4).shard(f"user-{i}") == ring.shard(f"user-{i}") for i in range(100))
+    assert HashRing(1).shard("anyone") == 0
+
+
+def test_growing_ring_moves_only_to_new_shard():
+    old, new = HashRing(3), HashRing(4)
+    for i in range(2000):
+        before, after = old.shard(f"user-{i}"), new.shard(f"user-{i}")
+        assert after == before or after == 3
+
+
+def test_rebalance_places_pets_by_ring(database):
+    moves = rebalance(database, 1, 3, chunk=50)
+    ring = HashRing(3)
+    for index in range(3):
+        expected = sorted(f"user-{i}" for i in range(300) if ring.shard(f"user-{i}") == index)
+        assert _pets(shard_path(database, index)) == expected
+    assert sum(moves.values()) == sum(1 for i in range(300) if ring.shard(f"user-{i}") != 0)
+    assert rebalance(database, 3, 3) == {}
+
+
+def test_rebalance_resumes_after_crash(database):
+    ring = HashRing(2)
+    moving = [f"user-{i}" for i in range(300) if ring.shard(f"user-{i}") == 1]
+    # Сбой после записи части питомцев в новый шард, но до удаления из старого
+    target = shard_path(database, 1)
+    migrations.ensure(target, "main")
+    conn = sqlite3.connect(database)
+    conn.execute("ATTACH DATABASE ? AS dst", (target,))
+    conn.execute("INSERT INTO dst.pets (user_id, name) SELECT user_id, name FROM pets WHERE user_id IN (%s)"
+                 % ", ".join("?" * 10), moving[:10])
+    conn.commit()
+    conn.close()
+
+    rebalance(database, 1, 2, chunk=7)
+    assert _pets(target) == sorted(moving)
+    assert _pets(database) == sorted(f"user-{i}" for i in range(300) if ring.shard(f"user-{i}") == 0)
+    conn = sqlite3.connect(target)
+    try:
+        # Журнал переехал для всех, кроме уже записанных до сбоя
+        assert conn.execute("SELECT COUNT(*) FROM pet_events").fetchone()[0] == len(moving) - 10
+    finally:
+        conn.close()
+
+
+def test_dry_run_changes_nothing(database):
+    moves = rebalance(database, 1, 2, dry_run=True)
+    assert sum(moves.values()) > 0
+    assert len(_pets(database)) == 300
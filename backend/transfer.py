@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+"""
+Потоковая выгрузка и загрузка питомцев: NDJSON или CSV.
+
+Таблицы:
+  pets - main.py, все шарды (PET_SHARDS); ключ загрузки - user_id, строка
+         уходит в шард по sharding.HashRing;
+  pet  - simple_server.py (PET_SIMPLE_DATABASE); ключ - id.
+
+Выгрузка идёт курсором SQLite по id кусками PET_TRANSFER_BATCH строк, в
+памяти только текущий кусок. Читает mode=ro соединение, поэтому сервер
+работать не мешает: выгрузка видит снимок на момент начала своего шарда.
+Загрузка пишет кусками через executemany, каждый кусок - своя транзакция:
+существующий user_id (id) обновляется, новый добавляется (через временную
+таблицу, см. _Writer). Колонки таблицы берутся из её схемы
+(PRAGMA table_info), строка пишет только свои ключи (заголовок CSV, ключи
+объекта NDJSON); ключ, которого в таблице нет, останавливает загрузку
+ошибкой (id в pets назначает сервер). Строкам без прогнозных
+колонок (sad_at/critical_at, critical_at/dead_at) прогноз считается после
+загрузки.
+
+Журнал событий (pet_events) не переносится: у загруженных питомцев
+журнал и снимки удаляются в той же транзакции, история начинается
+заново, и загруженная строка - текущее состояние и при
+PET_STATE_STORE=events (строка pets без событий - нулевой снимок
+журнала, см. event_log.py). При PET_SIMPLE_STORAGE=memory (--storage
+memory) simple_server держит питомцев в памяти и загрузку в файл увидит
+только после перезапуска.
+
+    python transfer.py export [--table pets] [--db ./digital_pet.db] [--format ndjson|csv] [-o pets.ndjson]
+    python transfer.py import [--table pets] [--db ./digital_pet.db] [--format ndjson|csv] [-i pets.ndjson]
+
+Из API: GET /admin/export и POST /admin/import (main.py).
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import migrations
+import serializer
+import sqlite_tuning
+from sharding import SHARD_COUNT, HashRing, shard_path
+from sqlite_tuning import retry_busy
+
+BATCH = int(os.environ.get("PET_TRANSFER_BATCH", "5000"))
+SIMPLE_DATABASE = os.environ.get("PET_SIMPLE_DATABASE", "../digital_pet.db")
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Журнал main.py (event_log.py): у загружаемых питомцев очищается
+JOURNAL_TABLES = ("pet_events", "pet_snapshots")
+# Колонки, которые назначает сервер, а не файл загрузки
+SERVER_COLUMNS = {"pets": ("id",)}
+
+# Колонки выгрузки по таблицам, вид - для serializer.Shape (NULL допустим везде)
+TABLES = {
+    "pets": ("user_id", [
+        ("user_id", "str?"), ("name", "str?"), ("hunger", "number?"), ("mood", "number?"), ("energy", "number?"),
+        ("last_update", "str?"), ("created_at", "str?"), ("sad_at", "str?"), ("critical_at", "str?"),
+    ]),
+    "pet": ("id", [
+        ("id", "int"), ("name", "str?"), ("hunger", "number?"), ("energy", "number?"), ("mood", "number?"),
+        ("health", "number?"), ("status", "str?"), ("created_at", "str?"), ("last_update", "str?"),
+        ("critical_at", "str?"), ("dead_at", "str?"),
+    ]),
+}
+
+
+def table_paths(table, database=None):
+    """Файлы таблицы: шарды main.py для pets, один файл simple_server для pet."""
+    if table not in TABLES:
+        raise ValueError(f"unknown table: {table}")
+    if table == "pet":
+        return [database or SIMPLE_DATABASE]
+    return [shard_path(database or "./digital_pet.db", index) for index in range(SHARD_COUNT)]
+
+
+def _table_columns(conn, table, path):
+    """Колонки таблицы в порядке схемы."""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if not columns:
+        raise ValueError(f"table {table} does not exist in {path} (start the server once to create it)")
+    return columns
+
+
+# --- выгрузка ---
+
+def export_chunks(table, paths, fmt="ndjson", batch=BATCH):
+    """Генератор кусков bytes (по batch строк) всех файлов paths.
+
+    Таблица и формат проверяются сразу, а не на первом next().
+    """
+    if table not in TABLES:
+        raise ValueError(f"unknown table: {table}")
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format: {fmt}")
+    return _export(table, paths, fmt, batch)
+
+
+def _export(table, paths, fmt, batch):
+    _, fields = TABLES[table]
+    header = True
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        conn = sqlite_tuning.connect(path, read_only=True, check_same_thread=False)
+        try:
+            present = _table_columns(conn, table, path)
+            # Колонки, которых нет в старом файле, выгружаются как NULL
+            select = ", ".join(key if key in present else f"NULL AS {key}" for key, _ in fields)
+            cursor = conn.execute(f"SELECT {select} FROM {table} ORDER BY id")
+            if fmt == "ndjson":
+                shape = serializer.Shape(f"{table}_row", fields)
+                while True:
+                    rows = cursor.fetchmany(batch)
+                    if not rows:
+                        break
+                    yield b"\n".join(map(shape.json, rows)) + b"\n"
+            else:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer, lineterminator="\n")
+                if header:
+                    writer.writerow(key for key, _ in fields)
+                    header = False
+                while True:
+                    rows = cursor.fetchmany(batch)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    yield buffer.getvalue().encode()
+                    buffer.seek(0)
+                    buffer.truncate()
+        finally:
+            conn.close()
+
+
+# --- загрузка ---
+
+def read_rows(stream, fmt="ndjson"):
+    """Строки-словари из бинарного файла; в CSV пустое поле - NULL."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format: {fmt}")
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="" if fmt == "csv" else None)
+    if fmt == "csv":
+        for row in csv.DictReader(text):
+            yield {key: value if value != "" else None for key, value in row.items()}
+    else:
+        for line in text:
+            if line.strip():
+                yield json.loads(line)
+
+
+class _Writer:
+    """Соединение одного файла и upsert-запросы по набору колонок строки."""
+
+    def __init__(self, path, table):
+        self.conn = sqlite_tuning.connect(path, isolation_level=None, check_same_thread=False)
+        self.table = table
+        self.key, _ = TABLES[table]
+        self.schema = "main" if table == "pets" else "simple"
+        self.columns = [column for column in _table_columns(self.conn, table, path)
+                        if column not in SERVER_COLUMNS.get(table, ())]
+        self._known = set(self.columns)
+        self._prepared = {}
+        # Кусок ложится во временную таблицу, затем один UPDATE и один INSERT ... SELECT
+        # отсутствующих: user_id в pets не уникален (только индекс), а в pet upsert через
+        # ON CONFLICT проверяет NOT NULL раньше конфликта и не обновит строку без name
+        self.conn.execute(f"CREATE TEMP TABLE incoming ({', '.join(self.columns)}, PRIMARY KEY ({self.key}))")
+        self._journal = ()
+        if table == "pets":
+            tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self._journal = tuple(
+                f"DELETE FROM {journal} WHERE user_id IN (SELECT user_id FROM temp.incoming)"
+                for journal in JOURNAL_TABLES if journal in tables
+            )
+
+    def check(self, row, number):
+        """ValueError, если у строки есть ключи, которых нет среди колонок загрузки."""
+        unknown = [key for key in row if key not in self._known]
+        if unknown:
+            raise ValueError(f"row {number}: {self.table} has no importable column {', '.join(map(repr, unknown))}")
+
+    def _statements(self, columns):
+        """(INSERT для executemany, операторы после него) для набора колонок."""
+        prepared = self._prepared.get(columns)
+        if prepared is not None:
+            return prepared
+        names = ", ".join(columns)
+        placeholders = ", ".join("?" * len(columns))
+        values = ", ".join(column for column in columns if column != self.key)
+        table, key = self.table, self.key
+        # UPDATE ... FROM SQLite планирует сканом всей таблицы, а так идёт по индексу ключа
+        update = (
+            f"UPDATE {table} SET ({values}) = (SELECT {values} FROM temp.incoming "
+            f"WHERE incoming.{key} = {table}.{key}) WHERE {key} IN (SELECT {key} FROM temp.incoming)",
+        ) if values else ()
+        prepared = (f"INSERT INTO temp.incoming ({names}) VALUES ({placeholders})", (
+            *self._journal,
+            *update,
+            f"INSERT INTO {table} ({names}) SELECT {names} FROM temp.incoming "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {table}.{key} = incoming.{key})",
+            "DELETE FROM temp.incoming",
+        ))
+        self._prepared[columns] = prepared
+        return prepared
+
+    def _transaction(self, work):
+        def run():
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                work()
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        retry_busy(run)
+
+    def write(self, rows):
+        # Строки NDJSON могут нести разные наборы ключей: у каждого набора свои запросы
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row), []).append(tuple(row.values()))
+
+        def work():
+            for columns, params in groups.items():
+                insert, statements = self._statements(columns)
+                self.conn.executemany(insert, params)
+                for statement in statements:
+                    self.conn.execute(statement)
+
+        self._transaction(work)
+
+    def backfill(self):
+        """Прогноз порогов строкам, пришедшим без него (migrations.backfill_projections)."""
+        self._transaction(lambda: migrations.backfill_projections(self.conn, self.schema))
+
+    def close(self):
+        self.conn.close()
+
+
+def import_rows(rows, table, paths, batch=BATCH, on_batch=None):
+    """Upsert строк rows в таблицу; on_batch(keys) - после коммита каждого куска.
+
+    Для pets строка уходит в шард по user_id (len(paths) шардов). Повтор
+    ключа внутри куска - побеждает последняя строка.
+    """
+    if table not in TABLES:
+        raise ValueError(f"unknown table: {table}")
+    key, _ = TABLES[table]
+    ring = HashRing(len(paths))
+    writers = {}
+    pending = {}
+    total = 0
+    started = time.perf_counter()
+
+    def flush(index):
+        rows = pending.pop(index)
+        try:
+            writers[index].write(rows.values())
+        except sqlite3.IntegrityError as exc:
+            # Например, новая строка без обязательной колонки (name); кусок откатан целиком
+            raise ValueError(f"batch ending at row {total}: {exc}") from exc
+        if on_batch is not None:
+            on_batch(list(rows))
+
+    try:
+        for row in rows:
+            value = row.get(key)
+            if value is None:
+                raise ValueError(f"row {total + 1}: {key} is required")
+            if table == "pets":
+                value = row[key] = str(value)
+            index = ring.shard(value) if table == "pets" else 0
+            if index not in writers:
+                writers[index] = _Writer(paths[index], table)
+            writers[index].check(row, total + 1)
+            pending.setdefault(index, {})[value] = row
+            total += 1
+            if len(pending[index]) >= batch:
+                flush(index)
+        for index in list(pending):
+            flush(index)
+        for writer in writers.values():
+            writer.backfill()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    elapsed = time.perf_counter() - started
+    return {"table": table, "rows": total, "seconds": round(elapsed, 3),
+            "rows_per_second": round(total / elapsed) if elapsed else 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import Digital Pet tables as NDJSON or CSV")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("--table", choices=tuple(TABLES), default="pets")
+    parser.add_argument("--db", help="main.py: ./digital_pet.db, simple_server.py: PET_SIMPLE_DATABASE")
+    parser.add_argument("--format", choices=tuple(FORMATS), default="ndjson")
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("-o", "--output", help="export file (default: stdout)")
+    parser.add_argument("-i", "--input", help="import file (default: stdin)")
+    args = parser.parse_args()
+    paths = table_paths(args.table, args.db)
+    if args.command == "export":
+        output = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for chunk in export_chunks(args.table, paths, args.format, args.batch):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+    else:
+        source = open(args.input, "rb") if args.input else sys.stdin.buffer
+        try:
+            result = import_rows(read_rows(source, args.format), args.table, paths, args.batch)
+        finally:
+            if args.input:
+                source.close()
+        print(result, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
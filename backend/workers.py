@@ -0,0 +1,185 @@
+"""
+Общее состояние процессов-воркеров serve_workers.py.
+
+Супервизор передаёт воркерам через окружение:
+  PET_WORKER_ID   - номер воркера (0 - "главный": только он запускает sweeper);
+  PET_WORKER_HUB  - host:port UDP-хаба инвалидаций;
+  PET_WORKER_DIR  - каталог, куда воркеры раз в секунду пишут свои /metrics.
+
+Кэш pet_cache и SSE-подписки живут в каждом процессе свои. После действия
+воркер шлёт хабу "inv <user_id>", хаб рассылает его остальным, и они
+выбрасывают запись из кэша (и перечитывают питомца для своих SSE).
+UDP на loopback не теряет датаграммы, пока получатель успевает читать;
+на случай потери запись в кэше всё равно живёт не дольше PET_CACHE_TTL.
+
+/metrics любого воркера собирает файлы всех воркеров и супервизора,
+добавляя к сэмплам метку worker (см. metrics.merge).
+Без супервизора (обычный uvicorn) всё это выключено.
+"""
+import os
+import socket
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(__file__))
+try:
+    import metrics
+except ImportError:
+    from . import metrics
+
+WORKER_ID = os.environ.get("PET_WORKER_ID")
+WORKER_HUB = os.environ.get("PET_WORKER_HUB")
+WORKER_DIR = os.environ.get("PET_WORKER_DIR")
+IS_PRIMARY = WORKER_ID in (None, "0")
+METRICS_INTERVAL = 1.0
+MAX_DATAGRAM = 65507
+
+
+def _address(value):
+    host, port = value.rsplit(":", 1)
+    return host, int(port)
+
+
+class InvalidationHub:
+    """UDP-хаб в супервизоре: пересылает сообщение всем воркерам, кроме отправителя."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.address = "%s:%d" % self.sock.getsockname()
+        self.forwarded = 0
+        self._workers = {}
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                data, sender = self.sock.recvfrom(MAX_DATAGRAM)
+            except (ConnectionResetError, ConnectionRefusedError):
+                # ICMP от воркера, который уже умер
+                continue
+            except OSError:
+                return
+            if data.startswith(b"hello "):
+                # Перезапущенный воркер заменяет свой старый адрес
+                self._workers[data[6:]] = sender
+                continue
+            for address in list(self._workers.values()):
+                if address != sender:
+                    try:
+                        self.sock.sendto(data, address)
+                        self.forwarded += 1
+                    except OSError:
+                        pass
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="pet-worker-hub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.sock.close()
+
+
+class InvalidationChannel:
+    """Конец канала в воркере: publish() после действия, on_invalidate(user_id) на чужие."""
+
+    def __init__(self, hub, worker_id, on_invalidate):
+        self.hub = _address(hub)
+        self.worker_id = worker_id
+        self.on_invalidate = on_invalidate
+        self.sent = 0
+        self.received = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self.sock.sendto(f"hello {self.worker_id}".encode(), self.hub)
+            self._thread = threading.Thread(target=self._run, name="pet-worker-channel", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(MAX_DATAGRAM)
+            except OSError:
+                return
+            if data.startswith(b"inv "):
+                self.received += 1
+                try:
+                    self.on_invalidate(data[4:].decode())
+                except Exception as exc:
+                    print(f"✗ invalidation failed: {exc}")
+
+    def publish(self, user_id):
+        try:
+            self.sock.sendto(b"inv " + user_id.encode(), self.hub)
+            self.sent += 1
+        except OSError:
+            pass
+
+    def stop(self):
+        self.sock.close()
+
+    def stats(self):
+        return {"worker": self.worker_id, "sent": self.sent, "received": self.received}
+
+
+def channel_from_env(on_invalidate):
+    """Канал инвалидаций, если процесс запущен из serve_workers.py, иначе None."""
+    if not WORKER_HUB:
+        return None
+    return InvalidationChannel(WORKER_HUB, WORKER_ID, on_invalidate)
+
+
+# --- метрики ---
+
+def write_metrics(name=None, directory=None):
+    """Текущие метрики процесса в <directory>/<name>.prom (атомарной заменой)."""
+    path = os.path.join(directory or WORKER_DIR, f"{name or 'worker-' + WORKER_ID}.prom")
+    with open(path + ".tmp", "w") as f:
+        f.write(metrics.render())
+    os.replace(path + ".tmp", path)
+
+
+def render_metrics():
+    """/metrics: свои метрики или, под супервизором, метрики всех процессов с меткой worker."""
+    if not WORKER_DIR:
+        return metrics.render()
+    write_metrics()
+    texts = []
+    for filename in sorted(os.listdir(WORKER_DIR)):
+        if filename.endswith(".prom"):
+            with open(os.path.join(WORKER_DIR, filename)) as f:
+                texts.append((filename[:-len(".prom")].replace("worker-", ""), f.read()))
+    return metrics.merge(texts)
+
+
+class MetricsWriter:
+    """Раз в METRICS_INTERVAL пишет метрики воркера в PET_WORKER_DIR."""
+
+    def __init__(self, interval=METRICS_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                write_metrics()
+            except OSError as exc:
+                print(f"✗ worker metrics write failed: {exc}")
+
+    def start(self):
+        if WORKER_DIR and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="pet-worker-metrics", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -26,20 +26,35 @@ const proxyRequest = async (
     const target = buildTargetUrl(base, req, path);
 
     try {
+      const headers: Record<string, string> = {
+        'Content-Type': 'application/json',
+      };
+      const ifNoneMatch = req.headers.get('if-none-match');
+      if (ifNoneMatch) {
+        headers['If-None-Match'] = ifNoneMatch;
+      }
+
       const response = await fetch(target, {
         method,
-        headers: {
-          'Content-Type': 'application/json',
-        },
+        headers,
         body: rawBody,
         cache: 'no-store',
       });
 
+      const etag = response.headers.get('etag');
+      if (response.status === 304) {
+        return new NextResponse(null, {
+          status: 304,
+          headers: etag ? { ETag: etag } : undefined,
+        });
+      }
+
       const text = await response.text();
       return new NextResponse(text, {
         status: response.status,
         headers: {
           'Content-Type': response.headers.get('content-type') ?? 'application/json',
+          ...(etag ? { ETag: etag } : {}),
         },
       });
     } catch (error) {
@@ -76,7 +91,7 @@ export async function OPTIONS() {
     headers: {
       'Access-Control-Allow-Origin': '*',
       'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-      'Access-Control-Allow-Headers': 'Content-Type',
+      'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
     },
   });
 }